@@ -7,10 +7,22 @@
 
 from .data_models import (
     NodeType, Node, ProgramBlock, Connection, 
-    Variable, Function
+    Variable, Function, new_block_id, resolve_block_index,
+    ParamSchema, ParamSchemaSet, BlockParam, BlockParams
+)
+from .connection_index import ConnectionIndex
+from .program_io import LoadedProgram, load_program_file, save_program_file
+from .expressions import ExpressionError, CompiledExpression, compile_expression, check_expression
+from .validation import (
+    ValidationResult, ProgramStreamValidator, validate_program
 )
 
 __all__ = [
     'NodeType', 'Node', 'ProgramBlock', 'Connection',
-    'Variable', 'Function'
+    'Variable', 'Function', 'ConnectionIndex',
+    'new_block_id', 'resolve_block_index',
+    'ParamSchema', 'ParamSchemaSet', 'BlockParam', 'BlockParams',
+    'LoadedProgram', 'load_program_file', 'save_program_file',
+    'ExpressionError', 'CompiledExpression', 'compile_expression', 'check_expression',
+    'ValidationResult', 'ProgramStreamValidator', 'validate_program'
 ]
\ No newline at end of file
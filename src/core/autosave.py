@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+自动保存模块
+
+编辑操作（添加/移动/删除程序块、修改/删除参数、添加/删除连接）以JSON行的形式追加到日志文件，
+后台线程负责写入，并定期把日志合并为一个完整的快照文件，UI线程只需把操作放入队列。
+程序异常退出后，可以用快照加日志恢复出最后的编辑状态。
+"""
+
+import json
+import os
+import queue
+import threading
+from typing import Any, Dict, Optional
+
+from .program_io import with_block_indices
+
+SNAPSHOT_FILE = 'autosave.json'
+JOURNAL_FILE = 'autosave.journal'
+
+
+def default_autosave_dir() -> str:
+    """默认的自动保存目录"""
+    return os.path.join(os.path.expanduser('~'), '.robot_programming_software', 'autosave')
+
+
+class ProgramState:
+    """按ID索引的程序数据，用于在后台线程中重放编辑操作"""
+
+    def __init__(self, program_data: Optional[Dict[str, Any]] = None):
+        self.blocks: Dict[str, Dict[str, Any]] = {}
+        self.connections: Dict[tuple, Dict[str, Any]] = {}
+        if program_data:
+            for block_data in program_data.get('blocks', []):
+                self.blocks[block_data['id']] = block_data
+            for conn_data in program_data.get('connections', []):
+                self._add_connection(conn_data)
+
+    def _add_connection(self, conn_data: Dict[str, Any]):
+        self.connections[(conn_data['from_node'], conn_data['to_node'])] = conn_data
+
+    def apply(self, operation: Dict[str, Any]):
+        """应用一条编辑操作"""
+        op = operation['op']
+        if op == 'block_added':
+            block_data = operation['block']
+            self.blocks[block_data['id']] = block_data
+        elif op == 'blocks_moved':
+            for block_id, x, y in operation['blocks']:
+                block_data = self.blocks.get(block_id)
+                if block_data is not None:
+                    block_data['x'] = x
+                    block_data['y'] = y
+        elif op == 'block_removed':
+            block_id = operation['block_id']
+            self.blocks.pop(block_id, None)
+            self.connections = {key: conn for key, conn in self.connections.items()
+                                if conn['from_block_id'] != block_id and conn['to_block_id'] != block_id}
+        elif op == 'param_changed':
+            block_data = self.blocks.get(operation['block_id'])
+            if block_data is not None:
+                params = block_data['params']
+                index = operation['index']
+                if index < len(params):
+                    params[index] = operation['param']
+                else:
+                    params.append(operation['param'])
+        elif op == 'param_removed':
+            block_data = self.blocks.get(operation['block_id'])
+            if block_data is not None and operation['index'] < len(block_data['params']):
+                del block_data['params'][operation['index']]
+        elif op == 'connection_added':
+            self._add_connection(operation['connection'])
+        elif op == 'connection_removed':
+            self.connections.pop((operation['from_node'], operation['to_node']), None)
+        elif op == 'cleared':
+            self.blocks = {}
+            self.connections = {}
+        else:
+            print(f"自动保存: 忽略未知操作 {op}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为与程序文件相同结构的字典"""
+        blocks = list(self.blocks.values())
+        block_id_to_index = {block_data['id']: i for i, block_data in enumerate(blocks)}
+        return {
+            'blocks': blocks,
+            'connections': [with_block_indices(conn, block_id_to_index) for conn in self.connections.values()]
+        }
+
+
+class AutosaveJournal:
+    """后台自动保存
+
+    record()只把操作放入队列，立即返回；后台线程把操作追加到日志文件，
+    日志累计compact_every条操作后写出新快照并清空日志，因此每次保存的开销与改动量成正比。
+    """
+
+    def __init__(self, directory: Optional[str] = None, compact_every: int = 500):
+        self.directory = directory or default_autosave_dir()
+        self.snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(self.directory, JOURNAL_FILE)
+        self.compact_every = compact_every
+        self.last_error: Optional[str] = None
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, program_data: Optional[Dict[str, Any]] = None):
+        """启动后台线程，以program_data（默认为空程序）作为初始快照"""
+        if self._thread is not None:
+            return
+        self._queue.put(('reset', program_data))
+        self._thread = threading.Thread(target=self._run, name='autosave', daemon=True)
+        self._thread.start()
+
+    def record(self, operation: Dict[str, Any]):
+        """记录一条编辑操作（非阻塞）"""
+        self._queue.put(('op', operation))
+
+    def reset(self, program_data: Optional[Dict[str, Any]] = None):
+        """以完整的程序数据重新开始（例如新建或加载程序后）"""
+        self._queue.put(('reset', program_data))
+
+    def compact(self):
+        """请求立即把日志合并为快照"""
+        self._queue.put(('compact', None))
+
+    def stop(self, discard: bool = True, timeout: float = 5.0):
+        """停止后台线程；discard为True时删除自动保存文件（正常退出）"""
+        if self._thread is None:
+            return
+        self._queue.put(('stop', discard))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def flush(self, timeout: float = 5.0):
+        """等待队列中的操作全部写入"""
+        done = threading.Event()
+        self._queue.put(('sync', done))
+        done.wait(timeout)
+
+    @staticmethod
+    def has_recovery(directory: Optional[str] = None) -> bool:
+        """是否存在上次未正常退出时留下的自动保存数据"""
+        directory = directory or default_autosave_dir()
+        return os.path.exists(os.path.join(directory, SNAPSHOT_FILE))
+
+    @staticmethod
+    def recover(directory: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """读取快照并重放日志，返回恢复的程序数据；没有自动保存数据时返回None"""
+        directory = directory or default_autosave_dir()
+        snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        journal_path = os.path.join(directory, JOURNAL_FILE)
+        if not os.path.exists(snapshot_path):
+            return None
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            state = ProgramState(json.load(f))
+        if os.path.exists(journal_path):
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        operation = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 最后一行可能在崩溃时只写了一半
+                        break
+                    state.apply(operation)
+        return state.to_dict()
+
+    def _write_snapshot(self, state: ProgramState):
+        """原子地写出快照并清空日志"""
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state.to_dict(), f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        return open(self.journal_path, 'w', encoding='utf-8')
+
+    def _remove_files(self):
+        for path in (self.journal_path, self.snapshot_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _run(self):
+        state = ProgramState()
+        journal = None
+        pending = 0  # 上次快照后日志中的操作数
+        running = True
+        while running:
+            items = [self._queue.get()]
+            # 一次取出队列中积压的所有操作，合并写入
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            try:
+                for kind, payload in items:
+                    if kind == 'op':
+                        state.apply(payload)
+                        lines.append(json.dumps(payload, ensure_ascii=False))
+                        pending += 1
+                        continue
+                    # 其他命令之前先写出已累积的操作
+                    if lines and journal is not None:
+                        journal.write('\n'.join(lines) + '\n')
+                    lines = []
+                    if kind == 'reset':
+                        state = ProgramState(payload)
+                        if journal is not None:
+                            journal.close()
+                        journal = self._write_snapshot(state)
+                        pending = 0
+                    elif kind == 'compact':
+                        if journal is not None:
+                            journal.close()
+                        journal = self._write_snapshot(state)
+                        pending = 0
+                    elif kind == 'sync':
+                        if journal is not None:
+                            journal.flush()
+                    elif kind == 'stop':
+                        if journal is not None:
+                            journal.close()
+                            journal = None
+                        if payload:
+                            self._remove_files()
+                        running = False
+                        break
+
+                if running and journal is not None:
+                    if lines:
+                        journal.write('\n'.join(lines) + '\n')
+                        journal.flush()
+                    if pending >= self.compact_every:
+                        journal.close()
+                        journal = self._write_snapshot(state)
+                        pending = 0
+            except (OSError, KeyError, TypeError, ValueError) as e:
+                self.last_error = f"自动保存失败: {str(e)}"
+                print(self.last_error)
+            finally:
+                # 出错时也要通知等待中的flush()，避免调用方一直等待
+                for kind, payload in items:
+                    if kind == 'sync':
+                        payload.set()
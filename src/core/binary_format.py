@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+二进制程序文件格式（.robotb）
+
+与JSON格式保存相同的程序字典（见program_io.program_to_dict），解码结果与JSON形式一致。
+文件布局（小端）：
+    头部        4s魔数 b'RBTB'，H格式版本，H保留
+    字符串表    I数量，每项为I长度 + UTF-8字节；其余部分以I索引引用字符串
+    参数定义表  I数量，每项为一个字典值（参数字典中除value等实例字段外的部分）
+    程序块      I数量，每块：I块ID，I名称，I类型，值x，值y，
+                H参数数量 + 每参数(I参数定义，值value，值实例字段)，
+                B输入节点数量 + 节点引用，B输出节点数量 + 节点引用
+    连接        I数量，每连接：I源块ID，i源块索引，节点引用，I目标块ID，i目标块索引，节点引用，I类型
+    其他字段    一个字典值，保存其余顶层键
+节点ID通常为"块ID_后缀"，节点引用只保存后缀的字符串索引；否则置最高位，保存完整ID的索引。
+值为带类型标记的编码（None/布尔/整数/浮点/字符串/列表/字典）。
+"""
+
+import struct
+from typing import Any, Dict, List, Optional
+
+MAGIC = b'RBTB'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHH')
+_U8 = struct.Struct('<B')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+_BLOCK = struct.Struct('<III')
+_CONNECTION_END = struct.Struct('<Ii')
+
+_NONE_REF = 0xFFFFFFFF
+_FULL_NODE_ID = 0x80000000
+
+# 值的类型标记
+_T_NONE = 0
+_T_FALSE = 1
+_T_TRUE = 2
+_T_INT = 3
+_T_FLOAT = 4
+_T_STR = 5
+_T_LIST = 6
+_T_DICT = 7
+_T_BIGINT = 8
+_T_ABSENT = 9  # 参数字典中不存在value键
+
+_ABSENT = object()
+
+# 参数字典中属于程序块实例的键（与ParamSchema.INSTANCE_KEYS一致）
+_INSTANCE_KEYS = ('value', 'is_variable', 'variable_type')
+
+# 连接字典的键（按program_to_dict的顺序）
+_CONNECTION_KEYS = ('from_block', 'from_block_id', 'from_node', 'to_block', 'to_block_id', 'to_node', 'type')
+
+
+def is_binary_program(data: bytes) -> bool:
+    """判断数据是否为二进制程序格式"""
+    return data[:len(MAGIC)] == MAGIC
+
+
+class _Encoder:
+    def __init__(self):
+        self.out = bytearray()
+        self.strings: Dict[str, int] = {}
+        self.string_list: List[str] = []
+        self.schemas: Dict[tuple, int] = {}
+        self.schema_list: List[Dict[str, Any]] = []
+
+    def string(self, text: Optional[str]) -> int:
+        """登记字符串，返回其在字符串表中的索引（None返回空引用）"""
+        if text is None:
+            return _NONE_REF
+        index = self.strings.get(text)
+        if index is None:
+            if not isinstance(text, str):
+                raise TypeError(f"应为字符串: {text!r}")
+            index = self.strings[text] = len(self.string_list)
+            self.string_list.append(text)
+        return index
+
+    def value(self, value: Any, out: bytearray = None):
+        """写入带类型标记的值"""
+        if out is None:
+            out = self.out
+        if value is None:
+            out.append(_T_NONE)
+        elif value is True:
+            out.append(_T_TRUE)
+        elif value is False:
+            out.append(_T_FALSE)
+        elif isinstance(value, int):
+            if -(1 << 63) <= value < (1 << 63):
+                out.append(_T_INT)
+                out += _I64.pack(value)
+            else:
+                out.append(_T_BIGINT)
+                out += _U32.pack(self.string(str(value)))
+        elif isinstance(value, float):
+            out.append(_T_FLOAT)
+            out += _F64.pack(value)
+        elif isinstance(value, str):
+            out.append(_T_STR)
+            out += _U32.pack(self.string(value))
+        elif isinstance(value, (list, tuple)):
+            out.append(_T_LIST)
+            out += _U32.pack(len(value))
+            for item in value:
+                self.value(item, out)
+        elif isinstance(value, dict):
+            out.append(_T_DICT)
+            out += _U32.pack(len(value))
+            for key, item in value.items():
+                out += _U32.pack(self.string(str(key)))
+                self.value(item, out)
+        else:
+            raise TypeError(f"无法编码的值类型: {type(value).__name__}")
+
+    def node_ref(self, node_id: Optional[str], block_id: Optional[str]):
+        """写入节点引用"""
+        if block_id is not None and isinstance(node_id, str) and node_id.startswith(block_id + '_'):
+            self.out += _U32.pack(self.string(node_id[len(block_id) + 1:]))
+        else:
+            index = self.string(node_id)
+            if index != _NONE_REF:
+                index |= _FULL_NODE_ID
+            self.out += _U32.pack(index)
+
+    def schema(self, param: Dict[str, Any]) -> int:
+        """登记参数定义，返回其在参数定义表中的索引"""
+        fields = {key: value for key, value in param.items() if key not in _INSTANCE_KEYS}
+        key = tuple((name, repr(value)) for name, value in fields.items())
+        index = self.schemas.get(key)
+        if index is None:
+            index = self.schemas[key] = len(self.schema_list)
+            self.schema_list.append(fields)
+        return index
+
+    def block(self, block: Dict[str, Any]):
+        out = self.out
+        block_id = block.get('id')
+        out += _BLOCK.pack(self.string(block_id), self.string(block['name']), self.string(block['type']))
+        self.value(block['x'])
+        self.value(block['y'])
+        params = block.get('params') or []
+        out += _U16.pack(len(params))
+        for param in params:
+            out += _U32.pack(self.schema(param))
+            if 'value' in param:
+                self.value(param['value'])
+            else:
+                out.append(_T_ABSENT)
+            extras = {key: param[key] for key in _INSTANCE_KEYS[1:] if key in param}
+            self.value(extras or None)
+        for key in ('input_nodes', 'output_nodes'):
+            node_ids = block.get(key) or []
+            out += _U8.pack(len(node_ids))
+            for node_id in node_ids:
+                self.node_ref(node_id, block_id)
+
+    def connection(self, conn: Dict[str, Any]):
+        out = self.out
+        for side in ('from', 'to'):
+            block_id = conn.get(f'{side}_block_id')
+            block_index = conn.get(f'{side}_block')
+            out += _CONNECTION_END.pack(self.string(block_id), -1 if block_index is None else block_index)
+            self.node_ref(conn.get(f'{side}_node'), block_id)
+        out += _U32.pack(self.string(conn.get('type')))
+
+    def encode(self, program_data: Dict[str, Any]) -> bytes:
+        blocks = program_data.get('blocks') or []
+        connections = program_data.get('connections') or []
+        extra = {key: value for key, value in program_data.items() if key not in ('blocks', 'connections')}
+
+        # 先编码程序块主体，同时收集字符串和参数定义
+        body = self.out
+        body += _U32.pack(len(blocks))
+        for block in blocks:
+            self.block(block)
+        body += _U32.pack(len(connections))
+        for conn in connections:
+            self.connection(conn)
+        self.value(extra)
+
+        schema_section = bytearray(_U32.pack(len(self.schema_list)))
+        for fields in self.schema_list:
+            self.value(fields, schema_section)
+
+        result = bytearray(_HEADER.pack(MAGIC, FORMAT_VERSION, 0))
+        result += _U32.pack(len(self.string_list))
+        for text in self.string_list:
+            encoded = text.encode('utf-8')
+            result += _U32.pack(len(encoded))
+            result += encoded
+        result += schema_section
+        result += body
+        return bytes(result)
+
+
+# 解码时整条读取的定长部分
+_CONNECTION = struct.Struct('<IiIIiII')      # 源块ID、源块索引、源节点、目标块ID、目标块索引、目标节点、类型
+_INT_POSITION = struct.Struct('<xqxqH')      # x、y均为整数时：标记、x、标记、y、参数数量
+_PARAM_REF = struct.Struct('<IB')            # 参数定义索引、value的类型标记
+_INT_AFTER_TAG = struct.Struct('<xq')
+_U32_AFTER_TAG = struct.Struct('<xI')
+_F64_AFTER_TAG = struct.Struct('<xd')
+_NODE_REFS = [struct.Struct(f'<{count}I') for count in range(256)]
+
+
+class _Decoder:
+    """解码器：定长部分用预编译的struct整条读取，值按类型标记分派，位置以局部变量传递"""
+
+    def __init__(self, data: bytes):
+        self.data = bytes(data)
+        self.strings: List[str] = []
+        self.schemas: List[Dict[str, Any]] = []
+
+    def value(self, pos: int):
+        """读取带类型标记的值，返回(值, 新位置)"""
+        data = self.data
+        tag = data[pos]
+        if tag == _T_STR:
+            return self.strings[_U32_AFTER_TAG.unpack_from(data, pos)[0]], pos + 5
+        if tag == _T_INT:
+            return _INT_AFTER_TAG.unpack_from(data, pos)[0], pos + 9
+        if tag == _T_FLOAT:
+            return _F64_AFTER_TAG.unpack_from(data, pos)[0], pos + 9
+        if tag == _T_NONE:
+            return None, pos + 1
+        if tag == _T_TRUE:
+            return True, pos + 1
+        if tag == _T_FALSE:
+            return False, pos + 1
+        if tag == _T_LIST:
+            count = _U32_AFTER_TAG.unpack_from(data, pos)[0]
+            pos += 5
+            items = []
+            for _ in range(count):
+                item, pos = self.value(pos)
+                items.append(item)
+            return items, pos
+        if tag == _T_DICT:
+            count = _U32_AFTER_TAG.unpack_from(data, pos)[0]
+            pos += 5
+            result = {}
+            strings = self.strings
+            for _ in range(count):
+                key = strings[_U32.unpack_from(data, pos)[0]]
+                result[key], pos = self.value(pos + 4)
+            return result, pos
+        if tag == _T_BIGINT:
+            return int(self.strings[_U32_AFTER_TAG.unpack_from(data, pos)[0]]), pos + 5
+        if tag == _T_ABSENT:
+            return _ABSENT, pos + 1
+        raise ValueError(f"二进制程序文件已损坏: 未知的值类型标记 {tag}")
+
+    def node_ids(self, pos: int, block_id: Optional[str]):
+        """读取节点引用列表，返回(节点ID列表, 新位置)"""
+        data = self.data
+        count = data[pos]
+        refs = _NODE_REFS[count].unpack_from(data, pos + 1)
+        strings = self.strings
+        prefix = f"{block_id}_"
+        node_ids = []
+        for index in refs:
+            if index == _NONE_REF:
+                node_ids.append(None)
+            elif index & _FULL_NODE_ID:
+                node_ids.append(strings[index & ~_FULL_NODE_ID])
+            else:
+                node_ids.append(prefix + strings[index])
+        return node_ids, pos + 1 + 4 * count
+
+    def blocks(self, pos: int):
+        """读取程序块列表，返回(程序块列表, 新位置)"""
+        data = self.data
+        strings = self.strings
+        schemas = self.schemas
+        value = self.value
+        node_ids = self.node_ids
+        block_header = _BLOCK.unpack_from
+        int_position = _INT_POSITION.unpack_from
+        param_ref = _PARAM_REF.unpack_from
+        int_value = _INT_AFTER_TAG.unpack_from
+        f64_value = _F64_AFTER_TAG.unpack_from
+        count = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        blocks = []
+        for _ in range(count):
+            block_id, name, block_type = block_header(data, pos)
+            pos += 12
+            block_id = None if block_id == _NONE_REF else strings[block_id]
+            if data[pos] == _T_INT and data[pos + 9] == _T_INT:
+                x, y, param_count = int_position(data, pos)
+                pos += 20
+            else:
+                x, pos = value(pos)
+                y, pos = value(pos)
+                param_count = _U16.unpack_from(data, pos)[0]
+                pos += 2
+            params = []
+            for _ in range(param_count):
+                schema, tag = param_ref(data, pos)
+                param = schemas[schema].copy()
+                pos += 4
+                # 常见的整数/浮点参数值直接读取
+                if tag == _T_INT:
+                    param['value'] = int_value(data, pos)[0]
+                    pos += 9
+                elif tag == _T_FLOAT:
+                    param['value'] = f64_value(data, pos)[0]
+                    pos += 9
+                else:
+                    param_value, pos = value(pos)
+                    if param_value is not _ABSENT:
+                        param['value'] = param_value
+                if data[pos] == _T_NONE:
+                    pos += 1
+                else:
+                    extras, pos = value(pos)
+                    if extras:
+                        param.update(extras)
+                params.append(param)
+            input_nodes, pos = node_ids(pos, block_id)
+            output_nodes, pos = node_ids(pos, block_id)
+            blocks.append({
+                'id': block_id,
+                'name': strings[name],
+                'type': strings[block_type],
+                'x': x,
+                'y': y,
+                'params': params,
+                'input_nodes': input_nodes,
+                'output_nodes': output_nodes,
+            })
+        return blocks, pos
+
+    def connections(self, pos: int):
+        """读取连接列表，返回(连接列表, 新位置)"""
+        data = self.data
+        strings = self.strings
+        unpack = _CONNECTION.unpack_from
+        count = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        connections = []
+        for _ in range(count):
+            from_id, from_index, from_node, to_id, to_index, to_node, conn_type = unpack(data, pos)
+            pos += 28
+            from_id = None if from_id == _NONE_REF else strings[from_id]
+            to_id = None if to_id == _NONE_REF else strings[to_id]
+            connections.append({
+                'from_block': from_index,
+                'from_block_id': from_id,
+                'from_node': self.node_id(from_node, from_id),
+                'to_block': to_index,
+                'to_block_id': to_id,
+                'to_node': self.node_id(to_node, to_id),
+                'type': None if conn_type == _NONE_REF else strings[conn_type],
+            })
+        return connections, pos
+
+    def node_id(self, index: int, block_id: Optional[str]) -> Optional[str]:
+        if index == _NONE_REF:
+            return None
+        if index & _FULL_NODE_ID:
+            return self.strings[index & ~_FULL_NODE_ID]
+        return f"{block_id}_{self.strings[index]}"
+
+    def decode(self) -> Dict[str, Any]:
+        data = self.data
+        if len(data) < _HEADER.size:
+            raise ValueError("二进制程序文件已损坏: 文件过短")
+        magic, version, _reserved = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("不是二进制程序文件")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"不支持的二进制程序文件版本: {version}（当前支持{FORMAT_VERSION}）")
+
+        pos = _HEADER.size
+        strings = self.strings
+        count = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        for _ in range(count):
+            length = _U32.unpack_from(data, pos)[0]
+            pos += 4
+            if pos + length > len(data):
+                raise ValueError("二进制程序文件已损坏: 字符串超出文件末尾")
+            strings.append(str(data[pos:pos + length], 'utf-8'))
+            pos += length
+        count = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        schemas = self.schemas
+        for _ in range(count):
+            schema, pos = self.value(pos)
+            schemas.append(schema)
+
+        blocks, pos = self.blocks(pos)
+        connections, pos = self.connections(pos)
+        program_data = {'blocks': blocks, 'connections': connections}
+        extra, pos = self.value(pos)
+        program_data.update(extra)
+        return program_data
+
+
+def encode_program(program_data: Dict[str, Any]) -> bytes:
+    """将程序字典编码为二进制格式"""
+    return _Encoder().encode(program_data)
+
+
+def decode_program(data: bytes) -> Dict[str, Any]:
+    """将二进制格式解码为程序字典"""
+    try:
+        return _Decoder(data).decode()
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"二进制程序文件已损坏: {str(e)}")
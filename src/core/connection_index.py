@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+连接邻接索引模块
+"""
+
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from .data_models import Connection
+
+
+class ConnectionIndex:
+    """连接邻接索引
+
+    按插入顺序保存所有连接，同时维护按节点、按程序块以及按变量名的
+    入边/出边映射，使查询、替换和删除连接的开销与节点度数成正比，
+    而不必扫描整个连接列表。
+    """
+
+    def __init__(self):
+        self._connections: Dict[Connection, None] = {}  # 有序集合
+        self._node_in: Dict[Hashable, List[Connection]] = {}
+        self._node_out: Dict[Hashable, List[Connection]] = {}
+        self._block_in: Dict[Hashable, List[Connection]] = {}
+        self._block_out: Dict[Hashable, List[Connection]] = {}
+        self._variable_in: Dict[str, List[Connection]] = {}
+        self._block_keys: Dict[Connection, Tuple[Any, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def __iter__(self) -> Iterator[Connection]:
+        return iter(self._connections)
+
+    def __contains__(self, connection) -> bool:
+        return connection in self._connections
+
+    @staticmethod
+    def _append(mapping: Dict, key, connection: Connection):
+        """向映射中追加连接"""
+        if key is None:
+            return
+        bucket = mapping.get(key)
+        if bucket is None:
+            mapping[key] = [connection]
+        else:
+            bucket.append(connection)
+
+    @staticmethod
+    def _drop(mapping: Dict, key, connection: Connection):
+        """从映射中移除连接，桶为空时删除键"""
+        if key is None:
+            return
+        bucket = mapping.get(key)
+        if not bucket:
+            return
+        try:
+            bucket.remove(connection)
+        except ValueError:
+            return
+        if not bucket:
+            del mapping[key]
+
+    def add(self, connection: Connection, from_key: Hashable = None, to_key: Hashable = None):
+        """添加连接
+
+        from_key/to_key 为源块和目标块在索引中的键（例如块ID），
+        变量等虚拟端点传入None即可。
+        """
+        if connection in self._connections:
+            return
+        self._connections[connection] = None
+        self._block_keys[connection] = (from_key, to_key)
+        self._append(self._node_out, connection.from_node, connection)
+        self._append(self._node_in, connection.to_node, connection)
+        self._append(self._block_out, from_key, connection)
+        self._append(self._block_in, to_key, connection)
+        variable = getattr(connection.to_node, 'variable', None)
+        if variable is not None:
+            self._append(self._variable_in, variable, connection)
+
+    def discard(self, connection: Connection) -> bool:
+        """移除连接，连接不存在时返回False"""
+        if connection not in self._connections:
+            return False
+        del self._connections[connection]
+        from_key, to_key = self._block_keys.pop(connection, (None, None))
+        self._drop(self._node_out, connection.from_node, connection)
+        self._drop(self._node_in, connection.to_node, connection)
+        self._drop(self._block_out, from_key, connection)
+        self._drop(self._block_in, to_key, connection)
+        variable = getattr(connection.to_node, 'variable', None)
+        if variable is not None:
+            self._drop(self._variable_in, variable, connection)
+        return True
+
+    def clear(self):
+        """清空索引"""
+        self._connections.clear()
+        self._node_in.clear()
+        self._node_out.clear()
+        self._block_in.clear()
+        self._block_out.clear()
+        self._variable_in.clear()
+        self._block_keys.clear()
+
+    def incoming(self, node) -> List[Connection]:
+        """获取连接到指定节点的所有连接"""
+        return list(self._node_in.get(node, ()))
+
+    def outgoing(self, node) -> List[Connection]:
+        """获取从指定节点发出的所有连接"""
+        return list(self._node_out.get(node, ()))
+
+    def block_incoming(self, block_key) -> List[Connection]:
+        """获取连接到指定程序块的所有连接"""
+        return list(self._block_in.get(block_key, ()))
+
+    def block_outgoing(self, block_key) -> List[Connection]:
+        """获取从指定程序块发出的所有连接"""
+        return list(self._block_out.get(block_key, ()))
+
+    def block_connections(self, block_key) -> List[Connection]:
+        """获取与指定程序块相关的所有连接（去重，保持插入顺序）"""
+        related = dict.fromkeys(self._block_out.get(block_key, ()))
+        related.update(dict.fromkeys(self._block_in.get(block_key, ())))
+        return list(related)
+
+    def variable_incoming(self, variable_name: str) -> List[Connection]:
+        """获取赋值给指定变量的所有连接"""
+        return list(self._variable_in.get(variable_name, ()))
+
+    def find(self, from_node, to_node) -> Optional[Connection]:
+        """查找两个节点之间已存在的连接"""
+        for connection in self._node_out.get(from_node, ()):
+            if connection.to_node == to_node:
+                return connection
+        return None
+
+    def block_keys(self, connection: Connection) -> Tuple[Any, Any]:
+        """获取连接登记时使用的源块键和目标块键"""
+        return self._block_keys.get(connection, (None, None))
+
+    def remove_block(self, block_key) -> List[Connection]:
+        """移除与指定程序块相关的所有连接，返回被移除的连接"""
+        removed = self.block_connections(block_key)
+        for connection in removed:
+            self.discard(connection)
+        return removed
+
+    def to_list(self) -> List[Connection]:
+        """按插入顺序返回连接列表"""
+        return list(self._connections)
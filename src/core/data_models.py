@@ -5,8 +5,32 @@
 核心数据模型模块
 """
 
+import copy
+import functools
+import uuid
+import weakref
+from collections.abc import MutableMapping, Sequence
 from enum import Enum
-from typing import List, Dict, Any, Optional
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Tuple
+
+
+def new_block_id() -> str:
+    """生成稳定的程序块ID（与内存地址无关，可跨保存/加载保持不变）"""
+    return uuid.uuid4().hex
+
+
+def resolve_block_index(block_ref, id_to_index: Dict[str, int], block_count: int) -> Optional[int]:
+    """将连接中的块引用解析为块列表索引
+
+    新版连接保存块ID，旧版连接保存列表索引，两种形式都支持；
+    变量等虚拟端点（None或-1）以及无法识别的引用返回None。
+    """
+    if isinstance(block_ref, bool):
+        return None
+    if isinstance(block_ref, int):
+        return block_ref if 0 <= block_ref < block_count else None
+    return id_to_index.get(block_ref)
 
 
 class NodeType(Enum):
@@ -17,7 +41,13 @@ class NodeType(Enum):
 
 
 class Node:
-    """连接节点类"""
+    """连接节点类
+
+    使用__slots__存储属性；variable槽位仅在变量虚拟节点上赋值，
+    未赋值时hasattr(node, 'variable')为False。
+    """
+    __slots__ = ('node_id', 'node_type', 'name', 'value_type', 'connection', 'variable')
+
     def __init__(self, node_id: str, node_type: NodeType, name: str, value_type: str):
         self.node_id = node_id
         self.node_type = node_type
@@ -26,10 +56,301 @@ class Node:
         self.connection = None  # 连接到的其他节点
 
 
+def _freeze(value):
+    """将参数定义中的值转换为带类型标记的可哈希形式，仅用作驻留的键
+
+    类型标记使1、1.0和True、列表和元组等相等但类型不同的值得到不同的键。
+    """
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(_freeze(item) for item in value))
+    if isinstance(value, dict):
+        return (dict, tuple((key, _freeze(item)) for key, item in value.items()))
+    return (type(value), value)
+
+
+def _copy_mutable(value):
+    """共享参数定义中的列表/字典按副本返回，避免修改影响其他程序块"""
+    if isinstance(value, (list, dict)):
+        return copy.deepcopy(value)
+    return value
+
+
+_TRUE_STRINGS = ('true', 'yes', '1', 'y', 't')
+
+# 类型转换缓存中表示参数不存在的标记
+_MISSING = object()
+
+
+def param_to_number(value):
+    """转换为数值：数值保持原样，含小数点的字符串转为float，其余转为int"""
+    if isinstance(value, (int, float)):
+        return value
+    return float(value) if isinstance(value, str) and '.' in value else int(value)
+
+
+def param_to_float(value) -> float:
+    """转换为float"""
+    return float(value)
+
+
+def param_to_bool(value) -> bool:
+    """转换为布尔值：字符串按true/yes/1/y/t（不区分大小写）判断"""
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in _TRUE_STRINGS
+
+
+def param_to_str(value) -> str:
+    """转换为字符串"""
+    return str(value)
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_getter(converter):
+    """生成按converter转换参数值的访问方法 get(self, name, default=None)
+
+    命中缓存时只做两次字典查找。converter由闭包固定，不作为参数传入：
+    比调用get_converted少一层函数调用，与get_param一样快。
+    """
+    def get(self, name: str, default: Any = None):
+        try:
+            value = self._param_cache[converter][name]
+        except (TypeError, KeyError):
+            value = self._convert_param(name, converter)
+        return default if value is _MISSING else value
+    get.__doc__ = f"获取经{converter.__name__}转换后的参数值"
+    return get
+
+
+class ParamSchema:
+    """参数定义（名称、类型、默认值、范围等）
+
+    参数定义不可变，按内容（包括值的类型）驻留：相同内容的定义在所有程序块之间共享同一个对象，
+    每个程序块只保存自己的参数值。fields保存定义字段原值的副本；驻留表只弱引用定义，
+    不再被任何程序块使用的定义会被回收。
+    """
+    __slots__ = ('name', 'type', 'default', 'min', 'max', 'fields', '__weakref__')
+
+    # 属于程序块实例而非参数定义的键
+    INSTANCE_KEYS = frozenset(('value', 'is_variable', 'variable_type'))
+
+    _interned: 'weakref.WeakValueDictionary[tuple, ParamSchema]' = weakref.WeakValueDictionary()
+
+    def __init__(self, fields: Dict[str, Any]):
+        object.__setattr__(self, 'fields', MappingProxyType(fields))
+        object.__setattr__(self, 'name', fields.get('name'))
+        object.__setattr__(self, 'type', fields.get('type'))
+        object.__setattr__(self, 'default', fields.get('default'))
+        object.__setattr__(self, 'min', fields.get('min'))
+        object.__setattr__(self, 'max', fields.get('max'))
+
+    def __setattr__(self, key, value):
+        raise AttributeError("参数定义不可修改")
+
+    @classmethod
+    def intern(cls, param: Dict[str, Any]) -> 'ParamSchema':
+        """获取与参数字典中定义部分内容相同的共享参数定义"""
+        fields = {name: value for name, value in param.items() if name not in cls.INSTANCE_KEYS}
+        key = tuple((name, _freeze(value)) for name, value in fields.items())
+        schema = cls._interned.get(key)
+        if schema is None:
+            schema = cls(copy.deepcopy(fields))
+            cls._interned[key] = schema
+        return schema
+
+    def initial_value(self):
+        """新建程序块时参数的初始值"""
+        if self.type == 'bool':
+            return False
+        elif self.type == 'int' or self.type == 'float':
+            return 0
+        return ''
+
+    def replace(self, key: str, value) -> 'ParamSchema':
+        """返回修改了一个字段的参数定义"""
+        fields = dict(self.fields)
+        fields[key] = value
+        return ParamSchema.intern(fields)
+
+    def without(self, key: str) -> 'ParamSchema':
+        """返回删除了一个字段的参数定义"""
+        fields = dict(self.fields)
+        del fields[key]
+        return ParamSchema.intern(fields)
+
+    def __repr__(self):
+        return f"ParamSchema({dict(self.fields)!r})"
+
+
+class ParamSchemaSet:
+    """一个程序块的全部参数定义（驻留共享，弱引用），附带参数名到位置的索引"""
+    __slots__ = ('schemas', 'index', '__weakref__')
+
+    _interned: 'weakref.WeakValueDictionary[Tuple[ParamSchema, ...], ParamSchemaSet]' = weakref.WeakValueDictionary()
+
+    def __init__(self, schemas: Tuple[ParamSchema, ...]):
+        self.schemas = schemas
+        index = {}
+        for i, schema in enumerate(schemas):
+            # 与线性查找一致，同名参数取第一个
+            index.setdefault(schema.name, i)
+        self.index = index
+
+    @classmethod
+    def intern(cls, schemas) -> 'ParamSchemaSet':
+        """获取共享的参数定义集合"""
+        schemas = tuple(schemas)
+        schema_set = cls._interned.get(schemas)
+        if schema_set is None:
+            schema_set = cls(schemas)
+            cls._interned[schemas] = schema_set
+        return schema_set
+
+    def appended(self, schema: ParamSchema) -> 'ParamSchemaSet':
+        return ParamSchemaSet.intern(self.schemas + (schema,))
+
+    def replaced(self, i: int, schema: ParamSchema) -> 'ParamSchemaSet':
+        schemas = list(self.schemas)
+        schemas[i] = schema
+        return ParamSchemaSet.intern(schemas)
+
+    def removed(self, i: int) -> 'ParamSchemaSet':
+        return ParamSchemaSet.intern(self.schemas[:i] + self.schemas[i + 1:])
+
+    def __len__(self):
+        return len(self.schemas)
+
+
+_EMPTY_SCHEMA_SET = ParamSchemaSet.intern(())
+
+
+class BlockParam(MutableMapping):
+    """程序块参数的字典视图
+
+    'name'、'type'、'min'等定义字段来自共享的ParamSchema，'value'来自程序块的值向量，
+    变量绑定标记等实例字段单独保存。修改定义字段时会为该程序块换用新的共享定义，
+    不影响其他程序块。
+    """
+    __slots__ = ('_block', '_index')
+
+    def __init__(self, block: 'ProgramBlock', index: int):
+        self._block = block
+        self._index = index
+
+    @property
+    def schema(self) -> ParamSchema:
+        return self._block._param_schema.schemas[self._index]
+
+    def _extras(self) -> Optional[Dict[str, Any]]:
+        extras = self._block._param_extras
+        return extras.get(self._index) if extras else None
+
+    def __getitem__(self, key):
+        if key == 'value':
+            return self._block._param_values[self._index]
+        extras = self._extras()
+        if extras and key in extras:
+            return extras[key]
+        return _copy_mutable(self.schema.fields[key])
+
+    def __setitem__(self, key, value):
+        block = self._block
+        if key == 'value':
+            block._param_values[self._index] = value
+            block._param_cache = None
+        elif key in ParamSchema.INSTANCE_KEYS:
+            if block._param_extras is None:
+                block._param_extras = {}
+            block._param_extras.setdefault(self._index, {})[key] = value
+        else:
+            block._param_schema = block._param_schema.replaced(self._index, self.schema.replace(key, value))
+
+    def __delitem__(self, key):
+        block = self._block
+        if key == 'value':
+            raise KeyError("参数值不能删除")
+        extras = self._extras()
+        if extras and key in extras:
+            del extras[key]
+        elif key in self.schema.fields:
+            block._param_schema = block._param_schema.replaced(self._index, self.schema.without(key))
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        yield from self.schema.fields
+        yield 'value'
+        extras = self._extras()
+        if extras:
+            yield from extras
+
+    def __len__(self):
+        extras = self._extras()
+        return len(self.schema.fields) + 1 + (len(extras) if extras else 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为普通字典（用于保存）"""
+        data = {key: _copy_mutable(value) for key, value in self.schema.fields.items()}
+        data['value'] = self._block._param_values[self._index]
+        extras = self._extras()
+        if extras:
+            data.update(extras)
+        return data
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class BlockParams(Sequence):
+    """程序块参数列表视图，兼容原先的参数字典列表用法"""
+    __slots__ = ('_block',)
+
+    def __init__(self, block: 'ProgramBlock'):
+        self._block = block
+
+    def __len__(self):
+        return len(self._block._param_values)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [BlockParam(self._block, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("参数索引超出范围")
+        return BlockParam(self._block, i)
+
+    def __iter__(self):
+        block = self._block
+        for i in range(len(block._param_values)):
+            yield BlockParam(block, i)
+
+    def append(self, param: Dict[str, Any]):
+        self._block.add_param(param)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """转换为参数字典列表（用于保存）"""
+        return [param.to_dict() for param in self]
+
+    def __repr__(self):
+        return repr(self.to_list())
+
+
 class ProgramBlock:
-    """程序块数据类"""
-    def __init__(self, name: str, block_type: str, x: int = 0, y: int = 0, params: List[Dict] = None):
-        self.id = str(id(self))  # 添加唯一ID
+    """程序块数据类
+
+    参数定义按内容驻留共享（ParamSchemaSet），程序块只保存参数值向量；
+    params属性返回兼容字典列表用法的视图。按名称读取参数值使用get_param和
+    get_number/get_bool等类型化访问方法：转换结果按转换函数和参数名缓存
+    （_param_cache: 转换函数 -> {参数名: 转换后的值}），命中时只需两次字典查找，
+    参数值被修改时缓存失效。
+    """
+    __slots__ = ('id', 'name', 'type', 'x', 'y', 'selected', 'input_nodes', 'output_nodes',
+                 '_param_schema', '_param_values', '_param_extras', '_param_cache')
+
+    def __init__(self, name: str, block_type: str, x: int = 0, y: int = 0, params: List[Dict] = None,
+                 block_id: Optional[str] = None):
+        self.id = block_id or new_block_id()  # 稳定的唯一ID，节点ID由它派生
         self.name = name
         self.type = block_type
         self.x = x
@@ -39,40 +360,152 @@ class ProgramBlock:
         self.input_nodes = []  # 输入节点列表
         self.output_nodes = []  # 输出节点列表
         
-        # 为参数设置默认值
-        for param in self.params:
-            if 'value' not in param:
-                if param['type'] == 'bool':
-                    param['value'] = False
-                elif param['type'] == 'int' or param['type'] == 'float':
-                    param['value'] = 0
-                else:
-                    param['value'] = ''
-        
         # 初始化输入输出节点
         self._init_nodes()
-    
+
+    @property
+    def params(self) -> BlockParams:
+        """参数列表视图"""
+        return BlockParams(self)
+
+    @params.setter
+    def params(self, params):
+        if isinstance(params, BlockParams):
+            # 复制其他程序块的参数：共享参数定义，只复制值
+            source = params._block
+            self._param_schema = source._param_schema
+            self._param_values = list(source._param_values)
+            self._param_extras = ({i: dict(extras) for i, extras in source._param_extras.items()}
+                                  if source._param_extras else None)
+            self._param_cache = None
+            return
+        self._param_schema = _EMPTY_SCHEMA_SET
+        self._param_values = []
+        self._param_extras = None
+        self._param_cache = None
+        schemas = []
+        for param in params:
+            schemas.append(self._append_param_value(param))
+        self._param_schema = ParamSchemaSet.intern(schemas)
+
+    def _append_param_value(self, param) -> ParamSchema:
+        """保存参数值和实例字段，返回共享的参数定义"""
+        if isinstance(param, BlockParam):
+            param = param.to_dict()
+        schema = ParamSchema.intern(param)
+        # 为参数设置默认值
+        self._param_values.append(param['value'] if 'value' in param else schema.initial_value())
+        extras = {key: param[key] for key in ParamSchema.INSTANCE_KEYS if key != 'value' and key in param}
+        if extras:
+            if self._param_extras is None:
+                self._param_extras = {}
+            self._param_extras[len(self._param_values) - 1] = extras
+        return schema
+
+    def add_param(self, param: Dict[str, Any]) -> BlockParam:
+        """追加一个参数"""
+        schema = self._append_param_value(param)
+        self._param_schema = self._param_schema.appended(schema)
+        return BlockParam(self, len(self._param_values) - 1)
+
+    def replace_param(self, index: int, param: Dict[str, Any]):
+        """用参数字典整体替换指定位置的参数（定义、值和实例字段）"""
+        schema = ParamSchema.intern(param)
+        self._param_schema = self._param_schema.replaced(index, schema)
+        self._param_values[index] = param['value'] if 'value' in param else schema.initial_value()
+        extras = {key: param[key] for key in ParamSchema.INSTANCE_KEYS if key != 'value' and key in param}
+        if extras:
+            if self._param_extras is None:
+                self._param_extras = {}
+            self._param_extras[index] = extras
+        elif self._param_extras:
+            self._param_extras.pop(index, None)
+        self._param_cache = None
+
+    def remove_param(self, index: int):
+        """删除指定位置的参数"""
+        self._param_schema = self._param_schema.removed(index)
+        del self._param_values[index]
+        if self._param_extras:
+            self._param_extras = {(i if i < index else i - 1): extras
+                                  for i, extras in self._param_extras.items() if i != index}
+        self._param_cache = None
+
+    def param_index(self, name: str) -> Optional[int]:
+        """按参数名获取参数位置，不存在时返回None"""
+        return self._param_schema.index.get(name)
+
+    def find_param(self, name: str) -> Optional[BlockParam]:
+        """按参数名获取参数，不存在时返回None"""
+        index = self._param_schema.index.get(name)
+        return BlockParam(self, index) if index is not None else None
+
+    def has_param(self, name: str) -> bool:
+        """是否存在指定名称的参数"""
+        return name in self._param_schema.index
+
+    def get_param(self, name: str, default: Any = None) -> Any:
+        """按参数名获取参数值，参数不存在时返回default"""
+        index = self._param_schema.index.get(name)
+        if index is None:
+            return default
+        return self._param_values[index]
+
+    def set_param(self, name: str, value: Any):
+        """按参数名设置参数值"""
+        index = self._param_schema.index.get(name)
+        if index is None:
+            raise KeyError(f"参数不存在: {name}")
+        self._param_values[index] = value
+        self._param_cache = None
+
+    def get_converted(self, name: str, converter, default: Any = None) -> Any:
+        """获取经converter转换后的参数值
+
+        参数不存在时返回default，转换失败时抛出converter的异常（不缓存）。
+        """
+        return _cached_getter(converter)(self, name, default)
+
+    def _convert_param(self, name: str, converter) -> Any:
+        """转换参数值并写入缓存，参数不存在时缓存并返回_MISSING"""
+        index = self._param_schema.index.get(name)
+        value = _MISSING if index is None else converter(self._param_values[index])
+        cache = self._param_cache
+        if cache is None:
+            cache = self._param_cache = {}
+        values = cache.get(converter)
+        if values is None:
+            values = cache[converter] = {}
+        values[name] = value
+        return value
+
+    # 常用转换的访问方法
+    get_number = _cached_getter(param_to_number)
+    get_float = _cached_getter(param_to_float)
+    get_bool = _cached_getter(param_to_bool)
+    get_str = _cached_getter(param_to_str)
+
     def _init_nodes(self):
         """初始化输入输出节点"""
         # 为逻辑块创建条件输入和两个分支输出
         if self.type == 'logic' and (self.name == '条件判断' or self.name == '如果' or self.name == '如果-否则'):
             # 创建条件输入节点，支持boolean类型变量
             self.input_nodes.append(Node(
-                node_id=f"{id(self)}_cond",
+                node_id=f"{self.id}_cond",
                 node_type=NodeType.INPUT,
                 name="条件",
                 value_type="boolean"
             ))
             # 创建真分支输出节点
             self.output_nodes.append(Node(
-                node_id=f"{id(self)}_true",
+                node_id=f"{self.id}_true",
                 node_type=NodeType.OUTPUT,
                 name="真",
                 value_type="execution"
             ))
             # 创建假分支输出节点
             self.output_nodes.append(Node(
-                node_id=f"{id(self)}_false",
+                node_id=f"{self.id}_false",
                 node_type=NodeType.OUTPUT,
                 name="假",
                 value_type="execution"
@@ -81,28 +514,28 @@ class ProgramBlock:
         elif self.type == 'logic' and (self.name == '循环' or self.name == '当条件满足时循环' or self.name == '无限循环'):
             # 添加开始输入节点
             self.input_nodes.append(Node(
-                node_id=f"{id(self)}_start",
+                node_id=f"{self.id}_start",
                 node_type=NodeType.INPUT,
                 name="开始",
                 value_type="execution"
             ))
             # 添加结束输入节点
             self.input_nodes.append(Node(
-                node_id=f"{id(self)}_end",
+                node_id=f"{self.id}_end",
                 node_type=NodeType.INPUT,
                 name="结束",
                 value_type="execution"
             ))
             # 添加循环体输出节点
             self.output_nodes.append(Node(
-                node_id=f"{id(self)}_loop",
+                node_id=f"{self.id}_loop",
                 node_type=NodeType.OUTPUT,
                 name="循环体",
                 value_type="execution"
             ))
             # 添加完成输出节点
             self.output_nodes.append(Node(
-                node_id=f"{id(self)}_done",
+                node_id=f"{self.id}_done",
                 node_type=NodeType.OUTPUT,
                 name="完成",
                 value_type="execution"
@@ -111,14 +544,14 @@ class ProgramBlock:
         else:
             # 添加控制流输入节点
             self.input_nodes.append(Node(
-                node_id=f"{id(self)}_input",
+                node_id=f"{self.id}_input",
                 node_type=NodeType.INPUT,
                 name="输入",
                 value_type="execution"
             ))
             # 添加控制流输出节点
             self.output_nodes.append(Node(
-                node_id=f"{id(self)}_output",
+                node_id=f"{self.id}_output",
                 node_type=NodeType.OUTPUT,
                 name="输出",
                 value_type="execution"
@@ -127,7 +560,7 @@ class ProgramBlock:
         # 为传感器块添加数据输出节点
         if self.type == 'sensor':
             self.output_nodes.append(Node(
-                node_id=f"{id(self)}_data",
+                node_id=f"{self.id}_data",
                 node_type=NodeType.OUTPUT,
                 name="数据输出",
                 value_type="float"
@@ -135,21 +568,24 @@ class ProgramBlock:
 
 
 class Connection:
+    """连接类
+
+    source_block/source_node/target_block/target_node为旧版属性名，
+    以属性方式映射到from_block/from_node/to_block/to_node，不再重复存储。
+    """
+    __slots__ = ('from_block', 'from_node', 'to_block', 'to_node',
+                 'source_node_type', 'target_node_type', 'type')
+
     def __init__(self, from_block=None, from_node=None, to_block=None, to_node=None,
                  source_block=None, source_node=None, target_block=None, target_node=None,
                  source_node_type=None, target_node_type=None):
         # 支持旧版和新版的参数命名
+        # from_block/to_block保存块ID（旧版为列表索引），变量等虚拟端点为None
         self.from_block = from_block if from_block is not None else source_block
         self.from_node = from_node if from_node is not None else source_node
         self.to_block = to_block if to_block is not None else target_block
         self.to_node = to_node if to_node is not None else target_node
         
-        # 为了向后兼容保留旧属性
-        self.source_block = self.from_block
-        self.source_node = self.from_node
-        self.target_block = self.to_block
-        self.target_node = self.to_node
-        
         self.source_node_type = source_node_type
         self.target_node_type = target_node_type
         self.type = 'data'  # 默认类型
@@ -162,6 +598,39 @@ class Connection:
             source_node.connection = target_node
             target_node.connection = source_node
     
+    # 为了向后兼容保留旧属性名
+    @property
+    def source_block(self):
+        return self.from_block
+
+    @source_block.setter
+    def source_block(self, value):
+        self.from_block = value
+
+    @property
+    def source_node(self):
+        return self.from_node
+
+    @source_node.setter
+    def source_node(self, value):
+        self.from_node = value
+
+    @property
+    def target_block(self):
+        return self.to_block
+
+    @target_block.setter
+    def target_block(self, value):
+        self.to_block = value
+
+    @property
+    def target_node(self):
+        return self.to_node
+
+    @target_node.setter
+    def target_node(self, value):
+        self.to_node = value
+
     def to_dict(self):
         return {
             'source_block': self.source_block,
@@ -207,6 +676,8 @@ class Connection:
 
 class Variable:
     """变量类"""
+    __slots__ = ('name', 'type', 'value', 'unit', 'description', 'is_readonly', 'is_temporary')
+
     def __init__(self, name: str, var_type: str, value: Any, unit: str = '', 
                  description: str = '', is_readonly: bool = False, is_temporary: bool = False):
         self.name = name
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+表达式模块
+
+条件、赋值等参数中的表达式用ast解析，只允许白名单中的语法（算术、比较、逻辑运算、
+条件表达式、变量和少量内置函数），常量子表达式在编译时折叠，编译结果按表达式文本缓存。
+模拟器用编译结果求值，表达式编辑器用它即时验证，代码生成器输出规范化后的源码。
+"""
+
+import ast
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Optional
+
+# 表达式中可以调用的函数
+ALLOWED_FUNCTIONS = {
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'round': round,
+    'int': int,
+    'float': float,
+    'bool': bool,
+}
+
+# 整数幂运算允许的最大指数，防止一个表达式耗尽CPU和内存
+MAX_POW_EXPONENT = 10000
+
+# 常量折叠产生的字符串最大长度
+_MAX_FOLDED_LENGTH = 10000
+
+# 常量折叠产生的整数最大位数（二进制），更大的整数写成字面量后超出int与字符串转换的位数限制
+_MAX_FOLDED_BITS = 4096
+
+_ALLOWED_BINARY_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_ALLOWED_UNARY_OPS = (ast.UAdd, ast.USub, ast.Not)
+_ALLOWED_COMPARE_OPS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+_ALLOWED_CONSTANTS = (bool, int, float, str, type(None))
+
+_NODE_NAMES = {
+    ast.Attribute: '属性访问',
+    ast.Subscript: '下标访问',
+    ast.Lambda: 'lambda表达式',
+    ast.ListComp: '列表推导式',
+    ast.SetComp: '集合推导式',
+    ast.DictComp: '字典推导式',
+    ast.GeneratorExp: '生成器表达式',
+    ast.NamedExpr: '赋值表达式',
+    ast.Await: 'await',
+    ast.Yield: 'yield',
+    ast.List: '列表',
+    ast.Tuple: '元组',
+    ast.Dict: '字典',
+    ast.Set: '集合',
+    ast.JoinedStr: 'f字符串',
+    ast.Starred: '解包',
+}
+
+
+def _checked_pow(base, exponent):
+    """带指数上限的幂运算"""
+    if (isinstance(base, int) and isinstance(exponent, int)
+            and abs(exponent) > MAX_POW_EXPONENT and abs(base) > 1):
+        raise ExpressionError(f"幂运算的指数过大: {exponent}")
+    return base ** exponent
+
+
+_POW_FUNCTION = '_pow'
+
+# 求值使用的全局命名空间：不含内置函数，只有白名单函数
+_GLOBALS: Dict[str, Any] = dict(ALLOWED_FUNCTIONS, __builtins__={}, **{_POW_FUNCTION: _checked_pow})
+
+
+class ExpressionError(ValueError):
+    """表达式无效（语法错误或使用了不允许的语法）"""
+
+    def __init__(self, message: str, offset: Optional[int] = None):
+        super().__init__(message)
+        self.message = message
+        self.offset = offset  # 出错位置（从0开始的字符偏移），未知时为None
+
+
+class CompiledExpression:
+    """编译后的表达式"""
+    __slots__ = ('text', 'source', 'names', 'code', 'is_constant', 'value')
+
+    def __init__(self, text: str, source: str, names: FrozenSet[str], code, is_constant: bool, value: Any):
+        self.text = text              # 原始文本
+        self.source = source          # 常量折叠后的规范化源码
+        self.names = names            # 引用的变量名
+        self.code = code
+        self.is_constant = is_constant
+        self.value = value            # 常量表达式的值
+
+    def evaluate(self, variables: Dict[str, Any]) -> Any:
+        """以variables为变量求值，引用未定义的变量时抛出NameError"""
+        if self.is_constant:
+            return self.value
+        return eval(self.code, _GLOBALS, variables)
+
+    __call__ = evaluate
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
+
+class _Validator(ast.NodeVisitor):
+    """检查表达式只使用白名单中的语法"""
+
+    def _reject(self, node, description: str):
+        raise ExpressionError(f"不支持的语法: {description}", getattr(node, 'col_offset', None))
+
+    def generic_visit(self, node):
+        self._reject(node, _NODE_NAMES.get(type(node), type(node).__name__))
+
+    def visit_Expression(self, node):
+        self.visit(node.body)
+
+    def visit_BoolOp(self, node):
+        for value in node.values:
+            self.visit(value)
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _ALLOWED_BINARY_OPS):
+            self._reject(node, f"运算符 {type(node.op).__name__}")
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _ALLOWED_UNARY_OPS):
+            self._reject(node, f"运算符 {type(node.op).__name__}")
+        self.visit(node.operand)
+
+    def visit_Compare(self, node):
+        for op in node.ops:
+            if not isinstance(op, _ALLOWED_COMPARE_OPS):
+                self._reject(node, f"比较运算符 {type(op).__name__}")
+        self.visit(node.left)
+        for comparator in node.comparators:
+            self.visit(comparator)
+
+    def visit_IfExp(self, node):
+        self.visit(node.test)
+        self.visit(node.body)
+        self.visit(node.orelse)
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in ALLOWED_FUNCTIONS:
+            self._reject(node, "函数调用（只能调用 " + '、'.join(ALLOWED_FUNCTIONS) + "）")
+        if node.keywords:
+            self._reject(node, "关键字参数")
+        for arg in node.args:
+            self.visit(arg)
+
+    def visit_Name(self, node):
+        if not isinstance(node.ctx, ast.Load) or node.id.startswith('_'):
+            self._reject(node, f"名称 {node.id}")
+
+    def visit_Constant(self, node):
+        if not isinstance(node.value, _ALLOWED_CONSTANTS):
+            self._reject(node, f"常量 {node.value!r}")
+
+
+class _ConstantFolder(ast.NodeTransformer):
+    """把只由常量组成的子表达式替换为其值，求值出错的子表达式保留到运行时"""
+
+    def _fold(self, node):
+        try:
+            value = eval(compile(ast.Expression(body=node), '<expression>', 'eval'), _GLOBALS, {})
+        except Exception:
+            return node
+        if not isinstance(value, _ALLOWED_CONSTANTS):
+            return node
+        if isinstance(value, str) and len(value) > _MAX_FOLDED_LENGTH:
+            return node
+        if isinstance(value, int) and value.bit_length() > _MAX_FOLDED_BITS:
+            return node
+        return ast.copy_location(ast.Constant(value=value), node)
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if not (isinstance(node.left, ast.Constant) and isinstance(node.right, ast.Constant)):
+            return node
+        left, right = node.left.value, node.right.value
+        if isinstance(node.op, ast.Pow):
+            if isinstance(right, (int, float)) and abs(right) > MAX_POW_EXPONENT:
+                return node
+        elif isinstance(node.op, ast.Mult) and (isinstance(left, str) or isinstance(right, str)):
+            # 防止 'a' * 100000000 之类的表达式在编译时生成巨大的字符串
+            text, count = (left, right) if isinstance(left, str) else (right, left)
+            if isinstance(count, int) and len(text) * count > _MAX_FOLDED_LENGTH:
+                return node
+        return self._fold(node)
+
+    def _visit_with_constant_children(self, node, children):
+        self.generic_visit(node)
+        if all(isinstance(child, ast.Constant) for child in children(node)):
+            return self._fold(node)
+        return node
+
+    def visit_UnaryOp(self, node):
+        return self._visit_with_constant_children(node, lambda n: [n.operand])
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        # 开头的常量可以按短路规则化简：and遇到假值、or遇到真值时结果就是该常量，否则该常量可以去掉
+        is_and = isinstance(node.op, ast.And)
+        values = list(node.values)
+        while len(values) > 1 and isinstance(values[0], ast.Constant):
+            if bool(values[0].value) != is_and:
+                return values[0]
+            values.pop(0)
+        if len(values) == 1:
+            return values[0]
+        node.values = values
+        return node
+
+    def visit_Compare(self, node):
+        return self._visit_with_constant_children(node, lambda n: [n.left] + n.comparators)
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_Call(self, node):
+        return self._visit_with_constant_children(node, lambda n: n.args)
+
+
+class _PowRewriter(ast.NodeTransformer):
+    """把运行时的幂运算改为调用带指数上限的函数"""
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            call = ast.Call(func=ast.Name(id=_POW_FUNCTION, ctx=ast.Load()),
+                            args=[node.left, node.right], keywords=[])
+            return ast.copy_location(call, node)
+        return node
+
+
+def _compile(text: str) -> CompiledExpression:
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as e:
+        offset = e.offset - 1 if e.offset else None
+        raise ExpressionError(f"语法错误: {e.msg}", offset)
+    except ValueError as e:
+        raise ExpressionError(f"语法错误: {str(e)}")
+
+    _Validator().visit(tree)
+
+    try:
+        tree = ast.fix_missing_locations(_ConstantFolder().visit(tree))
+        source = ast.unparse(tree)
+        if isinstance(tree.body, ast.Constant):
+            return CompiledExpression(text, source, frozenset(), None, True, tree.body.value)
+
+        # 折叠后仍被引用的变量（例如 False and x 中的x不再需要），被调用的函数名不算变量
+        functions = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+        names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and id(node) not in functions}
+
+        tree = ast.fix_missing_locations(_PowRewriter().visit(tree))
+        code = compile(tree, '<expression>', 'eval')
+    except (ValueError, OverflowError, RecursionError) as e:
+        # 例如常量超出int与字符串转换的位数限制、嵌套过深
+        raise ExpressionError(f"表达式无法编译: {str(e)}")
+    return CompiledExpression(text, source, frozenset(names), code, False, None)
+
+
+@lru_cache(maxsize=4096)
+def _compile_cached(text: str):
+    try:
+        return _compile(text)
+    except ExpressionError as e:
+        # 只缓存错误信息，避免缓存的异常对象累积回溯信息
+        return (e.message, e.offset)
+
+
+def compile_expression(text: Any) -> CompiledExpression:
+    """编译表达式（按文本缓存），表达式无效时抛出ExpressionError"""
+    if not isinstance(text, str):
+        text = str(text)
+    result = _compile_cached(text)
+    if isinstance(result, tuple):
+        raise ExpressionError(*result)
+    return result
+
+
+def check_expression(text: Any, known_names: Optional[Iterable[str]] = None) -> Optional[str]:
+    """验证表达式，有效时返回None，否则返回错误信息
+
+    给出known_names时，引用其中没有的变量也视为错误。
+    """
+    try:
+        compiled = compile_expression(text)
+    except ExpressionError as e:
+        return e.message
+    if known_names is not None:
+        unknown = sorted(compiled.names.difference(known_names))
+        if unknown:
+            return "未定义的变量: " + '、'.join(unknown)
+    return None
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+程序文件读写模块
+
+JSON格式的程序文件（.robot/.json）以流式方式解析：blocks和connections数组逐个元素
+解码，不需要先把整个文件读入内存再构建对象。安装了ijson时优先使用ijson。
+"""
+
+import io
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .binary_format import MAGIC, encode_program, decode_program, is_binary_program
+from .data_models import ProgramBlock, Connection, Node, NodeType, resolve_block_index
+
+try:
+    import ijson
+except ImportError:  # ijson为可选依赖
+    ijson = None
+
+
+# 二进制程序文件扩展名（见binary_format）
+BINARY_EXTENSION = '.robotb'
+
+# 程序文件对话框使用的过滤器
+FILE_FILTER = "程序文件 (*.robot);;二进制程序文件 (*.robotb);;JSON文件 (*.json);;YAML文件 (*.yaml;*.yml)"
+
+# 以流式方式逐个元素解析的顶层数组
+STREAMED_KEYS = ('blocks', 'connections')
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _JsonStreamReader:
+    """基于JSONDecoder.raw_decode的流式读取器（未安装ijson时使用）
+
+    只解析顶层对象：STREAMED_KEYS中的数组逐个元素产出，其余顶层键整体解码。
+    """
+
+    def __init__(self, fp, chunk_size: int = 1 << 16):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """读入下一块数据，已到文件末尾时返回False"""
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 丢弃已解析的部分，保证缓冲区大小有界
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """跳过空白并返回下一个字符，文件结束时返回空字符串"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"程序文件格式错误: 位置{self.pos}处应为'{char}'")
+        self.pos += 1
+
+    def _decode(self) -> Any:
+        """解码下一个完整的JSON值，数据不足时继续读入"""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # 数字等值可能恰好在缓冲区末尾被截断，读入更多数据后重新解码
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """按文件顺序产出(顶层键, 值)；流式数组的每个元素单独产出"""
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._decode()
+            self._expect(':')
+            if key in STREAMED_KEYS and self._peek() == '[':
+                self.pos += 1
+                if self._peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self._decode()
+                        if self._peek() == ',':
+                            self.pos += 1
+                            continue
+                        self._expect(']')
+                        break
+            else:
+                yield key, self._decode()
+            if self._peek() == ',':
+                self.pos += 1
+                continue
+            self._expect('}')
+            return
+
+
+def _iter_ijson_items(fp) -> Iterator[Tuple[str, Any]]:
+    """使用ijson按文件顺序产出(顶层键, 值)"""
+    builder = None
+    key = None
+    depth = 0
+    for prefix, event, value in ijson.parse(fp, use_float=True):
+        if builder is not None:
+            # 正在构建一个元素或顶层值
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+                if depth == 0:
+                    yield key, builder.value
+                    builder = None
+            continue
+        # 顶层对象本身的开始、结束以及键名
+        if prefix == '':
+            continue
+        if prefix in STREAMED_KEYS and event in ('start_array', 'end_array'):
+            continue
+        # 流式数组的元素或其他顶层值
+        key = prefix.split('.', 1)[0]
+        if event in ('start_map', 'start_array'):
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            depth = 1
+        else:
+            yield key, value
+
+
+def iter_program_items(fp) -> Iterator[Tuple[str, Any]]:
+    """流式读取JSON程序文件，按文件顺序产出(顶层键, 值)
+
+    blocks/connections数组中的每个元素作为一项单独产出。fp需以二进制方式打开。
+    """
+    if ijson is not None:
+        return _iter_ijson_items(fp)
+    return _JsonStreamReader(io.TextIOWrapper(fp, encoding='utf-8')).items()
+
+
+class LoadedProgram:
+    """加载得到的程序：程序块、连接以及加载统计信息"""
+
+    def __init__(self):
+        self.blocks: List[ProgramBlock] = []
+        self.connections: List[Connection] = []
+        self.extra: Dict[str, Any] = {}  # 其他顶层字段
+        self.skipped_blocks = 0
+        self.skipped_connections = 0
+        self.elapsed = 0.0
+
+    def summary(self) -> str:
+        text = f"{len(self.blocks)}个程序块, {len(self.connections)}个连接, 用时{self.elapsed * 1000:.0f}毫秒"
+        if self.skipped_blocks:
+            text += f", 跳过{self.skipped_blocks}个无效程序块"
+        if self.skipped_connections:
+            text += f", 跳过{self.skipped_connections}个无效连接"
+        return text
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _reference(value):
+    """文件中的块ID/节点ID/块索引，其他类型（手工编辑的文件中可能出现列表等）视为未指定"""
+    return value if isinstance(value, (str, int)) else None
+
+
+def _variable_node(node_id, output: bool) -> Optional[Node]:
+    """根据变量虚拟节点的ID（var_变量名_output/var_变量名_input）重建节点
+
+    文件中不保存变量类型，值类型由add_connection按另一端程序块的节点补上。
+    """
+    suffix = '_output' if output else '_input'
+    if not (isinstance(node_id, str) and node_id.startswith('var_') and node_id.endswith(suffix)):
+        return None
+    name = node_id[len('var_'):-len(suffix)]
+    if not name:
+        return None
+    node = Node(node_id=node_id, node_type=NodeType.OUTPUT if output else NodeType.INPUT,
+                name=f'var_{name}', value_type='unknown')
+    node.variable = name
+    return node
+
+
+def _is_valid_block_data(block_data) -> bool:
+    """块数据是否包含构建程序块所需的字段（其余问题由validation报告）"""
+    return (type(block_data) is dict
+            and isinstance(block_data.get("name"), str)
+            and isinstance(block_data.get("type"), str)
+            and _is_number(block_data.get("x"))
+            and _is_number(block_data.get("y"))
+            and isinstance(block_data.get("params", []), list)
+            and isinstance(block_data.get("id"), (str, type(None))))
+
+
+class ProgramBuilder:
+    """根据保存的块数据和连接数据构建程序
+
+    构建块时登记节点ID到节点对象的映射（包括文件中保存的节点ID），
+    解析连接时按节点ID直接查找，不再逐个扫描节点列表。
+    连接变量的一端没有程序块，按节点ID重建变量虚拟节点。
+    无法构建的块和连接跳过并计数，不中断加载。
+    """
+
+    def __init__(self):
+        self.program = LoadedProgram()
+        self.block_map: Dict[str, ProgramBlock] = {}
+        self.node_map: Dict[str, Tuple[ProgramBlock, Node]] = {}
+        self._pending_connections: List[Dict[str, Any]] = []
+
+    def add_block(self, block_data: Dict[str, Any]) -> Optional[ProgramBlock]:
+        """根据块数据创建程序块，块数据无效时返回None"""
+        if not _is_valid_block_data(block_data):
+            self.program.skipped_blocks += 1
+            return None
+        # 如果保存的数据中有ID，使用它（节点ID由块ID派生）；否则自动生成ID
+        try:
+            block = ProgramBlock(
+                name=block_data["name"],
+                block_type=block_data["type"],
+                x=block_data["x"],
+                y=block_data["y"],
+                params=block_data.get("params", []),
+                block_id=block_data.get("id")
+            )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            # 参数列表中的元素无效
+            self.program.skipped_blocks += 1
+            return None
+        self.program.blocks.append(block)
+        self.block_map[block.id] = block
+
+        node_map = self.node_map
+        for nodes, saved_ids in ((block.input_nodes, block_data.get("input_nodes")),
+                                 (block.output_nodes, block_data.get("output_nodes"))):
+            for node in nodes:
+                node_map[node.node_id] = (block, node)
+            # 旧版文件的节点ID与重新生成的不同，按位置对应
+            if isinstance(saved_ids, list):
+                for saved_id, node in zip(saved_ids, nodes):
+                    if _reference(saved_id) is not None:
+                        node_map.setdefault(saved_id, (block, node))
+        return block
+
+    def _find_block(self, conn_data: Dict[str, Any], key: str) -> Optional[ProgramBlock]:
+        """根据连接数据查找块，优先使用块ID，旧版文件使用列表索引"""
+        block = self.block_map.get(_reference(conn_data.get(f"{key}_id")))
+        if block is None:
+            blocks = self.program.blocks
+            index = resolve_block_index(_reference(conn_data.get(key)), {}, len(blocks))
+            if index is not None:
+                block = blocks[index]
+        return block
+
+    def _find_node(self, conn_data: Dict[str, Any], key: str,
+                   output: bool) -> Optional[Tuple[Optional[ProgramBlock], Node]]:
+        """按节点ID查找连接端点，返回(所属块, 节点)；变量端点的所属块为None"""
+        node_id = _reference(conn_data.get(f"{key}_node"))
+        found = self.node_map.get(node_id)
+        saved_block = self._find_block(conn_data, f"{key}_block")
+        if found is None:
+            if saved_block is not None:
+                return None
+            node = _variable_node(node_id, output)
+            return (None, node) if node is not None else None
+        block, node = found
+        # 节点必须属于连接记录的块（如果记录了块）
+        if saved_block is not None and saved_block is not block:
+            return None
+        if (node in block.output_nodes) != output:
+            return None
+        return found
+
+    def add_connection(self, conn_data: Dict[str, Any]) -> Optional[Connection]:
+        """根据连接数据创建连接，端点无法解析时返回None"""
+        if type(conn_data) is not dict:
+            self.program.skipped_connections += 1
+            return None
+        source = self._find_node(conn_data, "from", True)
+        target = self._find_node(conn_data, "to", False) if source is not None else None
+        if source is None or target is None or (source[0] is None and target[0] is None):
+            self.program.skipped_connections += 1
+            return None
+        # 变量节点使用另一端节点的值类型（与在画布上连接变量时一致）
+        if source[0] is None:
+            source[1].value_type = target[1].value_type
+        elif target[0] is None:
+            target[1].value_type = source[1].value_type
+        connection = Connection(
+            from_block=source[0].id if source[0] is not None else None,
+            from_node=source[1],
+            to_block=target[0].id if target[0] is not None else None,
+            to_node=target[1]
+        )
+        self.program.connections.append(connection)
+        return connection
+
+    def add_item(self, key: str, value: Any):
+        """处理一个顶层项"""
+        if key == 'blocks':
+            self.add_block(value)
+        elif key == 'connections':
+            if self.program.blocks and not self._pending_connections:
+                # 保存的文件中blocks在connections之前，此时块已全部读入，直接解析
+                self.add_connection(value)
+            else:
+                # 连接出现在块之前（手工编辑的文件），先暂存
+                self._pending_connections.append(value)
+        else:
+            self.program.extra[key] = value
+
+    def build_from_items(self, items) -> LoadedProgram:
+        """从(顶层键, 值)序列构建程序"""
+        for key, value in items:
+            self.add_item(key, value)
+        for conn_data in self._pending_connections:
+            self.add_connection(conn_data)
+        self._pending_connections = []
+        return self.program
+
+
+def _iter_document_items(program_data: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """把已完整解析的文档展开为(顶层键, 值)序列"""
+    for key, value in program_data.items():
+        if key in STREAMED_KEYS and isinstance(value, list):
+            for item in value:
+                yield key, item
+        else:
+            yield key, value
+
+
+def _yaml_codec():
+    """返回(yaml模块, 加载器, 输出器)，安装了libyaml时使用其C实现，否则使用纯Python实现"""
+    import yaml
+    return (yaml,
+            getattr(yaml, 'CSafeLoader', yaml.SafeLoader),
+            getattr(yaml, 'CSafeDumper', yaml.SafeDumper))
+
+
+def yaml_backend() -> Optional[str]:
+    """当前使用的YAML实现：'libyaml'、'python'，未安装PyYAML时为None"""
+    try:
+        yaml, loader, _ = _yaml_codec()
+    except ImportError:
+        return None
+    return 'python' if loader is yaml.SafeLoader else 'libyaml'
+
+
+def iter_program_file(file_path: str) -> Iterator[Tuple[str, Any]]:
+    """读取程序文件，按文件顺序产出(顶层键, 值)，不构建程序块对象
+
+    二进制格式按文件头识别（改了扩展名的文件也能加载），其余格式由扩展名决定。
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in ('.json', '.robot', BINARY_EXTENSION, '.yaml', '.yml'):
+        raise ValueError(f"不支持的文件格式: {ext}")
+
+    with open(file_path, 'rb') as f:
+        if is_binary_program(f.read(len(MAGIC))):
+            f.seek(0)
+            yield from _iter_document_items(decode_program(f.read()))
+            return
+        f.seek(0)
+        if ext in ('.yaml', '.yml'):
+            try:
+                yaml, loader, _ = _yaml_codec()
+            except ImportError:
+                raise ValueError("未安装PyYAML，无法读取YAML文件")
+            # 以二进制方式读取，由加载器自行解码
+            try:
+                program_data = yaml.load(f, Loader=loader) or {}
+            except yaml.YAMLError as e:
+                raise ValueError(f"YAML格式错误: {str(e)}")
+            yield from _iter_document_items(program_data)
+        else:
+            yield from iter_program_items(f)
+
+
+def load_program_file(file_path: str, validator=None) -> LoadedProgram:
+    """加载程序文件，格式由扩展名决定
+
+    指定validator（validation.ProgramStreamValidator）时，读取的每一项同时交给它验证。
+    """
+    start = time.perf_counter()
+    items = iter_program_file(file_path)
+    if validator is not None:
+        items = validator.watch(items)
+    program = ProgramBuilder().build_from_items(items)
+    program.elapsed = time.perf_counter() - start
+    return program
+
+
+def build_program(program_data: Dict[str, Any]) -> LoadedProgram:
+    """根据已解析的程序字典构建程序"""
+    return ProgramBuilder().build_from_items(_iter_document_items(program_data))
+
+
+def block_to_dict(block: ProgramBlock) -> Dict[str, Any]:
+    """将程序块转换为可保存的字典"""
+    return {
+        "id": block.id,
+        "name": block.name,
+        "type": block.type,
+        "x": block.x,
+        "y": block.y,
+        "params": block.params.to_list(),
+        "input_nodes": [node.node_id for node in block.input_nodes],
+        "output_nodes": [node.node_id for node in block.output_nodes]
+    }
+
+
+def connection_to_dict(conn: Connection) -> Dict[str, Any]:
+    """将连接转换为字典（以块ID引用程序块）"""
+    return {
+        "from_block_id": conn.from_block,
+        "from_node": conn.from_node.node_id,
+        "to_block_id": conn.to_block,
+        "to_node": conn.to_node.node_id,
+        # 区分执行流连接和数据流连接
+        "type": "execution" if conn.from_node.value_type == "execution" else "data"
+    }
+
+
+def with_block_indices(conn_data: Dict[str, Any], block_id_to_index: Dict[str, int]) -> Dict[str, Any]:
+    """为连接字典补充旧版读取使用的块列表索引"""
+    return {
+        "from_block": block_id_to_index.get(conn_data["from_block_id"], -1),
+        "from_block_id": conn_data["from_block_id"],
+        "from_node": conn_data["from_node"],
+        "to_block": block_id_to_index.get(conn_data["to_block_id"], -1),
+        "to_block_id": conn_data["to_block_id"],
+        "to_node": conn_data["to_node"],
+        "type": conn_data["type"]
+    }
+
+
+def program_to_dict(blocks: List[ProgramBlock], connections: List[Connection]) -> Dict[str, Any]:
+    """将程序转换为可保存的字典"""
+    # 连接以块ID引用程序块，列表索引仅为兼容旧版读取
+    block_id_to_index = {block.id: i for i, block in enumerate(blocks)}
+    return {
+        "blocks": [block_to_dict(block) for block in blocks],
+        "connections": [with_block_indices(connection_to_dict(conn), block_id_to_index)
+                        for conn in connections]
+    }
+
+
+def save_program_file(file_path: str, blocks: List[ProgramBlock], connections: List[Connection]):
+    """保存程序文件，格式由扩展名决定"""
+    program_data = program_to_dict(blocks, connections)
+    ext = os.path.splitext(file_path)[1].lower()
+
+    if ext == '.json' or ext == '.robot':
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(program_data, f, ensure_ascii=False, indent=2)
+    elif ext == BINARY_EXTENSION:
+        with open(file_path, 'wb') as f:
+            f.write(encode_program(program_data))
+    elif ext in ['.yaml', '.yml']:
+        yaml, _, dumper = _yaml_codec()
+        with open(file_path, 'w', encoding='utf-8') as f:
+            yaml.dump(program_data, f, Dumper=dumper, allow_unicode=True, sort_keys=False)
+    else:
+        raise ValueError(f"不支持的文件格式: {ext}")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+撤销/重做模块
+
+编辑操作以命令对象记录，命令只保存改动本身（被添加/删除的对象引用、修改前后的值），
+不复制整个程序，历史记录的内存开销与改动量成正比。
+"""
+
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Optional
+
+
+class Command:
+    """可撤销的命令
+
+    命令在记录之前已经执行过，undo()撤销其效果，redo()重新执行。
+    """
+    text = ''
+
+    def undo(self):
+        raise NotImplementedError
+
+    def redo(self):
+        raise NotImplementedError
+
+    def merge_with(self, other: 'Command') -> bool:
+        """尝试把紧随其后的命令合并到本命令中，成功时返回True"""
+        return False
+
+
+class MacroCommand(Command):
+    """由多个命令组成的复合命令，作为一步撤销/重做"""
+
+    def __init__(self, text: str = ''):
+        self.text = text
+        self.commands: List[Command] = []
+
+    def undo(self):
+        for command in reversed(self.commands):
+            command.undo()
+
+    def redo(self):
+        for command in self.commands:
+            command.redo()
+
+
+class UndoStack:
+    """撤销栈
+
+    最多保留limit条历史记录，超出时丢弃最早的记录；合并时间窗口内的连续命令
+    （例如对同一组块的连续移动）会通过merge_with合并为一条。
+    """
+
+    def __init__(self, limit: int = 1000, merge_interval: float = 1.0):
+        self._undo = deque(maxlen=limit)
+        self._redo: List[Command] = []
+        self._macros: List[MacroCommand] = []
+        self._replaying = False
+        self._suspended = 0
+        self._last_push = 0.0
+        self.merge_interval = merge_interval
+        self.evicted = 0  # 因超出上限被丢弃的记录数
+
+    @property
+    def limit(self) -> int:
+        return self._undo.maxlen
+
+    @property
+    def replaying(self) -> bool:
+        """是否正在执行撤销/重做（此时产生的改动不应再次记录）"""
+        return self._replaying
+
+    def __len__(self) -> int:
+        return len(self._undo)
+
+    def push(self, command: Command):
+        """记录一条已执行的命令"""
+        if self._replaying or self._suspended:
+            return
+        if self._macros:
+            self._macros[-1].commands.append(command)
+            return
+
+        self._redo.clear()
+        now = time.monotonic()
+        if (self._undo and now - self._last_push <= self.merge_interval
+                and self._undo[-1].merge_with(command)):
+            self._last_push = now
+            return
+        if len(self._undo) == self._undo.maxlen:
+            self.evicted += 1
+        self._undo.append(command)
+        self._last_push = now
+
+    @contextmanager
+    def macro(self, text: str = ''):
+        """把期间记录的命令合并为一步（可嵌套）"""
+        macro = MacroCommand(text)
+        self._macros.append(macro)
+        try:
+            yield macro
+        finally:
+            self._macros.pop()
+            if len(macro.commands) == 1:
+                self.push(macro.commands[0])
+            elif macro.commands:
+                self.push(macro)
+
+    @contextmanager
+    def suspended(self):
+        """期间执行的命令不记录（例如加载程序），可嵌套"""
+        self._suspended += 1
+        try:
+            yield
+        finally:
+            self._suspended -= 1
+
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def undo_text(self) -> Optional[str]:
+        return self._undo[-1].text if self._undo else None
+
+    def redo_text(self) -> Optional[str]:
+        return self._redo[-1].text if self._redo else None
+
+    def undo(self) -> bool:
+        """撤销最近一条命令，没有可撤销的命令时返回False"""
+        if not self._undo:
+            return False
+        command = self._undo.pop()
+        self._replaying = True
+        try:
+            command.undo()
+        finally:
+            self._replaying = False
+        self._redo.append(command)
+        # 撤销后的新命令不与更早的命令合并
+        self._last_push = 0.0
+        return True
+
+    def redo(self) -> bool:
+        """重做最近撤销的命令，没有可重做的命令时返回False"""
+        if not self._redo:
+            return False
+        command = self._redo.pop()
+        self._replaying = True
+        try:
+            command.redo()
+        finally:
+            self._replaying = False
+        self._undo.append(command)
+        self._last_push = 0.0
+        return True
+
+    def clear(self):
+        """清空历史记录"""
+        self._undo.clear()
+        self._redo.clear()
+        self._last_push = 0.0
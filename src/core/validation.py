@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+程序文件验证模块
+
+模式（schema）以嵌套字典描述，创建验证器时编译为一棵闭包树，验证时不再解释模式。
+加载程序文件时由ProgramStreamValidator在流式解析的同时逐项验证，不需要再次读取和解析文件。
+
+模式节点的键：
+    type        'object'、'list'、'str'、'int'、'number'、'bool'、'null'或'any'（可为元组，表示多种类型之一）
+    fields      type为'object'时，字段名 -> 子模式
+    required    字段缺失时报告错误（默认为False）
+    recommended 字段缺失时报告警告
+    items       type为'list'时，元素的模式
+    min/max     数值超出范围时报告警告
+    enum        允许的取值
+    check       自定义检查函数 check(value, path, issues)，在其他检查通过后调用
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .expressions import check_expression
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# 单次验证最多记录的问题数，避免严重损坏的大文件产生海量问题
+MAX_ISSUES = 1000
+
+_TYPES = {
+    'object': (dict,),
+    'list': (list,),
+    'str': (str,),
+    'int': (int,),
+    'number': (int, float),
+    'bool': (bool,),
+    'null': (type(None),),
+}
+
+_TYPE_NAMES = {
+    'object': '对象',
+    'list': '列表',
+    'str': '字符串',
+    'int': '整数',
+    'number': '数值',
+    'bool': '布尔值',
+    'null': '空值',
+}
+
+
+def format_path(path) -> str:
+    """把(父路径, 键)链转换为 a.b[0].c 形式的字段路径"""
+    parts = []
+    while path is not None:
+        path, key = path
+        parts.append(f"[{key}]" if isinstance(key, int) else key)
+    text = ''
+    for part in reversed(parts):
+        text += part if part.startswith('[') or not text else '.' + part
+    return text
+
+
+class ValidationIssue:
+    """一条验证问题"""
+    __slots__ = ('level', '_path', 'kind', 'detail')
+
+    def __init__(self, level: str, path, kind: str, detail: str = ''):
+        self.level = level
+        self._path = path
+        self.kind = kind
+        self.detail = detail
+
+    @property
+    def path(self) -> str:
+        return format_path(self._path) if isinstance(self._path, tuple) else (self._path or '')
+
+    @property
+    def message(self) -> str:
+        path = self.path
+        if self.kind == 'missing':
+            text = f"缺少必要字段：{path}"
+        elif self.kind == 'incomplete':
+            text = f"缺少字段：{path}，部分功能可能受限"
+        elif self.kind == 'type':
+            text = f"字段{path}的值类型错误"
+        elif self.kind == 'range':
+            text = f"字段{path}的值超出建议范围"
+        elif self.kind == 'enum':
+            text = f"字段{path}的值无效"
+        else:
+            text = f"{path}: " if path else ''
+            return text + self.detail
+        return f"{text}（{self.detail}）" if self.detail else text
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return f"ValidationIssue({self.level!r}, {self.message!r})"
+
+
+class ValidationResult:
+    """验证结果"""
+
+    def __init__(self, issues: List[ValidationIssue]):
+        self.issues = issues
+        self.truncated = len(issues) >= MAX_ISSUES
+
+    @property
+    def errors(self) -> List[ValidationIssue]:
+        return [issue for issue in self.issues if issue.level == ERROR]
+
+    @property
+    def warnings(self) -> List[ValidationIssue]:
+        return [issue for issue in self.issues if issue.level == WARNING]
+
+    @property
+    def valid(self) -> bool:
+        """没有错误（可以有警告）"""
+        return all(issue.level != ERROR for issue in self.issues)
+
+    def summary(self, limit: int = 10) -> str:
+        if not self.issues:
+            return "验证通过"
+        lines = [("错误: " if issue.level == ERROR else "警告: ") + issue.message
+                 for issue in self.issues[:limit]]
+        if len(self.issues) > limit:
+            more = f"还有{len(self.issues) - limit}个问题"
+            lines.append(f"……{more}" + ("（已达到记录上限）" if self.truncated else ''))
+        return '\n'.join(lines)
+
+
+class _IssueList(list):
+    """达到上限后不再记录的问题列表"""
+
+    def append(self, issue):
+        if len(self) < MAX_ISSUES:
+            super().append(issue)
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any, Any, list], None]:
+    """把模式编译为检查函数 check(value, path, issues)"""
+    type_spec = schema.get('type', 'any')
+    type_names = type_spec if isinstance(type_spec, tuple) else (type_spec,)
+    allowed = None
+    if 'any' not in type_names:
+        allowed = tuple(t for name in type_names for t in _TYPES[name])
+    # bool是int的子类，只有明确允许时才接受
+    reject_bool = allowed is not None and 'bool' not in type_names
+    expected = '或'.join(_TYPE_NAMES.get(name, name) for name in type_names)
+
+    checks: List[Callable[[Any, Any, list], None]] = []
+
+    if 'fields' in schema:
+        fields: List[Tuple[str, Callable, Optional[str]]] = []
+        for key, child in schema['fields'].items():
+            if child.get('required'):
+                missing = 'missing'
+            elif child.get('recommended'):
+                missing = 'incomplete'
+            else:
+                missing = None
+            fields.append((key, compile_schema(child), missing))
+
+        def check_fields(value, path, issues):
+            if type(value) is not dict:
+                return
+            for key, check, missing in fields:
+                if key in value:
+                    check(value[key], (path, key), issues)
+                elif missing is not None:
+                    issues.append(ValidationIssue(ERROR if missing == 'missing' else WARNING,
+                                                  (path, key), missing))
+        checks.append(check_fields)
+
+    if 'items' in schema:
+        check_item = compile_schema(schema['items'])
+
+        def check_items(value, path, issues):
+            if type(value) is not list:
+                return
+            for i, item in enumerate(value):
+                check_item(item, (path, i), issues)
+        checks.append(check_items)
+
+    if 'min' in schema or 'max' in schema:
+        minimum = schema.get('min')
+        maximum = schema.get('max')
+
+        def check_range(value, path, issues):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                    issues.append(ValidationIssue(WARNING, path, 'range', f"建议范围 {minimum} ~ {maximum}"))
+        checks.append(check_range)
+
+    if 'enum' in schema:
+        choices = frozenset(schema['enum'])
+
+        def check_enum(value, path, issues):
+            if value not in choices:
+                issues.append(ValidationIssue(ERROR, path, 'enum', f"{value!r}"))
+        checks.append(check_enum)
+
+    if 'check' in schema:
+        checks.append(schema['check'])
+
+    if allowed is None and not checks:
+        def check_any(value, path, issues):
+            pass
+        return check_any
+
+    def check(value, path, issues):
+        if allowed is not None:
+            if not isinstance(value, allowed) or (reject_bool and type(value) is bool):
+                issues.append(ValidationIssue(ERROR, path, 'type', f"应为{expected}"))
+                return
+        for sub_check in checks:
+            sub_check(value, path, issues)
+
+    return check
+
+
+class SchemaValidator:
+    """编译后的验证器
+
+    document_check(data, issues)在模式检查之后执行跨字段检查（例如连接引用的程序块是否存在）。
+    """
+
+    def __init__(self, schema: Dict[str, Any],
+                 document_check: Optional[Callable[[Any, list], None]] = None):
+        self._check = compile_schema(schema)
+        self._document_check = document_check
+
+    def validate(self, data: Any) -> ValidationResult:
+        """验证已解析的数据"""
+        issues = _IssueList()
+        self._check(data, None, issues)
+        if self._document_check is not None and type(data) is dict:
+            self._document_check(data, issues)
+        return ValidationResult(list(issues))
+
+
+# ---------------------------------------------------------------------------
+# 程序文件
+
+_NUMERIC_PARAM_TYPES = ('int', 'float')
+
+
+def _check_param(param, path, issues):
+    """检查参数值与参数声明的类型和范围是否一致"""
+    if param.get('is_variable'):
+        return
+    value = param.get('value', param.get('default'))
+    if param.get('type') == 'expression' and isinstance(value, str):
+        message = check_expression(value)
+        if message is not None:
+            issues.append(ValidationIssue(ERROR, (path, 'value'), 'expression', f"表达式无效: {message}"))
+        return
+    if param.get('type') in _NUMERIC_PARAM_TYPES:
+        if isinstance(value, str):
+            try:
+                value = float(value)
+            except ValueError:
+                issues.append(ValidationIssue(ERROR, (path, 'value'), 'type', f"应为数值: {value!r}"))
+                return
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            issues.append(ValidationIssue(ERROR, (path, 'value'), 'type', f"应为数值: {value!r}"))
+            return
+        minimum = param.get('min')
+        maximum = param.get('max')
+        if ((isinstance(minimum, (int, float)) and value < minimum)
+                or (isinstance(maximum, (int, float)) and value > maximum)):
+            issues.append(ValidationIssue(WARNING, (path, 'value'), 'range', f"建议范围 {minimum} ~ {maximum}"))
+
+
+_NODE_LIST = {'type': 'list', 'items': {'type': ('str', 'int')}}
+
+PROGRAM_SCHEMA = {
+    'type': 'object',
+    'fields': {
+        'blocks': {
+            'type': 'list', 'required': True,
+            'items': {
+                'type': 'object',
+                'fields': {
+                    'id': {'type': 'str'},
+                    'name': {'type': 'str', 'required': True},
+                    'type': {'type': 'str', 'required': True},
+                    'x': {'type': 'number', 'required': True},
+                    'y': {'type': 'number', 'required': True},
+                    'params': {
+                        'type': 'list',
+                        'items': {
+                            'type': 'object',
+                            'fields': {
+                                'name': {'type': 'str', 'required': True},
+                                'type': {'type': 'str'},
+                                'min': {'type': 'number'},
+                                'max': {'type': 'number'},
+                                'is_variable': {'type': 'bool'},
+                            },
+                            'check': _check_param,
+                        },
+                    },
+                    'input_nodes': _NODE_LIST,
+                    'output_nodes': _NODE_LIST,
+                },
+            },
+        },
+        'connections': {
+            'type': 'list',
+            'items': {
+                'type': 'object',
+                'fields': {
+                    # 连接变量的一端没有程序块：块ID为None，块索引为-1
+                    'from_block': {'type': 'int'},
+                    'from_block_id': {'type': ('str', 'null')},
+                    'from_node': {'type': ('str', 'int'), 'required': True},
+                    'to_block': {'type': 'int'},
+                    'to_block_id': {'type': ('str', 'null')},
+                    'to_node': {'type': ('str', 'int'), 'required': True},
+                    'type': {'type': 'str', 'enum': ('execution', 'data')},
+                },
+            },
+        },
+    },
+}
+
+
+# 连接引用程序块的字段
+_REFERENCE_KEYS = ('from_block', 'from_block_id', 'from_node', 'to_block', 'to_block_id', 'to_node')
+
+
+def _is_variable_node(node_id) -> bool:
+    """变量虚拟节点的ID为 var_变量名_output/var_变量名_input"""
+    return isinstance(node_id, str) and node_id.startswith('var_')
+
+
+def _check_block_id(block_id, i: int, block_ids: set, issues: list):
+    if not isinstance(block_id, str):
+        # 缺少ID或类型错误（类型错误已由模式检查报告）
+        return
+    if block_id in block_ids:
+        issues.append(ValidationIssue(ERROR, ((None, 'blocks'), i), 'reference', f"程序块ID重复: {block_id}"))
+    block_ids.add(block_id)
+
+
+def _check_connection_references(conn: Dict[str, Any], i: int, block_ids: set, block_count: int, issues: list):
+    """检查连接两端引用的程序块是否存在；没有程序块（块ID为None、块索引为-1）的一端必须是变量节点"""
+    variable_ends = 0
+    for side in ('from', 'to'):
+        block_id = conn.get(f'{side}_block_id')
+        index = conn.get(f'{side}_block')
+        if isinstance(block_id, str):
+            found = block_id in block_ids
+        elif type(index) is int and index != -1:
+            found = 0 <= index < block_count
+        elif _is_variable_node(conn.get(f'{side}_node')):
+            variable_ends += 1
+            continue
+        else:
+            issues.append(ValidationIssue(ERROR, ((None, 'connections'), i), 'reference', "连接未指定程序块"))
+            return
+        if not found:
+            issues.append(ValidationIssue(ERROR, (((None, 'connections'), i), f'{side}_block'), 'reference',
+                                          "连接引用了不存在的程序块"))
+    if variable_ends == 2:
+        issues.append(ValidationIssue(ERROR, ((None, 'connections'), i), 'reference', "连接的两端都是变量"))
+
+
+def _check_program_references(program_data: Dict[str, Any], issues: list):
+    """检查程序块ID是否重复、连接引用的程序块是否存在"""
+    blocks = program_data.get('blocks')
+    connections = program_data.get('connections')
+    if type(blocks) is not list:
+        return
+    block_ids = set()
+    for i, block in enumerate(blocks):
+        _check_block_id(block.get('id') if type(block) is dict else None, i, block_ids, issues)
+    if type(connections) is not list:
+        return
+    for i, conn in enumerate(connections):
+        if type(conn) is dict:
+            _check_connection_references(conn, i, block_ids, len(blocks), issues)
+
+
+class ProgramStreamValidator:
+    """逐项验证流式读取的程序文件（见program_io.iter_program_file）
+
+    blocks/connections的每个元素读入时即按模式检查，只保留程序块ID和连接的引用字段，
+    读完后再检查引用，不需要把整个文档保存在内存中。
+    """
+
+    # 流式产出的顶层数组元素的检查函数
+    _item_checks = {key: compile_schema(PROGRAM_SCHEMA['fields'][key]['items'])
+                    for key in ('blocks', 'connections')}
+
+    def __init__(self):
+        self.issues = _IssueList()
+        self.block_ids = set()
+        self.counts: Dict[str, int] = {}
+        self.references: List[Tuple[int, Dict[str, Any]]] = []
+
+    def check(self, key: str, value: Any):
+        """检查一个(顶层键, 值)项"""
+        i = self.counts.get(key, 0)
+        self.counts[key] = i + 1
+        check = self._item_checks.get(key)
+        if check is None:
+            return
+        check(value, ((None, key), i), self.issues)
+        if type(value) is not dict:
+            return
+        if key == 'blocks':
+            _check_block_id(value.get('id'), i, self.block_ids, self.issues)
+        else:
+            self.references.append((i, {name: value.get(name) for name in _REFERENCE_KEYS}))
+
+    def watch(self, items):
+        """检查并原样产出(顶层键, 值)项"""
+        for key, value in items:
+            self.check(key, value)
+            yield key, value
+
+    def result(self) -> ValidationResult:
+        """全部项读完后检查连接引用，返回验证结果"""
+        issues = self.issues
+        block_count = self.counts.get('blocks', 0)
+        for i, conn in self.references:
+            _check_connection_references(conn, i, self.block_ids, block_count, issues)
+        self.references = []
+        return ValidationResult(list(issues))
+
+
+program_validator = SchemaValidator(PROGRAM_SCHEMA, _check_program_references)
+
+
+def validate_program(program_data: Dict[str, Any]) -> ValidationResult:
+    """验证已解析的程序字典"""
+    return program_validator.validate(program_data)
@@ -7,11 +7,18 @@
 
 import json
 from PyQt6.QtWidgets import QWidget
-from PyQt6.QtGui import QPainter, QColor, QBrush, QPen, QDrag, QPixmap
-from PyQt6.QtCore import Qt, QMimeData, QPoint, QRect, pyqtSignal
-from typing import List, Optional, Tuple
+from PyQt6.QtGui import QPainter, QPainterPath, QColor, QBrush, QPen, QDrag, QPixmap
+from PyQt6.QtCore import Qt, QMimeData, QPoint, QPointF, QRect, QRectF, QTimer, pyqtSignal
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 from core.data_models import ProgramBlock, Connection, Node, NodeType
+from core.connection_index import ConnectionIndex
+from core.program_io import block_to_dict, connection_to_dict
+from core.undo import UndoStack
+from ui.canvas_commands import (
+    AddBlockCommand, RemoveBlockCommand, MoveBlocksCommand, ParamChangeCommand,
+    AddConnectionCommand, RemoveConnectionCommand, ClearCommand
+)
 
 
 class ProgrammingCanvas(QWidget):
@@ -20,15 +27,28 @@ class ProgrammingCanvas(QWidget):
     connectionCreated = pyqtSignal(Connection)
     variableUpdated = pyqtSignal(str, str)  # 变量名和变量类型
     block_connected = pyqtSignal(str, str)  # 第一个参数是源块ID，第二个是目标块ID
+    operationRecorded = pyqtSignal(dict)  # 编辑操作（用于自动保存日志）
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.blocks: List[ProgramBlock] = []
-        self.connections: List[Connection] = []
+        self.block_map: Dict[str, ProgramBlock] = {}  # 块ID -> 程序块
+        self.connection_index = ConnectionIndex()  # 连接邻接索引
+        self.undo_stack = UndoStack(limit=1000)  # 撤销/重做历史
+        self._recording = True  # 是否发出编辑操作信号，批量加载时关闭
         self.selected_block_index = -1
+        self.selected_block_ids = set()  # 多选的块ID（Ctrl+单击切换）
         self.is_dragging = False
         self.drag_start = QPoint()
         self.block_start = QPoint()
+        
+        # 拖拽时的鼠标移动合并：只记录最新位置，由定时器按帧（约16ms）处理一次
+        self._drag_origins: Dict[str, Tuple[int, int]] = {}
+        self._pending_drag_pos: Optional[QPoint] = None
+        self._drag_timer = QTimer(self)
+        self._drag_timer.setSingleShot(True)
+        self._drag_timer.setInterval(16)
+        self._drag_timer.timeout.connect(self._applyPendingDrag)
         self.drag_item = None
         self.drag_item_type = None
         self.drag_preview = None
@@ -48,19 +68,233 @@ class ProgrammingCanvas(QWidget):
         
         # 节点半径
         self.node_radius = 6
+        
+        # 视图变换：屏幕坐标 = 场景坐标 * zoom + pan_offset
+        self.zoom = 1.0
+        self.min_zoom = 0.05
+        self.max_zoom = 4.0
+        self.pan_offset = QPointF(0, 0)
+        self.is_panning = False
+        self.pan_start = QPointF()
+        self.pan_offset_start = QPointF()
+        
+        # 缩放低于该值时使用简化绘制（不绘制参数文字和节点）
+        self.lod_zoom_threshold = 0.5
+        self._low_detail = False
+        
+        # 连接线路径缓存：((是否低细节, 拖拽中的块ID), 执行流路径, 数据流路径)，端点变化时置为None
+        # 拖拽期间缓存只包含与被拖拽块无关的连接，相关连接每帧单独绘制
+        self._connection_paths = None
+        self._moving_block_ids: FrozenSet[str] = frozenset()
+        self._moving_connections: List[Connection] = []
+        self._execution_pen = QPen(QColor(24, 144, 255), 2)
+        self._data_pen = QPen(QColor(46, 204, 113), 2, Qt.PenStyle.DashLine)
+        
+        # 性能热图：块ID -> 热度(0到1)，以及显示在块右下角的文字
+        self.heatmap: Dict[str, float] = {}
+        self.heatmap_labels: Dict[str, str] = {}
+    
+    @property
+    def connections(self) -> List[Connection]:
+        """按创建顺序返回所有连接"""
+        return self.connection_index.to_list()
+    
+    @connections.setter
+    def connections(self, connections: List[Connection]):
+        self.connection_index.clear()
+        self._invalidateConnectionPaths()
+        for conn in connections:
+            self.addConnection(conn)
+    
+    def _block_id(self, block_ref) -> Optional[str]:
+        """将块索引或块ID统一为块ID，变量等虚拟端点返回None"""
+        if isinstance(block_ref, int):
+            if 0 <= block_ref < len(self.blocks):
+                return self.blocks[block_ref].id
+            return None
+        return block_ref if block_ref in self.block_map else None
+    
+    def addConnection(self, connection: Connection):
+        """添加连接并登记到邻接索引（旧版索引引用会被转换为块ID）"""
+        if connection in self.connection_index:
+            return
+        connection.from_block = self._block_id(connection.from_block)
+        connection.to_block = self._block_id(connection.to_block)
+        self.connection_index.add(connection, connection.from_block, connection.to_block)
+        self._invalidateConnectionPaths()
+        if self._recording:
+            self._recordOperation({'op': 'connection_added', 'connection': connection_to_dict(connection)})
+        self.undo_stack.push(AddConnectionCommand(self, connection))
+    
+    def _removeConnection(self, connection: Connection):
+        """移除连接"""
+        if self.connection_index.discard(connection):
+            self._invalidateConnectionPaths()
+            self._recordOperation({'op': 'connection_removed', 'from_node': connection.from_node.node_id,
+                                   'to_node': connection.to_node.node_id})
+            self.undo_stack.push(RemoveConnectionCommand(self, connection))
+    
+    def _recordOperation(self, operation: dict):
+        """发出编辑操作信号"""
+        if self._recording:
+            self.operationRecorded.emit(operation)
+    
+    def _setParam(self, block: ProgramBlock, index: int, param: Optional[dict]):
+        """设置块的第index个参数（index等于参数数量时追加，param为None时删除）"""
+        if param is None:
+            block.remove_param(index)
+            self._recordOperation({'op': 'param_removed', 'block_id': block.id, 'index': index})
+        else:
+            if index >= len(block.params):
+                block.add_param(param)
+            else:
+                block.replace_param(index, param)
+            self._recordOperation({'op': 'param_changed', 'block_id': block.id, 'index': index,
+                                   'param': block.params[index].to_dict()})
+        # 参数数量会改变块高度，从而改变节点位置
+        self._invalidateConnectionPaths()
+        self.update()
+    
+    def setBlockParam(self, block: ProgramBlock, index: int, param: dict):
+        """修改或追加块参数（可撤销）"""
+        old = block.params[index].to_dict() if index < len(block.params) else None
+        self._setParam(block, index, param)
+        self.undo_stack.push(ParamChangeCommand(self, block, index, old, block.params[index].to_dict()))
+    
+    def _moveBlocks(self, positions: Dict[str, Tuple[int, int]]):
+        """把块移动到指定位置"""
+        moved = []
+        for block_id, (x, y) in positions.items():
+            block = self.block_map.get(block_id)
+            if block is not None:
+                block.x = x
+                block.y = y
+                moved.append([block_id, x, y])
+        if moved:
+            self._invalidateConnectionPaths()
+            self._recordOperation({'op': 'blocks_moved', 'blocks': moved})
+            self.update()
+    
+    def undo(self):
+        """撤销上一步编辑"""
+        if self.undo_stack.undo():
+            self._afterHistoryChange()
+    
+    def redo(self):
+        """重做上一步撤销的编辑"""
+        if self.undo_stack.redo():
+            self._afterHistoryChange()
+    
+    def _afterHistoryChange(self):
+        """撤销/重做后修正选中状态并重绘"""
+        self.selected_block_ids = {block_id for block_id in self.selected_block_ids if block_id in self.block_map}
+        if self.selected_block_index >= len(self.blocks):
+            self.selected_block_index = -1
+            self.blockSelected.emit(-1)
+        self._invalidateConnectionPaths()
+        self.update()
+    
+    def _invalidateConnectionPaths(self):
+        """连接或其端点位置变化后，标记连接线路径缓存需要重建"""
+        self._connection_paths = None
+    
+    def _replace_target_connections(self, to_node):
+        """清除目标节点上的旧连接（支持变量替换功能）"""
+        for conn in self.connection_index.incoming(to_node):
+            print(f"清除目标节点的旧连接: {conn.from_node.name}")
+            self._removeConnection(conn)
+    
+    def _toScene(self, pos) -> QPointF:
+        """将控件坐标转换为场景坐标"""
+        return QPointF((pos.x() - self.pan_offset.x()) / self.zoom,
+                       (pos.y() - self.pan_offset.y()) / self.zoom)
+    
+    def _visibleSceneRect(self) -> QRectF:
+        """获取当前可见区域的场景坐标矩形"""
+        top_left = self._toScene(QPointF(0, 0))
+        return QRectF(top_left.x(), top_left.y(), self.width() / self.zoom, self.height() / self.zoom)
+    
+    def _blockRect(self, block: ProgramBlock) -> QRect:
+        """获取程序块在场景中的矩形"""
+        return QRect(block.x, block.y, 200, 80 + len(block.params) * 25)
+    
+    def setZoom(self, zoom: float, anchor: Optional[QPointF] = None):
+        """设置缩放比例，anchor为保持不动的控件坐标（默认为控件中心）"""
+        zoom = max(self.min_zoom, min(self.max_zoom, zoom))
+        if anchor is None:
+            anchor = QPointF(self.width() / 2, self.height() / 2)
+        scene_anchor = self._toScene(anchor)
+        self.zoom = zoom
+        self.pan_offset = QPointF(anchor.x() - scene_anchor.x() * zoom,
+                                  anchor.y() - scene_anchor.y() * zoom)
+        self.update()
+    
+    def resetView(self):
+        """恢复100%缩放并回到原点"""
+        self.zoom = 1.0
+        self.pan_offset = QPointF(0, 0)
+        self.update()
+    
+    def fitToView(self, margin: int = 40):
+        """缩放并平移视图以显示所有程序块"""
+        if not self.blocks:
+            self.resetView()
+            return
+        bounds = self._blockRect(self.blocks[0])
+        for block in self.blocks[1:]:
+            bounds = bounds.united(self._blockRect(block))
+        zoom = min((self.width() - 2 * margin) / max(bounds.width(), 1),
+                   (self.height() - 2 * margin) / max(bounds.height(), 1))
+        self.zoom = max(self.min_zoom, min(self.max_zoom, zoom))
+        self.pan_offset = QPointF(margin - bounds.x() * self.zoom, margin - bounds.y() * self.zoom)
+        self.update()
+    
+    def setHeatmap(self, values: Dict[str, float], labels: Optional[Dict[str, str]] = None):
+        """按块ID显示性能热图，数值按最大值归一化"""
+        peak = max(values.values(), default=0)
+        self.heatmap = {block_id: value / peak for block_id, value in values.items() if value > 0} if peak > 0 else {}
+        self.heatmap_labels = dict(labels or {})
+        self.update()
+    
+    def clearHeatmap(self):
+        """清除性能热图"""
+        self.heatmap = {}
+        self.heatmap_labels = {}
+        self.update()
+    
+    def _heatColor(self, heat: float) -> QColor:
+        """热度对应的颜色：由浅黄到红，越热越不透明"""
+        return QColor(255, int(220 * (1 - heat)), 0, 60 + int(140 * heat))
+    
+    def wheelEvent(self, event):
+        """滚轮缩放（以鼠标位置为中心）"""
+        steps = event.angleDelta().y() / 120
+        if steps:
+            self.setZoom(self.zoom * (1.15 ** steps), event.position())
+        event.accept()
     
     def paintEvent(self, event):
         painter = QPainter(self)
         
+        # 应用视图变换，之后的绘制均使用场景坐标
+        painter.translate(self.pan_offset)
+        painter.scale(self.zoom, self.zoom)
+        visible_rect = self._visibleSceneRect()
+        self._low_detail = self.zoom < self.lod_zoom_threshold
+        
         # 绘制网格背景
-        self._drawGrid(painter)
+        self._drawGrid(painter, visible_rect)
         
         # 绘制连接线
         self._drawConnections(painter)
         
-        # 绘制程序块
+        # 绘制程序块（跳过可见区域之外的块）
         for i, block in enumerate(self.blocks):
-            self._drawBlock(painter, block, i == self.selected_block_index)
+            block_rect = self._blockRect(block)
+            if not visible_rect.intersects(QRectF(block_rect)):
+                continue
+            is_selected = i == self.selected_block_index or block.id in self.selected_block_ids
+            self._drawBlock(painter, block, is_selected)
         
         # 绘制拖拽预览
         if self.drag_preview:
@@ -70,22 +304,30 @@ class ProgrammingCanvas(QWidget):
         if self.connection_mode and self.source_node:
             self._drawTempConnection(painter)
     
-    def _drawGrid(self, painter):
-        """绘制网格背景"""
-        painter.setPen(QPen(QColor(220, 220, 220), 1))
+    def _drawGrid(self, painter, visible_rect: QRectF):
+        """绘制可见区域内的网格背景"""
+        # 网格在屏幕上过密时放大间距，避免缩小视图时绘制大量线条
+        grid_size = self.grid_size
+        while grid_size * self.zoom < 8:
+            grid_size *= 4
+        
+        painter.setPen(QPen(QColor(220, 220, 220), 0))
+        left = int(visible_rect.left()) // grid_size * grid_size
+        top = int(visible_rect.top()) // grid_size * grid_size
+        right = int(visible_rect.right()) + grid_size
+        bottom = int(visible_rect.bottom()) + grid_size
         
         # 绘制垂直网格线
-        for x in range(0, self.width(), self.grid_size):
-            painter.drawLine(x, 0, x, self.height())
+        for x in range(left, right, grid_size):
+            painter.drawLine(x, top, x, bottom)
         
         # 绘制水平网格线
-        for y in range(0, self.height(), self.grid_size):
-            painter.drawLine(0, y, self.width(), y)
+        for y in range(top, bottom, grid_size):
+            painter.drawLine(left, y, right, y)
     
     def _drawBlock(self, painter, block, is_selected):
         """绘制程序块"""
-        block_height = 80 + len(block.params) * 25
-        block_rect = QRect(block.x, block.y, 200, block_height)
+        block_rect = self._blockRect(block)
         
         # 设置块的颜色
         if is_selected:
@@ -103,11 +345,31 @@ class ProgrammingCanvas(QWidget):
                 border_color = QColor(24, 144, 255)
             border_width = 1
         
+        heat = self.heatmap.get(block.id)
+        
+        # 低细节模式：只绘制简单矩形，不绘制标题、参数和节点
+        if self._low_detail:
+            painter.setPen(QPen(border_color, 0))
+            painter.setBrush(QBrush(self._heatColor(heat) if heat is not None else border_color.lighter(170)))
+            painter.drawRect(block_rect)
+            return
+        
         # 绘制块背景
         painter.setPen(QPen(border_color, border_width))
         painter.setBrush(QBrush(QColor(255, 255, 255)))
         painter.drawRoundedRect(block_rect, 8, 8)
         
+        # 绘制性能热图
+        if heat is not None:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QBrush(self._heatColor(heat)))
+            painter.drawRoundedRect(block_rect, 8, 8)
+            label = self.heatmap_labels.get(block.id)
+            if label:
+                painter.setPen(QPen(QColor(120, 0, 0), 1))
+                painter.drawText(block_rect.adjusted(10, 10, -10, -6),
+                                 Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignRight, label)
+        
         # 绘制块标题
         painter.setPen(QPen(border_color, 1))
         painter.setFont(self.font())
@@ -201,28 +463,67 @@ class ProgrammingCanvas(QWidget):
                 painter.drawText(QRect(int(x) + 15, int(y) - 10, 70, 20), 
                                 Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, node.name)
     
-    def _drawConnections(self, painter):
-        """绘制块之间的连接线，区分执行流和数据流连接"""
-        for connection in self.connections:
-            # 获取起始块和目标块
-            from_block = self.blocks[connection.from_block]
-            to_block = self.blocks[connection.to_block]
+    def _buildConnectionPaths(self, connections) -> Tuple[QPainterPath, QPainterPath]:
+        """将连接合并为执行流和数据流两条路径
+        
+        正常细节下使用贝塞尔曲线，低细节模式下使用直线。
+        """
+        execution_path = QPainterPath()
+        data_path = QPainterPath()
+        
+        for connection in connections:
+            # 获取起始块和目标块（变量等虚拟端点没有对应的块）
+            from_block = self.block_map.get(connection.from_block)
+            to_block = self.block_map.get(connection.to_block)
+            if from_block is None or to_block is None:
+                continue
             
-            # 计算起始节点位置
+            # 计算起始节点和目标节点位置
             from_x, from_y = self._get_node_position(from_block, connection.from_node)
-            
-            # 计算目标节点位置
             to_x, to_y = self._get_node_position(to_block, connection.to_node)
             
-            # 根据连接类型设置不同的样式
-            if hasattr(connection, 'type') and connection.type == 'execution':
-                # 执行流连接：实心线，蓝色
-                painter.setPen(QPen(QColor(24, 144, 255), 2))
+            # 根据连接类型选择路径：执行流为实心蓝线，数据流为绿色虚线
+            if getattr(connection, 'type', None) == 'execution':
+                path = execution_path
             else:
-                # 数据流连接：虚线，绿色
-                painter.setPen(QPen(QColor(46, 204, 113), 2, Qt.PenStyle.DashLine))
+                path = data_path
             
-            painter.drawLine(int(from_x), int(from_y), int(to_x), int(to_y))
+            path.moveTo(from_x, from_y)
+            if self._low_detail:
+                path.lineTo(to_x, to_y)
+            else:
+                # 控制点沿水平方向伸出，使连线从输出节点向右、进入输入节点时向右
+                offset = max(abs(to_x - from_x) * 0.5, 40)
+                path.cubicTo(from_x + offset, from_y, to_x - offset, to_y, to_x, to_y)
+        
+        return execution_path, data_path
+    
+    def _drawConnections(self, painter):
+        """绘制块之间的连接线，区分执行流和数据流连接
+        
+        连线路径被缓存，只有在连接增删或块移动后才重建，每帧只需两次绘制调用。
+        拖拽块时，与被拖拽块无关的连接保持缓存，只重建相关的少量连接。
+        """
+        moving = self._moving_block_ids
+        cache_key = (self._low_detail, moving)
+        if self._connection_paths is None or self._connection_paths[0] != cache_key:
+            if moving:
+                static_connections = [conn for conn in self.connection_index
+                                      if conn.from_block not in moving and conn.to_block not in moving]
+            else:
+                static_connections = self.connection_index
+            self._connection_paths = (cache_key,) + self._buildConnectionPaths(static_connections)
+        
+        path_groups = [self._connection_paths[1:]]
+        if moving:
+            path_groups.append(self._buildConnectionPaths(self._moving_connections))
+        
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        for execution_path, data_path in path_groups:
+            painter.setPen(self._execution_pen)
+            painter.drawPath(execution_path)
+            painter.setPen(self._data_pen)
+            painter.drawPath(data_path)
     
     def _drawTempConnection(self, painter):
         """绘制临时连接线"""
@@ -381,36 +682,25 @@ class ProgrammingCanvas(QWidget):
                 return False
             
             # 查找并删除目标节点的旧连接（支持变量替换功能）
-            # 使用列表推导式找到需要删除的连接
-            old_connections = [conn for conn in self.connections 
-                              if conn.to_node == to_node and conn.to_block == to_block_idx]
-            
-            for conn in old_connections:
-                print(f"清除目标节点的旧连接: {conn.from_node.name}")
-                self.connections.remove(conn)
+            self._replace_target_connections(to_node)
             
             # 检查是否已经存在相同的连接
-            existing_connection = next(
-                (conn for conn in self.connections 
-                 if conn.from_node == from_node and conn.to_node == to_node and
-                    conn.from_block == from_block_idx and conn.to_block == to_block_idx), 
-                None
-            )
+            existing_connection = self.connection_index.find(from_node, to_node)
             
             if existing_connection:
                 print("连接失败: 连接已存在")
                 return False
             
-            # 创建新连接
+            # 创建新连接（以块ID引用程序块）
             new_connection = Connection(
-                from_block=from_block_idx,
+                from_block=self._block_id(from_block_idx),
                 from_node=from_node,
-                to_block=to_block_idx,
+                to_block=self._block_id(to_block_idx),
                 to_node=to_node
             )
             # 添加连接类型属性
             new_connection.type = connection_type
-            self.connections.append(new_connection)
+            self.addConnection(new_connection)
             
             # 输出连接创建信息
             if connection_type == 'execution':
@@ -430,8 +720,15 @@ class ProgrammingCanvas(QWidget):
     
     def mousePressEvent(self, event):
         """鼠标按下事件"""
+        # 中键拖拽平移视图
+        if event.button() == Qt.MouseButton.MiddleButton:
+            self.is_panning = True
+            self.pan_start = event.position()
+            self.pan_offset_start = QPointF(self.pan_offset)
+            return
+        
         # 检查是否点击了节点
-        pos = event.position()
+        pos = self._toScene(event.position())
         block_index, node = self._find_node_at_position(QPoint(int(pos.x()), int(pos.y())))
         if block_index is not None and node is not None:
             # 开始连接模式
@@ -443,7 +740,7 @@ class ProgrammingCanvas(QWidget):
         
         # 检查是否点击了程序块
         clicked_block = -1
-        pos = event.position()
+        pos = self._toScene(event.position())
         mouse_pos = QPoint(int(pos.x()), int(pos.y()))
         for i, block in enumerate(self.blocks):
             block_rect = QRect(block.x, block.y, 200, 80 + len(block.params) * 25)
@@ -451,77 +748,144 @@ class ProgrammingCanvas(QWidget):
                 clicked_block = i
                 break
         
+        multi_select = bool(event.modifiers() & Qt.KeyboardModifier.ControlModifier)
         if clicked_block >= 0:
-            # 选择块
+            # 选择块：Ctrl+单击切换多选，普通单击未选中的块时只选中该块
+            block_id = self.blocks[clicked_block].id
+            if multi_select:
+                if block_id in self.selected_block_ids:
+                    self.selected_block_ids.discard(block_id)
+                else:
+                    self.selected_block_ids.add(block_id)
+            elif block_id not in self.selected_block_ids:
+                self.selected_block_ids = {block_id}
             self.selected_block_index = clicked_block
             self.blockSelected.emit(clicked_block)
             
-            # 开始拖拽
+            # 开始拖拽所有选中的块（Ctrl+单击取消选中的块不随之移动）
             self.is_dragging = True
             self.drag_start = QPoint(int(pos.x()), int(pos.y()))
             self.block_start = QPoint(self.blocks[clicked_block].x, self.blocks[clicked_block].y)
+            self._beginDrag(self.selected_block_ids)
         else:
             # 取消选择
+            if not multi_select:
+                self.selected_block_ids = set()
             self.selected_block_index = -1
             self.blockSelected.emit(-1)
         
         self.update()
     
+    def _beginDrag(self, block_ids):
+        """记录被拖拽块的起始位置以及与它们相关的连接"""
+        self._drag_origins = {}
+        for block_id in block_ids:
+            block = self.block_map.get(block_id)
+            if block is not None:
+                self._drag_origins[block_id] = (block.x, block.y)
+        self._pending_drag_pos = None
+        self._moving_block_ids = frozenset(self._drag_origins)
+        moving_connections = {}
+        for block_id in self._moving_block_ids:
+            moving_connections.update(dict.fromkeys(self.connection_index.block_connections(block_id)))
+        self._moving_connections = list(moving_connections)
+    
+    def _endDrag(self):
+        """结束拖拽：处理尚未应用的位置并恢复完整的连线缓存"""
+        if self._drag_timer.isActive():
+            self._drag_timer.stop()
+        self._applyPendingDrag()
+        
+        # 只在拖拽结束时记录一次最终位置
+        moves = {}
+        for block_id, origin in self._drag_origins.items():
+            block = self.block_map.get(block_id)
+            if block is not None and (block.x, block.y) != origin:
+                moves[block_id] = (origin, (block.x, block.y))
+        if moves:
+            self._recordOperation({'op': 'blocks_moved',
+                                   'blocks': [[block_id, x, y] for block_id, (_, (x, y)) in moves.items()]})
+            self.undo_stack.push(MoveBlocksCommand(self, moves))
+        
+        self._drag_origins = {}
+        self._moving_block_ids = frozenset()
+        self._moving_connections = []
+        self._invalidateConnectionPaths()
+    
+    def _applyPendingDrag(self):
+        """按最新的鼠标位置移动所有被拖拽的块（每帧最多执行一次）"""
+        pos = self._pending_drag_pos
+        self._pending_drag_pos = None
+        if pos is None or not self._drag_origins:
+            return
+        
+        # 计算拖拽偏移，按主块对齐到网格，其余块保持相对位置
+        dx = pos.x() - self.drag_start.x()
+        dy = pos.y() - self.drag_start.y()
+        new_x = round((self.block_start.x() + dx) / self.grid_size) * self.grid_size
+        new_y = round((self.block_start.y() + dy) / self.grid_size) * self.grid_size
+        dx = new_x - self.block_start.x()
+        dy = new_y - self.block_start.y()
+        
+        for block_id, (origin_x, origin_y) in self._drag_origins.items():
+            block = self.block_map.get(block_id)
+            if block is not None:
+                # 确保块不超出边界
+                block.x = max(0, origin_x + dx)
+                block.y = max(0, origin_y + dy)
+        
+        self.update()
+    
     def mouseMoveEvent(self, event):
         """鼠标移动事件"""
-        if self.is_dragging and self.selected_block_index >= 0:
-            # 计算拖拽偏移
-            pos = event.position()
-            current_pos = QPoint(int(pos.x()), int(pos.y()))
-            dx = current_pos.x() - self.drag_start.x()
-            dy = current_pos.y() - self.drag_start.y()
-            
-            # 更新块位置（对齐到网格）
-            new_x = self.block_start.x() + dx
-            new_y = self.block_start.y() + dy
-            
-            # 对齐到网格
-            new_x = round(new_x / self.grid_size) * self.grid_size
-            new_y = round(new_y / self.grid_size) * self.grid_size
-            
-            # 确保块不超出边界
-            new_x = max(0, new_x)
-            new_y = max(0, new_y)
-            
-            # 更新块位置
-            self.blocks[self.selected_block_index].x = new_x
-            self.blocks[self.selected_block_index].y = new_y
-            
+        if self.is_panning:
+            # 平移视图
+            delta = event.position() - self.pan_start
+            self.pan_offset = self.pan_offset_start + delta
             self.update()
+        elif self.is_dragging and self.selected_block_index >= 0:
+            # 只记录最新位置，同一帧内的多次移动事件合并为一次更新
+            pos = self._toScene(event.position())
+            self._pending_drag_pos = QPoint(int(pos.x()), int(pos.y()))
+            if not self._drag_timer.isActive():
+                self._drag_timer.start()
         elif self.drag_preview:
             # 更新拖拽预览位置
-            self.drag_preview.setX(round(event.position().x() / self.grid_size) * self.grid_size - 100)
-            self.drag_preview.setY(round(event.position().y() / self.grid_size) * self.grid_size - 40)
+            pos = self._toScene(event.position())
+            self.drag_preview.setX(round(pos.x() / self.grid_size) * self.grid_size - 100)
+            self.drag_preview.setY(round(pos.y() / self.grid_size) * self.grid_size - 40)
             self.update()
         elif self.connection_mode:
-            # 存储当前鼠标位置
-            pos = event.position()
+            # 存储当前鼠标位置（场景坐标）
+            pos = self._toScene(event.position())
             self.current_mouse_pos = QPoint(int(pos.x()), int(pos.y()))
             # 在连接模式下，刷新画布以更新临时连接线
             self.update()
     
     def mouseReleaseEvent(self, event):
         """鼠标释放事件"""
+        if self.is_panning and event.button() == Qt.MouseButton.MiddleButton:
+            self.is_panning = False
+            return
+        
         # 处理连接模式
         if self.connection_mode and self.source_node:
             # 查找目标节点
-            pos = event.position()
+            pos = self._toScene(event.position())
             target_block_index, target_node = self._find_node_at_position(QPoint(int(pos.x()), int(pos.y())))
             
             if target_block_index is not None and target_node is not None:
-                # 调用connectNodes方法处理连接逻辑
-                self.connectNodes(self.source_node, target_node, self.source_block_index, target_block_index)
+                # 调用connectNodes方法处理连接逻辑（替换旧连接和添加新连接作为一步撤销）
+                with self.undo_stack.macro("连接节点"):
+                    self.connectNodes(self.source_node, target_node, self.source_block_index, target_block_index)
             
             # 结束连接模式
             self.connection_mode = False
             self.source_node = None
             self.source_block_index = -1
         
+        if self.is_dragging:
+            self._endDrag()
         self.is_dragging = False
         self.update()
     
@@ -538,7 +902,7 @@ class ProgrammingCanvas(QWidget):
             # 更新拖拽预览位置
             if not self.drag_preview:
                 self.drag_preview = QPoint()
-            pos = event.position()
+            pos = self._toScene(event.position())
             self.drag_preview.setX(round(int(pos.x()) / self.grid_size) * self.grid_size - 100)
             self.drag_preview.setY(round(int(pos.y()) / self.grid_size) * self.grid_size - 40)
             self.update()
@@ -550,6 +914,12 @@ class ProgrammingCanvas(QWidget):
     
     def dropEvent(self, event):
         """放置事件，支持变量替换、变量赋值和函数输出连接"""
+        # 一次放置产生的所有改动作为一步撤销
+        with self.undo_stack.macro("放置"):
+            self._handleDrop(event)
+    
+    def _handleDrop(self, event):
+        """处理放置事件"""
         print("处理拖拽放置事件...")
         if event.mimeData().hasText():
             # 获取拖拽的数据
@@ -563,7 +933,7 @@ class ProgrammingCanvas(QWidget):
                 print(f"拖拽项目类型: {item_type}, 数据: {item_data}")
                 
                 # 检查是否拖拽到任何连接的目标节点位置（用于替换连接）
-                pos = event.position()
+                pos = self._toScene(event.position())
                 target_block_index, target_node = self._find_node_at_position(QPoint(int(pos.x()), int(pos.y())))
                 print(f"目标块索引: {target_block_index}, 目标节点: {target_node}")
                 
@@ -575,7 +945,7 @@ class ProgrammingCanvas(QWidget):
                         node_x, node_y = self._get_node_position(block, node)
                         node_rect = QRect(int(node_x) - self.node_radius, int(node_y) - self.node_radius,
                                          self.node_radius * 2, self.node_radius * 2)
-                        pos = event.position()
+                        pos = self._toScene(event.position())
                         if node_rect.contains(QPoint(int(pos.x()), int(pos.y()))):
                             from_block_index = i
                             from_node = node
@@ -596,19 +966,17 @@ class ProgrammingCanvas(QWidget):
                     from_variable_node.variable = item_data['name']  # 标记为变量节点
                     
                     # 清除目标节点的旧连接
-                    for conn in self.connections[:]:
-                        if conn.to_node == target_node and conn.to_block == target_block_index:
-                            self.connections.remove(conn)
+                    self._replace_target_connections(target_node)
                     
                     # 创建新连接
                     new_connection = Connection(
-                        from_block=-1,  # 特殊标记，表示来自变量
+                        from_block=None,  # 特殊标记，表示来自变量
                         from_node=from_variable_node,
-                        to_block=target_block_index,
+                        to_block=self._block_id(target_block_index),
                         to_node=target_node
                     )
                     new_connection.type = 'data'
-                    self.connections.append(new_connection)
+                    self.addConnection(new_connection)
                     self.update()
                     print(f"变量 {item_data['name']} 已连接到节点 {target_node.name}")
                     return
@@ -626,28 +994,24 @@ class ProgrammingCanvas(QWidget):
                     from_variable_node.variable = item_data['name']  # 标记为变量节点
                     
                     # 清除目标节点的旧连接
-                    old_connections = [conn for conn in self.connections 
-                                      if conn.to_node == target_node and conn.to_block == target_block_index]
-                    for conn in old_connections:
-                        print(f"清除目标节点的旧连接: {conn.from_node.name}")
-                        self.connections.remove(conn)
+                    self._replace_target_connections(target_node)
                     
                     # 创建新连接
                     new_connection = Connection(
-                        from_block=-1,  # 特殊标记，表示来自变量
+                        from_block=None,  # 特殊标记，表示来自变量
                         from_node=from_variable_node,
-                        to_block=target_block_index,
+                        to_block=self._block_id(target_block_index),
                         to_node=target_node
                     )
                     new_connection.type = 'data'
-                    self.connections.append(new_connection)
+                    self.addConnection(new_connection)
                     self.update()
                     print(f"变量 {item_data['name']} 已连接到节点 {target_node.name}")
                     return
                 
                 if item_type == 'function':
                     # 创建新的程序块
-                    pos = event.position()
+                    pos = self._toScene(event.position())
                     new_block = ProgramBlock(
                         name=item_data['name'],
                         block_type=item_data['type'],  # 构造函数参数是block_type
@@ -656,32 +1020,9 @@ class ProgrammingCanvas(QWidget):
                         params=item_data.get('params', [])
                     )
                     
-                    # 对于逻辑块，确保有正确的输入输出节点
-                    if new_block.type == 'logic':
-                        # 根据逻辑块类型设置相应的节点
-                        if new_block.name == '条件判断' or new_block.name == '如果':
-                            new_block.input_nodes = [Node(name='条件', node_type=NodeType.INPUT, value_type='boolean', node_id='cond_input')]
-                            new_block.output_nodes = [
-                                Node(name='真', node_type=NodeType.OUTPUT, value_type='execution', node_id='true_output'),
-                                Node(name='假', node_type=NodeType.OUTPUT, value_type='execution', node_id='false_output')
-                            ]
-                        elif new_block.name == '如果-否则':
-                            new_block.input_nodes = [Node(name='条件', node_type=NodeType.INPUT, value_type='boolean', node_id='cond_input')]
-                            new_block.output_nodes = [
-                                Node(name='真', node_type=NodeType.OUTPUT, value_type='execution', node_id='true_output'),
-                                Node(name='假', node_type=NodeType.OUTPUT, value_type='execution', node_id='false_output')
-                            ]
-                        elif new_block.name in ['循环', '当条件满足时循环', '无限循环']:
-                            new_block.input_nodes = [
-                                Node(name='开始', node_type=NodeType.INPUT, value_type='execution', node_id='start_input'),
-                                Node(name='结束', node_type=NodeType.INPUT, value_type='execution', node_id='end_input')
-                            ]
-                            new_block.output_nodes = [
-                                Node(name='循环体', node_type=NodeType.OUTPUT, value_type='execution', node_id='loop_output'),
-                                Node(name='完成', node_type=NodeType.OUTPUT, value_type='execution', node_id='done_output')
-                            ]
-                    
-                    self.blocks.append(new_block)
+                    # 逻辑块的条件/分支/循环节点已由ProgramBlock按块类型创建，
+                    # 节点ID由块ID派生，保存后再加载仍能对应
+                    self._appendBlock(new_block)
                     
                     # 选中新创建的块
                     self.selected_block_index = len(self.blocks) - 1
@@ -689,7 +1030,7 @@ class ProgrammingCanvas(QWidget):
                 elif item_type == 'variable':
                     # 检查是否拖拽到参数位置
                     # 遍历所有块，检查是否拖拽到块的参数区域
-                    pos = event.position()
+                    pos = self._toScene(event.position())
                     mouse_x = int(pos.x())
                     mouse_y = int(pos.y())
                     
@@ -712,9 +1053,11 @@ class ProgrammingCanvas(QWidget):
                                 # 如果鼠标在参数值区域内，将变量绑定到该参数（支持替换）
                                 if param_value_rect.contains(int(mouse_x), int(mouse_y)):
                                     # 设置参数值为变量名，并标记为变量引用
-                                    block.params[param_idx]['value'] = item_data['name']
-                                    block.params[param_idx]['is_variable'] = True
-                                    block.params[param_idx]['variable_type'] = item_data.get('type', 'unknown')
+                                    new_param = param.to_dict()
+                                    new_param['value'] = item_data['name']
+                                    new_param['is_variable'] = True
+                                    new_param['variable_type'] = item_data.get('type', 'unknown')
+                                    self.setBlockParam(block, param_idx, new_param)
                                     self.selected_block_index = block_idx
                                     self.blockSelected.emit(block_idx)
                                     self.update()
@@ -727,18 +1070,17 @@ class ProgrammingCanvas(QWidget):
                                 for node in block.input_nodes:
                                     if node.name == '条件' and node.value_type == 'boolean':
                                         # 为条件创建一个参数或更新现有参数（支持替换）
-                                        condition_param_exists = False
-                                        for param in block.params:
-                                            if param['name'] == '条件':
-                                                param['value'] = item_data['name']
-                                                param['is_variable'] = True
-                                                param['variable_type'] = item_data.get('type', 'unknown')
-                                                condition_param_exists = True
-                                                print(f"条件变量已替换为: {item_data['name']}")
-                                                break
-                                        
-                                        if not condition_param_exists:
-                                            block.params.append({
+                                        param_idx = block.param_index('条件')
+                                        if param_idx is not None:
+                                            new_param = block.params[param_idx].to_dict()
+                                            new_param['value'] = item_data['name']
+                                            new_param['is_variable'] = True
+                                            new_param['variable_type'] = item_data.get('type', 'unknown')
+                                            self.setBlockParam(block, param_idx, new_param)
+                                            print(f"条件变量已替换为: {item_data['name']}")
+                                        else:
+                                            # 新增参数（追加到参数列表末尾）
+                                            self.setBlockParam(block, len(block.params), {
                                                 'name': '条件',
                                                 'type': 'boolean',
                                                 'value': item_data['name'],
@@ -770,21 +1112,20 @@ class ProgrammingCanvas(QWidget):
                     
                     # 创建连接，表示将函数输出赋值给变量
                     new_connection = Connection(
-                        from_block=from_block_index,
+                        from_block=self._block_id(from_block_index),
                         from_node=from_node,
-                        to_block=-1,  # 特殊标记，表示指向变量
+                        to_block=None,  # 特殊标记，表示指向变量
                         to_node=to_variable_node
                     )
                     new_connection.type = 'data'
                     
                     # 清除与该变量相关的旧连接
-                    for conn in self.connections[:]:
-                        if hasattr(conn.to_node, 'variable') and conn.to_node.variable == item_data['name']:
-                            print(f"清除变量旧连接: {conn.from_node.name} -> {conn.to_node.variable}")
-                            self.connections.remove(conn)
+                    for conn in self.connection_index.variable_incoming(item_data['name']):
+                        print(f"清除变量旧连接: {conn.from_node.name} -> {conn.to_node.variable}")
+                        self._removeConnection(conn)
                     
                     # 添加新连接
-                    self.connections.append(new_connection)
+                    self.addConnection(new_connection)
                     # 发送变量更新信号
                     self.variableUpdated.emit(item_data['name'], from_node.value_type)
                     self.update()
@@ -804,21 +1145,17 @@ class ProgrammingCanvas(QWidget):
                     from_variable_node.variable = item_data['name']  # 标记为变量节点
                     
                     # 清除目标节点的旧连接
-                    old_connections = [conn for conn in self.connections 
-                                      if conn.to_node == target_node and conn.to_block == target_block_index]
-                    for conn in old_connections:
-                        print(f"清除目标节点的旧连接: {conn.from_node.name}")
-                        self.connections.remove(conn)
+                    self._replace_target_connections(target_node)
                     
                     # 创建新连接
                     new_connection = Connection(
-                        from_block=-1,  # 特殊标记，表示来自变量
+                        from_block=None,  # 特殊标记，表示来自变量
                         from_node=from_variable_node,
-                        to_block=target_block_index,
+                        to_block=self._block_id(target_block_index),
                         to_node=target_node
                     )
                     new_connection.type = 'data'
-                    self.connections.append(new_connection)
+                    self.addConnection(new_connection)
                     self.update()
                     print(f"变量 {item_data['name']} 已连接到节点 {target_node.name}")
                     return
@@ -836,21 +1173,17 @@ class ProgrammingCanvas(QWidget):
                     from_variable_node.variable = item_data['name']  # 标记为变量节点
                     
                     # 清除目标节点的旧连接
-                    old_connections = [conn for conn in self.connections 
-                                      if conn.to_node == target_node and conn.to_block == target_block_index]
-                    for conn in old_connections:
-                        print(f"清除目标节点的旧连接: {conn.from_node.name}")
-                        self.connections.remove(conn)
+                    self._replace_target_connections(target_node)
                     
                     # 创建新连接
                     new_connection = Connection(
-                        from_block=-1,  # 特殊标记，表示来自变量
+                        from_block=None,  # 特殊标记，表示来自变量
                         from_node=from_variable_node,
-                        to_block=target_block_index,
+                        to_block=self._block_id(target_block_index),
                         to_node=target_node
                     )
                     new_connection.type = 'data'
-                    self.connections.append(new_connection)
+                    self.addConnection(new_connection)
                     self.update()
                     print(f"变量 {item_data['name']} 已连接到节点 {target_node.name}")
                     return
@@ -862,37 +1195,95 @@ class ProgrammingCanvas(QWidget):
             self.drag_preview = None
             self.update()
     
+    def _insertBlock(self, block: ProgramBlock, index: int):
+        """在指定位置插入程序块并登记块ID"""
+        self.blocks.insert(index, block)
+        self.block_map[block.id] = block
+        if self._recording:
+            self._recordOperation({'op': 'block_added', 'block': block_to_dict(block)})
+        self.undo_stack.push(AddBlockCommand(self, block, index))
+    
+    def _appendBlock(self, block: ProgramBlock):
+        """追加程序块并登记块ID"""
+        self._insertBlock(block, len(self.blocks))
+    
+    def _deleteBlock(self, block: ProgramBlock):
+        """删除程序块及与它相关的连接"""
+        index = self.blocks.index(block)
+        
+        # 通过邻接索引移除相关的连接，连接以块ID引用程序块，无需修正其余连接
+        removed = self.connection_index.remove_block(block.id)
+        if removed:
+            self._invalidateConnectionPaths()
+        
+        # 移除块
+        self.blocks.pop(index)
+        del self.block_map[block.id]
+        self.selected_block_ids.discard(block.id)
+        self._recordOperation({'op': 'block_removed', 'block_id': block.id})
+        self.undo_stack.push(RemoveBlockCommand(self, block, index, removed))
+    
     def addBlock(self, block: ProgramBlock):
         """添加程序块"""
-        self.blocks.append(block)
+        self._appendBlock(block)
+        self.update()
+    
+    def addBlocks(self, blocks: List[ProgramBlock]):
+        """批量添加程序块，只重绘一次（作为一步撤销）"""
+        with self.undo_stack.macro("添加程序块"):
+            for block in blocks:
+                self._appendBlock(block)
+        self.update()
+    
+    def addConnections(self, connections: List[Connection]):
+        """批量添加连接，只重绘一次（作为一步撤销）"""
+        with self.undo_stack.macro("添加连接"):
+            for connection in connections:
+                self.addConnection(connection)
+        self.update()
+    
+    def setProgram(self, blocks: List[ProgramBlock], connections: List[Connection]):
+        """用加载的程序替换画布内容（新建程序时传入空列表）
+
+        批量添加期间不发出编辑操作信号、不记录撤销历史，完成后清空撤销历史；
+        自动保存由调用方以完整程序重新开始。
+        """
+        self._recording = False
+        try:
+            with self.undo_stack.suspended():
+                self.clear()
+                for block in blocks:
+                    self._appendBlock(block)
+                for connection in connections:
+                    self.addConnection(connection)
+        finally:
+            self._recording = True
+        self.undo_stack.clear()
         self.update()
     
+    def getBlock(self, block_id: str) -> Optional[ProgramBlock]:
+        """按块ID获取程序块"""
+        return self.block_map.get(block_id)
+    
     def removeSelectedBlock(self):
         """移除选中的程序块"""
         if self.selected_block_index >= 0:
-            # 移除相关的连接
-            self.connections = [conn for conn in self.connections 
-                              if conn.from_block != self.selected_block_index 
-                              and conn.to_block != self.selected_block_index]
-            
-            # 更新连接索引
-            for conn in self.connections:
-                if conn.from_block > self.selected_block_index:
-                    conn.from_block -= 1
-                if conn.to_block > self.selected_block_index:
-                    conn.to_block -= 1
-            
-            # 移除块
-            self.blocks.pop(self.selected_block_index)
+            self._deleteBlock(self.blocks[self.selected_block_index])
             self.selected_block_index = -1
             self.blockSelected.emit(-1)
             self.update()
     
     def clear(self):
-        """清空画布"""
+        """清空画布（可撤销，被清除的块和连接直接由撤销记录引用）"""
+        if self.blocks or len(self.connection_index):
+            self.undo_stack.push(ClearCommand(self, self.blocks, self.connections))
         self.blocks = []
-        self.connections = []
+        self.block_map = {}
+        self.selected_block_ids = set()
+        self.connection_index.clear()
+        self._invalidateConnectionPaths()
         self.selected_block_index = -1
+        self._recordOperation({'op': 'cleared'})
         self.update()
     
     def setDragItem(self, item_type, item_data):
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+画布编辑命令
+
+每个命令只保存改动本身：被添加或删除的程序块/连接对象（直接引用，不复制）、
+移动前后的位置、修改前后的参数字典。
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.data_models import ProgramBlock, Connection
+from core.undo import Command
+
+
+class AddBlockCommand(Command):
+    """添加程序块"""
+    text = "添加程序块"
+
+    def __init__(self, canvas, block: ProgramBlock, index: int):
+        self.canvas = canvas
+        self.block = block
+        self.index = index
+
+    def undo(self):
+        self.canvas._deleteBlock(self.block)
+
+    def redo(self):
+        self.canvas._insertBlock(self.block, self.index)
+
+
+class RemoveBlockCommand(Command):
+    """删除程序块（连同与它相关的连接）"""
+    text = "删除程序块"
+
+    def __init__(self, canvas, block: ProgramBlock, index: int, connections: List[Connection]):
+        self.canvas = canvas
+        self.block = block
+        self.index = index
+        self.connections = connections
+
+    def undo(self):
+        self.canvas._insertBlock(self.block, self.index)
+        for connection in self.connections:
+            self.canvas.addConnection(connection)
+
+    def redo(self):
+        self.canvas._deleteBlock(self.block)
+
+
+class MoveBlocksCommand(Command):
+    """移动程序块"""
+    text = "移动程序块"
+
+    def __init__(self, canvas, moves: Dict[str, Tuple[Tuple[int, int], Tuple[int, int]]]):
+        self.canvas = canvas
+        self.moves = moves  # 块ID -> (原位置, 新位置)
+
+    def _apply(self, which: int):
+        self.canvas._moveBlocks({block_id: positions[which] for block_id, positions in self.moves.items()})
+
+    def undo(self):
+        self._apply(0)
+
+    def redo(self):
+        self._apply(1)
+
+    def merge_with(self, other: Command) -> bool:
+        # 对同一组块的连续移动合并为一步
+        if not isinstance(other, MoveBlocksCommand) or other.moves.keys() != self.moves.keys():
+            return False
+        for block_id, (_, new_position) in other.moves.items():
+            self.moves[block_id] = (self.moves[block_id][0], new_position)
+        return True
+
+
+class ParamChangeCommand(Command):
+    """修改、添加参数（old为None表示新增的参数）"""
+    text = "修改参数"
+
+    def __init__(self, canvas, block: ProgramBlock, index: int,
+                 old: Optional[Dict[str, Any]], new: Dict[str, Any]):
+        self.canvas = canvas
+        self.block = block
+        self.index = index
+        self.old = old
+        self.new = new
+
+    def undo(self):
+        self.canvas._setParam(self.block, self.index, self.old)
+
+    def redo(self):
+        self.canvas._setParam(self.block, self.index, self.new)
+
+
+class AddConnectionCommand(Command):
+    """添加连接"""
+    text = "添加连接"
+
+    def __init__(self, canvas, connection: Connection):
+        self.canvas = canvas
+        self.connection = connection
+
+    def undo(self):
+        self.canvas._removeConnection(self.connection)
+
+    def redo(self):
+        self.canvas.addConnection(self.connection)
+
+
+class RemoveConnectionCommand(AddConnectionCommand):
+    """删除连接"""
+    text = "删除连接"
+
+    def undo(self):
+        super().redo()
+
+    def redo(self):
+        super().undo()
+
+
+class ClearCommand(Command):
+    """清空画布"""
+    text = "清空画布"
+
+    def __init__(self, canvas, blocks: List[ProgramBlock], connections: List[Connection]):
+        self.canvas = canvas
+        self.blocks = blocks
+        self.connections = connections
+
+    def undo(self):
+        self.canvas.addBlocks(self.blocks)
+        self.canvas.addConnections(self.connections)
+
+    def redo(self):
+        self.canvas.clear()
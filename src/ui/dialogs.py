@@ -11,6 +11,8 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt
 
+from core.expressions import ExpressionError, compile_expression
+
 
 class CreateVariableDialog(QDialog):
     """创建变量对话框"""
@@ -249,6 +251,12 @@ class ExpressionEditorDialog(QDialog):
         self.expr_edit.setText(current_expression)
         main_layout.addWidget(self.expr_edit)
         
+        # 即时验证结果
+        self.status_label = QLabel()
+        self.status_label.setWordWrap(True)
+        main_layout.addWidget(self.status_label)
+        self.expr_edit.textChanged.connect(self.validate_expression)
+        
         # 可用变量列表
         if self.variables:
             var_group = QGroupBox("可用变量:")
@@ -267,6 +275,7 @@ class ExpressionEditorDialog(QDialog):
 - 支持的操作符：+ - * / % ** ( )
 - 支持的比较操作符：== != < > <= >=
 - 支持的逻辑操作符：and or not
+- 支持的函数：abs min max round int float bool
         """
         help_label = QLabel(help_text)
         help_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
@@ -285,17 +294,45 @@ class ExpressionEditorDialog(QDialog):
         button_layout.addWidget(cancel_button)
         
         main_layout.addLayout(button_layout)
+        self.validate_expression()
+    
+    def validate_expression(self) -> bool:
+        """验证表达式并显示结果（编译结果按文本缓存，每次输入都可以即时验证）"""
+        expression = self.expr_edit.text().strip()
+        if not expression:
+            self.status_label.setText("")
+            return False
+        try:
+            compiled = compile_expression(expression)
+        except ExpressionError as e:
+            self.status_label.setStyleSheet("color: #c62828;")
+            self.status_label.setText(f"✗ {e.message}")
+            return False
+        
+        known_names = {var_name for var_name, _, _ in self.variables}
+        unknown = sorted(compiled.names - known_names)
+        if unknown and self.variables:
+            # 变量可能在程序运行中才赋值，只作提示
+            self.status_label.setStyleSheet("color: #ef6c00;")
+            self.status_label.setText("⚠ 未定义的变量: " + '、'.join(unknown))
+        elif compiled.is_constant:
+            self.status_label.setStyleSheet("color: #2e7d32;")
+            self.status_label.setText(f"✓ 常量表达式，值为 {compiled.value!r}")
+        else:
+            self.status_label.setStyleSheet("color: #2e7d32;")
+            self.status_label.setText("✓ 表达式有效")
+        return True
     
     def accept(self):
         """确认按钮点击事件"""
-        # 简单验证表达式
         expression = self.expr_edit.text().strip()
         if not expression:
             QMessageBox.warning(self, "警告", "表达式不能为空！")
             return
         
-        # 可以添加更复杂的表达式验证
-        # 例如检查括号是否匹配等
+        if not self.validate_expression():
+            QMessageBox.warning(self, "警告", f"表达式无效: {self.status_label.text().lstrip('✗ ')}")
+            return
         
         super().accept()
     
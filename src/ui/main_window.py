@@ -7,7 +7,6 @@
 
 import os
 import json
-import yaml
 from PyQt6.QtWidgets import (
     QMainWindow, QTabWidget, QWidget, QVBoxLayout, QHBoxLayout, QSplitter,
     QPushButton, QGroupBox, QLabel, QDockWidget, QMessageBox, QFileDialog,
@@ -15,12 +14,15 @@ from PyQt6.QtWidgets import (
     QListWidgetItem, QFrame, QComboBox, QLineEdit, QDialog, QGridLayout
 )
 from PyQt6.QtCore import Qt, QSettings, QSize, QMimeData
-from PyQt6.QtGui import QIcon, QCloseEvent, QAction, QColor, QFont, QDrag
+from PyQt6.QtGui import QIcon, QCloseEvent, QAction, QColor, QFont, QDrag, QKeySequence
 
 from ui.canvas import ProgrammingCanvas
 from ui.toolbox import VariableListWidget, FunctionListWidget
 from ui.dialogs import CreateVariableDialog
 from core.data_models import ProgramBlock, Node, NodeType, Variable
+from core.program_io import FILE_FILTER, build_program, load_program_file, program_to_dict, save_program_file
+from core.autosave import AutosaveJournal
+from core.validation import ProgramStreamValidator, validate_program
 
 
 class RobotProgrammingApp(QMainWindow):
@@ -33,6 +35,39 @@ class RobotProgrammingApp(QMainWindow):
         # 连接画布的变量更新信号到变量显示更新槽函数
         self.canvas.variableUpdated.connect(self.handle_variable_updated)
         self.load_settings()
+        self.init_autosave()
+    
+    def init_autosave(self):
+        """启动后台自动保存，存在上次异常退出留下的数据时询问是否恢复"""
+        self.autosave = AutosaveJournal()
+        recovered = None
+        if AutosaveJournal.has_recovery(self.autosave.directory):
+            try:
+                recovered = AutosaveJournal.recover(self.autosave.directory)
+            except (OSError, ValueError) as e:
+                print(f"读取自动保存数据失败: {str(e)}")
+            
+            if recovered and recovered.get("blocks"):
+                prompt = "检测到上次未正常退出时自动保存的程序，是否恢复？"
+                validation = validate_program(recovered)
+                if not validation.valid:
+                    prompt += f"\n\n自动保存的数据存在问题（无效的程序块和连接将被跳过）：\n{validation.summary()}"
+                reply = QMessageBox.question(
+                    self, "恢复程序", prompt,
+                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+                )
+                if reply == QMessageBox.StandardButton.Yes:
+                    program = build_program(recovered)
+                    self.canvas.setProgram(program.blocks, program.connections)
+                    self.statusBar.showMessage(f"已恢复自动保存的程序: {len(program.blocks)}个程序块")
+                else:
+                    recovered = None
+            else:
+                recovered = None
+        
+        # 以当前画布内容作为初始快照，之后的编辑操作追加到日志
+        self.autosave.start(recovered)
+        self.canvas.operationRecorded.connect(self.autosave.record)
     
     def init_ui(self):
         """初始化UI"""
@@ -94,6 +129,18 @@ class RobotProgrammingApp(QMainWindow):
         
         toolbar.addSeparator()
         
+        self.undo_action = QAction("撤销", self)
+        self.undo_action.setShortcut(QKeySequence.StandardKey.Undo)
+        self.undo_action.triggered.connect(lambda: self.canvas.undo())
+        toolbar.addAction(self.undo_action)
+        
+        self.redo_action = QAction("重做", self)
+        self.redo_action.setShortcut(QKeySequence.StandardKey.Redo)
+        self.redo_action.triggered.connect(lambda: self.canvas.redo())
+        toolbar.addAction(self.redo_action)
+        
+        toolbar.addSeparator()
+        
         self.run_action = QAction("运行", self)
         self.run_action.triggered.connect(self.run_program)
         toolbar.addAction(self.run_action)
@@ -110,6 +157,26 @@ class RobotProgrammingApp(QMainWindow):
         
         toolbar.addSeparator()
         
+        self.fit_view_action = QAction("适应视图", self)
+        self.fit_view_action.triggered.connect(lambda: self.canvas.fitToView())
+        toolbar.addAction(self.fit_view_action)
+        
+        self.reset_view_action = QAction("100%", self)
+        self.reset_view_action.triggered.connect(lambda: self.canvas.resetView())
+        toolbar.addAction(self.reset_view_action)
+        
+        toolbar.addSeparator()
+        
+        self.heatmap_action = QAction("性能热图", self)
+        self.heatmap_action.triggered.connect(self.show_profile_heatmap)
+        toolbar.addAction(self.heatmap_action)
+        
+        self.clear_heatmap_action = QAction("清除热图", self)
+        self.clear_heatmap_action.triggered.connect(lambda: self.canvas.clearHeatmap())
+        toolbar.addAction(self.clear_heatmap_action)
+        
+        toolbar.addSeparator()
+        
         self.export_action = QAction("导出代码", self)
         self.export_action.triggered.connect(self.export_code)
         toolbar.addAction(self.export_action)
@@ -525,64 +592,24 @@ class RobotProgrammingApp(QMainWindow):
                 if not self.save_program():
                     return
         
-        # 清空画布
-        self.canvas.clear()
+        # 清空画布，新程序不保留撤销历史，自动保存从空程序重新开始
+        self.canvas.setProgram([], [])
+        self.autosave.reset(program_to_dict([], []))
         self.statusBar.showMessage("新建程序")
     
     def save_program(self):
         """保存程序"""
         # 打开文件对话框
         file_path, _ = QFileDialog.getSaveFileName(
-            self, "保存程序", "", "程序文件 (*.robot);;JSON文件 (*.json);;YAML文件 (*.yaml;*.yml)"
+            self, "保存程序", "", FILE_FILTER
         )
         
         if not file_path:
             return False
         
         try:
-            # 准备程序数据
-            program_data = {
-                "blocks": [],
-                "connections": []
-            }
-            
-            # 保存块数据
-            for block in self.canvas.blocks:
-                block_data = {
-                    "id": block.id,
-                    "name": block.name,
-                    "type": block.type,
-                    "x": block.x,
-                    "y": block.y,
-                    "params": block.params,
-                    "input_nodes": [node.node_id for node in block.input_nodes],
-                    "output_nodes": [node.node_id for node in block.output_nodes]
-                }
-                program_data["blocks"].append(block_data)
-            
-            # 保存连接数据
-            for conn in self.canvas.connections:
-                conn_type = "execution" if conn.from_node.value_type == "execution" else "data"
-                conn_data = {
-                    "from_block": conn.from_block,
-                    "from_block_id": self.canvas.blocks[conn.from_block].id,
-                    "from_node": conn.from_node.node_id,
-                    "to_block": conn.to_block,
-                    "to_block_id": self.canvas.blocks[conn.to_block].id,
-                    "to_node": conn.to_node.node_id,
-                    "type": conn_type  # 区分执行流连接和数据流连接
-                }
-                program_data["connections"].append(conn_data)
-            
             # 根据文件扩展名选择保存格式
-            ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext == '.json' or ext == '.robot':
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(program_data, f, ensure_ascii=False, indent=2)
-            elif ext in ['.yaml', '.yml']:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    yaml.dump(program_data, f, allow_unicode=True)
+            save_program_file(file_path, self.canvas.blocks, self.canvas.connections)
             
             self.statusBar.showMessage(f"程序已保存: {file_path}")
             return True
@@ -608,85 +635,75 @@ class RobotProgrammingApp(QMainWindow):
         
         # 打开文件对话框
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "加载程序", "", "程序文件 (*.robot);;JSON文件 (*.json);;YAML文件 (*.yaml;*.yml)"
+            self, "加载程序", "", FILE_FILTER
         )
         
         if not file_path:
             return
         
         try:
-            # 清空画布
-            self.canvas.clear()
-            
-            # 根据文件扩展名选择加载格式
-            ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext in ['.json', '.robot']:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    program_data = json.load(f)
-            elif ext in ['.yaml', '.yml']:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    program_data = yaml.safe_load(f)
-            
-            # 创建块ID到索引的映射
-            block_id_to_index = {}
-            
-            # 加载块数据
-            for block_data in program_data.get("blocks", []):
-                block = ProgramBlock(
-                    name=block_data["name"],
-                    block_type=block_data["type"],
-                    x=block_data["x"],
-                    y=block_data["y"],
-                    params=block_data.get("params", [])
+            # 流式解析文件并构建程序块和连接，读取的同时逐项验证，然后一次性添加到画布
+            validator = ProgramStreamValidator()
+            program = load_program_file(file_path, validator)
+            validation = validator.result()
+            if not validation.valid:
+                reply = QMessageBox.warning(
+                    self, "程序验证失败", f"{validation.summary()}\n\n是否仍然加载？（无效的程序块和连接将被跳过）",
+                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
                 )
-                # 如果保存的数据中有ID，使用它；否则保留自动生成的ID
-                if "id" in block_data:
-                    block.id = block_data["id"]
-                
-                self.canvas.addBlock(block)
-                block_id_to_index[block.id] = len(self.canvas.blocks) - 1
+                if reply != QMessageBox.StandardButton.Yes:
+                    return
             
-            # 加载连接数据
-            for conn_data in program_data.get("connections", []):
-                # 找到源块和目标块
-                from_block_idx = conn_data["from_block"]
-                to_block_idx = conn_data["to_block"]
-                
-                # 找到源节点和目标节点
-                from_node_id = conn_data["from_node"]
-                to_node_id = conn_data["to_node"]
-                
-                from_node = None
-                to_node = None
-                
-                # 查找源节点
-                for node in self.canvas.blocks[from_block_idx].output_nodes:
-                    if node.node_id == from_node_id:
-                        from_node = node
-                        break
-                
-                # 查找目标节点
-                for node in self.canvas.blocks[to_block_idx].input_nodes:
-                    if node.node_id == to_node_id:
-                        to_node = node
-                        break
-                
-                # 如果找到节点，创建连接
-                if from_node and to_node:
-                    new_connection = Connection(
-                        from_block=from_block_idx,
-                        from_node=from_node,
-                        to_block=to_block_idx,
-                        to_node=to_node
-                    )
-                    self.canvas.connections.append(new_connection)
+            # 替换画布内容（不逐项记录自动保存操作和撤销历史），自动保存以加载的程序为新快照
+            self.canvas.setProgram(program.blocks, program.connections)
+            self.autosave.reset(program_to_dict(self.canvas.blocks, self.canvas.connections))
             
-            self.statusBar.showMessage(f"程序已加载: {file_path}")
+            message = f"程序已加载: {file_path} ({program.summary()})"
+            if validation.warnings:
+                message += f"，{len(validation.warnings)}个警告"
+            self.statusBar.showMessage(message)
         
         except Exception as e:
             QMessageBox.critical(self, "错误", f"加载程序失败: {str(e)}")
     
+    def show_profile_heatmap(self):
+        """读取性能分析数据（python -m src.utils.simulation_profiler --json生成），在画布上显示热图"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "打开性能分析数据", "", "性能分析数据 (*.json)"
+        )
+        
+        if not file_path:
+            return
+        
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                blocks = json.load(f)['blocks']
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            QMessageBox.critical(self, "错误", f"读取性能分析数据失败: {str(e)}")
+            return
+        
+        metrics = {
+            "实际耗时": ('cpu_time', lambda value: f"{value * 1000:.2f}毫秒"),
+            "模拟时间": ('sim_time', lambda value: f"{value:.2f}秒"),
+            "执行次数": ('hits', lambda value: f"{value}次"),
+        }
+        metric, ok = QInputDialog.getItem(self, "性能热图", "显示指标:", list(metrics), 0, False)
+        if not ok:
+            return
+        key, label = metrics[metric]
+        
+        values = {}
+        labels = {}
+        for item in blocks:
+            block_id = item.get('id')
+            if block_id is not None and item.get(key):
+                values[block_id] = item[key]
+                labels[block_id] = label(item[key])
+        self.canvas.setHeatmap(values, labels)
+        
+        matched = sum(1 for block_id in values if self.canvas.getBlock(block_id) is not None)
+        self.statusBar.showMessage(f"性能热图: {metric}，{matched}/{len(values)}个执行过的块在当前程序中")
+    
     def export_code(self):
         """导出Python代码"""
         # 打开文件对话框
@@ -725,6 +742,11 @@ class RobotProgrammingApp(QMainWindow):
         code.append("\ndef main():")
         code.append("    \"\"\"主函数\"\"\"")
         
+        # 定义块ID到索引的映射，用于递归查找
+        block_to_index = {}
+        for i, block in enumerate(self.canvas.blocks):
+            block_to_index[block.id] = i
+        
         # 构建连接图，用于确定执行顺序和分支关系
         # 执行流连接映射：from_node -> [to_nodes]
         execution_graph = {}
@@ -732,25 +754,25 @@ class RobotProgrammingApp(QMainWindow):
         data_graph = {}
         
         for conn in self.canvas.connections:
+            # 连接以块ID引用程序块，这里换算为块索引
+            from_block_idx = block_to_index.get(conn.from_block)
+            to_block_idx = block_to_index.get(conn.to_block)
+            if from_block_idx is None or to_block_idx is None:
+                continue
             # 判断连接类型
             if conn.from_node.value_type == "execution":
                 # 执行流连接
-                if (conn.from_block, conn.from_node.node_id) not in execution_graph:
-                    execution_graph[(conn.from_block, conn.from_node.node_id)] = []
-                execution_graph[(conn.from_block, conn.from_node.node_id)].append(
-                    (conn.to_block, conn.to_node.node_id)
+                if (from_block_idx, conn.from_node.node_id) not in execution_graph:
+                    execution_graph[(from_block_idx, conn.from_node.node_id)] = []
+                execution_graph[(from_block_idx, conn.from_node.node_id)].append(
+                    (to_block_idx, conn.to_node.node_id)
                 )
             else:
                 # 数据流连接
-                data_graph[(conn.to_block, conn.to_node.node_id)] = (
-                    conn.from_block, conn.from_node.node_id
+                data_graph[(to_block_idx, conn.to_node.node_id)] = (
+                    from_block_idx, conn.from_node.node_id
                 )
         
-        # 定义块ID到索引的映射，用于递归查找
-        block_to_index = {}
-        for i, block in enumerate(self.canvas.blocks):
-            block_to_index[block.id] = i
-        
         # 生成代码的递归函数
         def generate_block_code(block_idx, indent_level=1):
             block = self.canvas.blocks[block_idx]
@@ -763,9 +785,9 @@ class RobotProgrammingApp(QMainWindow):
                     condition_value = "True"
                     
                     # 先尝试从参数获取条件
-                    for param in block.params:
-                        if param.get('name') == '条件':
-                            condition_value = param.get('value', 'True')
+                    condition_param = block.find_param('条件')
+                    if condition_param is not None:
+                        condition_value = condition_param.get('value', 'True')
                     
                     # 检查是否有数据流连接到条件节点
                     found_connection = False
@@ -944,12 +966,9 @@ class RobotProgrammingApp(QMainWindow):
             # 检查是否有执行流连接到这个块的任何输入节点
             for node in block.input_nodes:
                 if node.value_type == "execution":
-                    # 检查是否有连接到这个节点
-                    for conn in self.canvas.connections:
-                        if conn.to_block == i and conn.to_node == node:
-                            is_start = False
-                            break
-                    if not is_start:
+                    # 通过邻接索引检查是否有连接到这个节点
+                    if self.canvas.connection_index.incoming(node):
+                        is_start = False
                         break
             if is_start:
                 start_blocks.append(i)
@@ -969,10 +988,7 @@ class RobotProgrammingApp(QMainWindow):
     
     def _get_param_value(self, block, param_name):
         """获取参数值"""
-        for param in block.params:
-            if param['name'] == param_name:
-                return param.get('value', param.get('default', 0))
-        return 0
+        return block.get_param(param_name, 0)
     
     def run_program(self):
         """运行程序"""
@@ -1025,4 +1041,7 @@ class RobotProgrammingApp(QMainWindow):
         # 保存设置
         self.save_settings()
         
+        # 正常退出，删除自动保存数据
+        self.autosave.stop(discard=True)
+        
         event.accept()
\ No newline at end of file
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批量模拟运行
+
+不启动界面，加载程序文件并用ExecutionSimulator执行，支持对初始变量和块参数做网格扫描，
+各用例在进程池中并行执行，最后输出结果汇总。有用例出错时退出码为1，可用于发布前的回归测试。
+
+在仓库根目录运行，例如:
+    python -m src.utils.batch_runner programs/ --var count=0,5,10 --param 前进.速度=30:90:30 --workers 4
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..core.data_models import Variable
+from ..core.program_io import BINARY_EXTENSION, ProgramBuilder, iter_program_file
+from .code_generator import ExecutionSimulator
+
+# 目录参数中会被运行的程序文件扩展名
+PROGRAM_EXTENSIONS = ('.robot', '.json', BINARY_EXTENSION, '.yaml', '.yml')
+
+_RANGE = re.compile(r'^(-?\d+):(-?\d+)(?::(-?\d+))?$')
+
+# 工作进程中已读取的程序文件：(路径, 修改时间) -> 顶层项列表
+_program_items_cache: Dict[Tuple[str, int], list] = {}
+
+
+def parse_value(text: str) -> Any:
+    """把命令行中的值解析为JSON值（数字、布尔值等），无法解析时作为字符串"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_values(text: str) -> List[Any]:
+    """解析扫描取值：逗号分隔的列表，或 起始:结束[:步长] 形式的整数范围（不含结束值）"""
+    match = _RANGE.match(text.strip())
+    if match:
+        start, stop, step = int(match.group(1)), int(match.group(2)), int(match.group(3) or 1)
+        if step == 0:
+            raise ValueError(f"范围步长不能为0: {text}")
+        return list(range(start, stop, step))
+    return [parse_value(item.strip()) for item in text.split(',')]
+
+
+class SweepAxis:
+    """扫描的一个维度：一个初始变量或一个块参数的取值列表"""
+
+    def __init__(self, kind: str, target: str, values: List[Any], param: Optional[str] = None):
+        self.kind = kind        # 'var'或'param'
+        self.target = target    # 变量名，或块名称/块ID
+        self.param = param      # kind为'param'时的参数名
+        self.values = values
+
+    @property
+    def label(self) -> str:
+        return self.target if self.kind == 'var' else f"{self.target}.{self.param}"
+
+    @classmethod
+    def parse(cls, kind: str, text: str) -> 'SweepAxis':
+        name, sep, values = text.partition('=')
+        if not sep or not name:
+            raise argparse.ArgumentTypeError(f"扫描参数应为 名称=取值: {text}")
+        try:
+            parsed = parse_values(values)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+        if kind == 'param':
+            target, dot, param = name.partition('.')
+            if not dot or not target or not param:
+                raise argparse.ArgumentTypeError(f"块参数应为 块名称.参数名=取值: {text}")
+            return cls(kind, target, parsed, param)
+        return cls(kind, name, parsed)
+
+
+def sweep_cases(axes: List[SweepAxis]) -> List[Dict[str, Any]]:
+    """展开扫描网格，每个用例为 维度标签 -> 取值（没有扫描维度时只有一个空用例）"""
+    labels = [axis.label for axis in axes]
+    return [dict(zip(labels, values)) for values in itertools.product(*(axis.values for axis in axes))]
+
+
+def find_program_files(paths: Iterable[str]) -> List[str]:
+    """展开命令行中的文件和目录"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if os.path.splitext(name)[1].lower() in PROGRAM_EXTENSIONS)
+        else:
+            files.append(path)
+    return files
+
+
+def _variable_type(value: Any) -> str:
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    return 'string'
+
+
+def _plain(value: Any) -> Any:
+    """把变量值转换为可写入JSON的形式"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+def _load_items(path: str) -> list:
+    """读取程序文件的顶层项（同一工作进程内按修改时间缓存）"""
+    key = (path, os.stat(path).st_mtime_ns)
+    items = _program_items_cache.get(key)
+    if items is None:
+        items = _program_items_cache[key] = list(iter_program_file(path))
+    return items
+
+
+def run_case(path: str, case: Dict[str, Any], axes: List[SweepAxis],
+             simulator_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """运行一个用例，返回结果字典"""
+    result = {'path': path, 'case': case, 'ok': False, 'error': None, 'stop_reason': None, 'steps': 0,
+              'elapsed': 0.0, 'simulated_time': 0.0, 'output_count': 0, 'variables': {}}
+    try:
+        program = ProgramBuilder().build_from_items(_load_items(path))
+    except Exception as e:
+        # 单个文件无法读取或格式错误时只记为失败用例，不中断整个批次
+        result['error'] = f"加载程序失败: {str(e)}"
+        return result
+
+    variables = {}
+    for axis in axes:
+        value = case[axis.label]
+        if axis.kind == 'var':
+            variables[axis.target] = Variable(axis.target, _variable_type(value), value)
+            continue
+        matched = False
+        for block in program.blocks:
+            if (block.name == axis.target or block.id == axis.target) and block.has_param(axis.param):
+                block.set_param(axis.param, value)
+                matched = True
+        if not matched:
+            result['error'] = f"程序中没有带参数 {axis.param} 的块 {axis.target}"
+            return result
+
+    simulator = ExecutionSimulator(**(simulator_options or {}))
+    start = time.perf_counter()
+    output = simulator.execute(program.blocks, program.connections, variables)
+    result['elapsed'] = time.perf_counter() - start
+    result['ok'] = not simulator.error_occurred
+    result['error'] = simulator.last_error
+    result['stop_reason'] = simulator.stop_reason
+    result['steps'] = simulator.steps
+    result['simulated_time'] = simulator.clock.now
+    result['output_count'] = output.total
+    result['variables'] = {name: _plain(value) for name, value in simulator.variables.items()}
+    return result
+
+
+def _run_chunk(path: str, cases: List[Dict[str, Any]], axes: List[SweepAxis],
+               simulator_options: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [run_case(path, case, axes, simulator_options) for case in cases]
+
+
+def run_batch(paths: List[str], axes: List[SweepAxis], workers: Optional[int] = None,
+              chunk_size: int = 16, simulator_options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """运行所有程序文件的所有扫描用例
+
+    同一文件的用例按chunk_size分组提交到进程池，工作进程对每个文件只读取一次。
+    workers为1时在当前进程中顺序执行。结果按(文件, 用例)的顺序返回。
+    """
+    cases = sweep_cases(axes)
+    chunks = [(path, cases[i:i + chunk_size]) for path in paths for i in range(0, len(cases), chunk_size)]
+    if workers == 1 or len(chunks) <= 1:
+        return [result for path, chunk in chunks for result in _run_chunk(path, chunk, axes, simulator_options)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run_chunk, path, chunk, axes, simulator_options) for path, chunk in chunks]
+        return [result for future in futures for result in future.result()]
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """按文件汇总结果：用例数、成功数、步数、最长模拟时间、耗时统计和各种错误的出现次数"""
+    files: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        summary = files.setdefault(result['path'], {
+            'cases': 0, 'passed': 0, 'steps': 0, 'max_simulated_time': 0.0, 'min_ms': None, 'max_ms': 0.0, 'total_ms': 0.0, 'errors': {}
+        })
+        elapsed = result['elapsed'] * 1000
+        summary['cases'] += 1
+        summary['steps'] += result['steps']
+        summary['max_simulated_time'] = max(summary['max_simulated_time'], result['simulated_time'])
+        summary['total_ms'] += elapsed
+        summary['max_ms'] = max(summary['max_ms'], elapsed)
+        summary['min_ms'] = elapsed if summary['min_ms'] is None else min(summary['min_ms'], elapsed)
+        if result['ok']:
+            summary['passed'] += 1
+        else:
+            error = result['error'] or '未知错误'
+            summary['errors'][error] = summary['errors'].get(error, 0) + 1
+    for summary in files.values():
+        summary['mean_ms'] = summary['total_ms'] / summary['cases']
+    return {
+        'files': files,
+        'cases': len(results),
+        'passed': sum(1 for result in results if result['ok']),
+    }
+
+
+def print_summary(summary: Dict[str, Any], elapsed: float):
+    print(f"{'程序文件':<40} {'用例':>6} {'成功':>6} {'总步数':>10} {'模拟时间(秒)':>12} "
+          f"{'平均(毫秒)':>12} {'最长(毫秒)':>12}")
+    for path, item in summary['files'].items():
+        print(f"{path:<40} {item['cases']:>6} {item['passed']:>6} {item['steps']:>10} "
+              f"{item['max_simulated_time']:>12.2f} {item['mean_ms']:>12.3f} {item['max_ms']:>12.3f}")
+        for error, count in item['errors'].items():
+            print(f"    {count} 个用例出错: {error}")
+    failed = summary['cases'] - summary['passed']
+    print(f"共{summary['cases']}个用例, 成功{summary['passed']}, 失败{failed}, 总用时{elapsed:.2f}秒")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="批量模拟运行程序文件")
+    parser.add_argument('paths', nargs='+', help="程序文件或目录")
+    parser.add_argument('--var', action='append', default=[], type=lambda text: SweepAxis.parse('var', text),
+                        help="扫描初始变量: 名称=取值1,取值2 或 名称=起始:结束[:步长]（可重复）")
+    parser.add_argument('--param', action='append', default=[], type=lambda text: SweepAxis.parse('param', text),
+                        help="扫描块参数: 块名称.参数名=取值1,取值2（可重复，块名称也可以是块ID）")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数（默认为CPU数，1表示不使用进程池）")
+    parser.add_argument('--chunk-size', type=int, default=16, help="每个任务包含的用例数")
+    parser.add_argument('--max-steps', type=int, default=None, help="每个用例的最大执行步数（默认1000000）")
+    parser.add_argument('--time-limit', type=float, default=None, help="每个用例的最长执行时间，单位秒（默认10）")
+    parser.add_argument('--max-block-visits', type=int, default=None, help="单个块的最大执行次数（默认不限制）")
+    parser.add_argument('--json', dest='json_path', default=None, help="把全部结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    paths = find_program_files(args.paths)
+    if not paths:
+        print("没有找到程序文件")
+        return 1
+    axes = args.var + args.param
+    simulator_options = {}
+    for option in ('max_steps', 'time_limit', 'max_block_visits'):
+        if getattr(args, option) is not None:
+            simulator_options[option] = getattr(args, option)
+
+    start = time.perf_counter()
+    results = run_batch(paths, axes, args.workers, args.chunk_size, simulator_options)
+    elapsed = time.perf_counter() - start
+    summary = summarize(results)
+    print_summary(summary, elapsed)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'results': results, 'elapsed': elapsed}, f, ensure_ascii=False, indent=2)
+    return 0 if summary['passed'] == summary['cases'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
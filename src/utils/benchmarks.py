@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+性能基准测试
+
+在仓库根目录运行，例如:
+    python -m src.utils.benchmarks memory --count 100000
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from ..core.data_models import ProgramBlock, Connection, Variable
+from ..core.program_io import iter_program_file, load_program_file, save_program_file, yaml_backend
+from .code_generator import ExecutionSimulator
+
+
+def _measure_allocation(factory: Callable[[int], object], count: int) -> float:
+    """创建count个对象，返回平均每个对象占用的字节数（包括其引用的子对象）"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [factory(i) for i in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    # 扣除容器列表本身的开销
+    list_overhead = objects.__sizeof__()
+    del objects
+    return (after - before - list_overhead) / count
+
+
+class _LegacyObject:
+    """模拟基于__dict__存储属性的旧版对象布局"""
+
+
+def _legacy_block(i: int) -> _LegacyObject:
+    block = _LegacyObject()
+    block.id = f"{i:032x}"
+    block.name = '前进'
+    block.type = 'motor'
+    block.x = i
+    block.y = i
+    block.params = [{'name': '速度', 'type': 'int', 'default': 50, 'min': 0, 'max': 100, 'value': 0},
+                    {'name': '时间', 'type': 'float', 'default': 1.0, 'min': 0.1, 'max': 10.0, 'value': 0}]
+    block.selected = False
+    block.input_nodes = []
+    block.output_nodes = []
+    return block
+
+
+def _legacy_connection(i: int) -> _LegacyObject:
+    conn = _LegacyObject()
+    conn.from_block = conn.source_block = i
+    conn.from_node = conn.source_node = None
+    conn.to_block = conn.target_block = i + 1
+    conn.to_node = conn.target_node = None
+    conn.source_node_type = None
+    conn.target_node_type = None
+    conn.type = 'execution'
+    return conn
+
+
+def _motor_params() -> List[Dict]:
+    return [{'name': '速度', 'type': 'int', 'default': 50, 'min': 0, 'max': 100},
+            {'name': '时间', 'type': 'float', 'default': 1.0, 'min': 0.1, 'max': 10.0}]
+
+
+def bench_model_memory(count: int = 100000) -> Dict[str, float]:
+    """测量数据模型每个元素的内存占用（字节）
+
+    程序块的统计包括其参数和输入输出节点；旧版布局只统计块本身和参数，
+    用于对比属性存储方式带来的差异。
+    """
+    template = ProgramBlock('前进', 'motor', params=_motor_params())
+    results = {
+        'ProgramBlock': _measure_allocation(
+            lambda i: ProgramBlock('前进', 'motor', x=i, y=i, params=_motor_params(), block_id=f"{i:032x}"),
+            count),
+        'ProgramBlock(克隆)': _measure_allocation(
+            lambda i: ProgramBlock(template.name, template.type, x=i, y=i, params=template.params,
+                                   block_id=f"{i:032x}"),
+            count),
+        'ProgramBlock(无节点旧版布局)': _measure_allocation(_legacy_block, count),
+        'Connection': _measure_allocation(
+            lambda i: Connection(from_block=i, to_block=i + 1), count),
+        'Connection(旧版布局)': _measure_allocation(_legacy_connection, count),
+        'Variable': _measure_allocation(
+            lambda i: Variable(name='count', var_type='int', value=i), count),
+    }
+    return results
+
+
+def bench_param_access(count: int = 100000) -> Dict[str, float]:
+    """测量按名称读取参数值的耗时（微秒/次）"""
+    params = _motor_params() + [{'name': f'参数{i}', 'type': 'int', 'default': i} for i in range(8)]
+    block = ProgramBlock('前进', 'motor', params=params)
+    names = [param['name'] for param in params]
+
+    def linear_scan(name):
+        for param in params:
+            if param['name'] == name:
+                return param.get('value', param.get('default', 0))
+        return 0
+
+    results = {}
+    for label, getter in (('线性查找', linear_scan),
+                          ('get_param', block.get_param),
+                          ('get_number(缓存)', block.get_number)):
+        start = time.perf_counter()
+        for i in range(count):
+            getter(names[i % len(names)])
+        results[label] = (time.perf_counter() - start) / count * 1e6
+    return results
+
+
+def make_program(count: int):
+    """生成一个由count个程序块串联而成的测试程序"""
+    blocks = []
+    connections = []
+    for i in range(count):
+        block = ProgramBlock('前进', 'motor', x=(i % 100) * 220, y=(i // 100) * 150, params=_motor_params())
+        if blocks:
+            previous = blocks[-1]
+            connections.append(Connection(from_block=previous.id, from_node=previous.output_nodes[0],
+                                          to_block=block.id, to_node=block.input_nodes[0]))
+        blocks.append(block)
+    return blocks, connections
+
+
+def bench_program_load(count: int = 10000, ext: str = '.robot', program=None) -> Dict[str, float]:
+    """测量指定格式程序文件的保存、加载耗时（毫秒）和文件大小（KB）
+
+    解析只读取文件得到程序数据，加载还包括构建程序块和连接对象。
+    """
+    blocks, connections = program or make_program(count)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, 'program' + ext)
+        start = time.perf_counter()
+        save_program_file(file_path, blocks, connections)
+        results['保存(毫秒)'] = (time.perf_counter() - start) * 1000
+        results['文件大小(KB)'] = os.path.getsize(file_path) / 1024
+        start = time.perf_counter()
+        for _ in iter_program_file(file_path):
+            pass
+        results['解析(毫秒)'] = (time.perf_counter() - start) * 1000
+        loaded = load_program_file(file_path)
+        results['加载(毫秒)'] = loaded.elapsed * 1000
+        results['往返(毫秒)'] = results['保存(毫秒)'] + results['加载(毫秒)']
+    return results
+
+
+def make_loop_program(iterations: int):
+    """生成循环程序: count = 0; 重复 count += 1 直到 count >= iterations，然后前进"""
+    blocks = [
+        ProgramBlock('变量赋值', 'variable', params=[{'name': '变量名', 'type': 'string', 'value': 'count'},
+                                                  {'name': '值', 'type': 'expression', 'value': '0'}]),
+        ProgramBlock('变量增加', 'variable', params=[{'name': '变量名', 'type': 'string', 'value': 'count'},
+                                                  {'name': '增量', 'type': 'int', 'value': 1}]),
+        ProgramBlock('条件判断', 'logic', params=[{'name': '条件', 'type': 'expression',
+                                                'value': f'count < {iterations}'}]),
+        ProgramBlock('前进', 'motor', params=_motor_params()),
+    ]
+    connections = []
+    # 条件判断的第一个后继为真分支（回到变量增加），第二个为假分支
+    for source, target in ((0, 1), (1, 2), (2, 1), (2, 3)):
+        connections.append(Connection(from_block=blocks[source].id, from_node=blocks[source].output_nodes[0],
+                                      to_block=blocks[target].id, to_node=blocks[target].input_nodes[0]))
+    return blocks, connections
+
+
+def bench_simulation(iterations: int = 100000) -> Dict[str, float]:
+    """测量模拟执行循环程序的耗时，以及表达式逐次eval与编译后求值的对比"""
+    blocks, connections = make_loop_program(iterations)
+    simulator = ExecutionSimulator(max_steps=None, time_limit=None)
+    start = time.perf_counter()
+    simulator.execute(blocks, connections, {})
+    elapsed = time.perf_counter() - start
+    if simulator.error_occurred:
+        raise RuntimeError(simulator.last_error)
+    results = {
+        '模拟总耗时(毫秒)': elapsed * 1000,
+        '每步(微秒)': elapsed / simulator.steps * 1e6,
+    }
+
+    expression = 'count < 100 and count % 3 != 1'
+    variables = {'count': 5}
+    code = compile(expression, '<string>', 'eval')
+    for label, evaluate in (('表达式eval文本(微秒)', lambda: eval(expression, {}, variables)),
+                            ('表达式编译后求值(微秒)', lambda: eval(code, {}, variables))):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            evaluate()
+        results[label] = (time.perf_counter() - start) / iterations * 1e6
+    return results
+
+
+def _print_results(title: str, results: Dict[str, float], unit: str):
+    print(title)
+    for name, value in results.items():
+        print(f"  {name:<32} {value:>12.3f} {unit}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="机器人编程软件性能基准测试")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    memory_parser = subparsers.add_parser('memory', help="数据模型内存占用")
+    memory_parser.add_argument('--count', type=int, default=100000, help="创建的元素数量")
+
+    params_parser = subparsers.add_parser('params', help="参数访问耗时")
+    params_parser.add_argument('--count', type=int, default=100000, help="访问次数")
+
+    load_parser = subparsers.add_parser('load', help="程序文件保存/加载耗时")
+    load_parser.add_argument('--count', type=int, nargs='+', default=[1000, 10000], help="程序块数量（可多个）")
+    load_parser.add_argument('--formats', nargs='+', default=['.robot', '.yaml', '.robotb'], help="文件扩展名")
+
+    simulate_parser = subparsers.add_parser('simulate', help="模拟执行耗时")
+    simulate_parser.add_argument('--iterations', type=int, default=100000, help="循环次数")
+
+    args = parser.parse_args(argv)
+
+    if args.benchmark == 'memory':
+        results = bench_model_memory(args.count)
+        _print_results(f"每个元素的内存占用 ({args.count} 个元素):", results, "字节")
+    elif args.benchmark == 'params':
+        results = bench_param_access(args.count)
+        _print_results(f"按名称读取参数 ({args.count} 次):", results, "微秒/次")
+    elif args.benchmark == 'load':
+        formats = list(args.formats)
+        if any(ext in ('.yaml', '.yml') for ext in formats):
+            backend = yaml_backend()
+            if backend is None:
+                print("未安装PyYAML，跳过YAML格式")
+                formats = [ext for ext in formats if ext not in ('.yaml', '.yml')]
+            else:
+                print(f"YAML实现: {backend}")
+        for count in args.count:
+            program = make_program(count)
+            for ext in formats:
+                results = bench_program_load(count, ext, program)
+                _print_results(f"{ext} 文件读写 ({count} 个程序块):", results, "")
+    elif args.benchmark == 'simulate':
+        results = bench_simulation(args.iterations)
+        _print_results(f"模拟执行循环程序 ({args.iterations} 次循环):", results, "")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,133 @@
 代码生成器
 """
  
-from typing import List, Dict, Any, Optional
-from ..core.data_models import ProgramBlock, Connection, Variable
+import sys
+import time
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from ..core.data_models import ProgramBlock, Connection, Variable, resolve_block_index
+from ..core.expressions import ExpressionError, compile_expression
+from .simulation_clock import (DEFAULT_MOTOR_TIME, SENSOR_READ_TIME, TURN_TIME_PER_DEGREE,
+                               MotorCommand, SimulatedClock)
+from . import simulation_trace as trace_events
+from .simulation_trace import DEFAULT_TRACE_LIMIT, SimulationTrace
+
+
+# 可以让执行流离开循环的块（条件分支和循环块）
+_BRANCH_BLOCKS = {('logic', '条件判断'), ('logic', '循环'), ('logic', '当条件满足时循环')}
+
+LOOP_BLOCK_NAMES = ('循环', '当条件满足时循环', '无限循环')
+
+# 循环块的节点名：循环体、完成输出和结束输入
+LOOP_BODY_PORT = '循环体'
+LOOP_DONE_PORT = '完成'
+LOOP_END_PORT = '结束'
+
+# 只保存了节点ID的连接按ID后缀（见ProgramBlock._init_nodes）得到节点名
+_PORT_SUFFIXES = {'_start': '开始', '_end': LOOP_END_PORT, '_loop': LOOP_BODY_PORT, '_done': LOOP_DONE_PORT,
+                  '_true': '真', '_false': '假', '_cond': '条件', '_input': '输入', '_output': '输出'}
+
+
+def port_name(node: Any) -> Optional[str]:
+    """连接端点的节点名，节点可以是Node对象或节点ID，无法识别时返回None"""
+    name = getattr(node, 'name', None)
+    if name is not None:
+        return name
+    if isinstance(node, str):
+        for suffix, port in _PORT_SUFFIXES.items():
+            if node.endswith(suffix):
+                return port
+    return None
+
+
+def split_loop_successors(successors: tuple, ports: tuple) -> Tuple[tuple, tuple]:
+    """把循环块的后继分为(循环体, 循环结束后执行的块)
+
+    按连接的输出节点（循环体/完成）区分；没有节点信息的旧连接按顺序处理，第一个后继为循环体。
+    """
+    if not any(port in (LOOP_BODY_PORT, LOOP_DONE_PORT) for port in ports):
+        return successors[:1], successors[1:]
+    body = tuple(successor for successor, port in zip(successors, ports) if port == LOOP_BODY_PORT)
+    after = tuple(successor for successor, port in zip(successors, ports) if port != LOOP_BODY_PORT)
+    return body, after
+
+
+def strongly_connected_components(graph: Dict[int, List[int]]) -> List[List[int]]:
+    """用非递归的Tarjan算法求有向图的强连通分量"""
+    index: Dict[int, int] = {}
+    low: Dict[int, int] = {}
+    on_stack = set()
+    stack: List[int] = []
+    components = []
+    counter = 0
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.get(root, ())))]
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    break
+                if successor in on_stack and index[successor] < low[node]:
+                    low[node] = index[successor]
+            else:
+                # node的后继已全部处理
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+def _expression_evaluator(expression: Any) -> Callable[[Dict[str, Any]], Any]:
+    """返回求值函数 evaluate(variables)，表达式经安全编译并按文本缓存，无效时求值抛出ExpressionError"""
+    try:
+        return compile_expression(expression).evaluate
+    except ExpressionError as e:
+        message = e.message
+        
+        def raise_error(variables):
+            raise ExpressionError(message)
+        return raise_error
+
+
+def _normalize_simulated_param(value):
+    """模拟器读取参数值时的规范化：特殊字面量转换、字符串清理"""
+    # 特殊值处理
+    if value == 'None':
+        return None
+    elif value == 'True':
+        return True
+    elif value == 'False':
+        return False
+    
+    # 字符串清理和安全处理
+    if isinstance(value, str):
+        # 移除首尾空白
+        value = value.strip()
+        # 转义危险字符
+        if '\n' in value or '\t' in value:
+            value = value.replace('\n', '\\n').replace('\t', '\\t')
+    return value
 
 
 class PythonCodeGenerator:
@@ -285,15 +410,19 @@ class PythonCodeGenerator:
             for i in range(len(blocks)):
                 graph[i] = []
             
+            # 连接以块ID引用程序块（旧版为列表索引），统一换算为块索引
+            id_to_index = {getattr(block, 'id', None): i for i, block in enumerate(blocks)}
+            
             # 根据连接构建执行流程，增加类型安全检查
             for conn in connections:
                 try:
                     # 安全地访问连接属性
                     if hasattr(conn, 'from_block') and hasattr(conn, 'to_block'):
-                        # 确保索引在有效范围内
-                        if (isinstance(conn.from_block, int) and conn.from_block >= 0 and conn.from_block < len(blocks) and
-                            isinstance(conn.to_block, int) and conn.to_block >= 0 and conn.to_block < len(blocks)):
-                            graph[conn.from_block].append(conn.to_block)
+                        # 确保引用的块存在
+                        from_index = resolve_block_index(conn.from_block, id_to_index, len(blocks))
+                        to_index = resolve_block_index(conn.to_block, id_to_index, len(blocks))
+                        if from_index is not None and to_index is not None:
+                            graph[from_index].append(to_index)
                 except Exception as e:
                     print(f"处理连接时出错: {str(e)}")
             
@@ -354,47 +483,29 @@ class PythonCodeGenerator:
                 self.last_error = f"无效的参数类型: block={type(block)}, node_name={type(node_name)}"
                 return f"var_invalid_{node_name}"
             
-            # 检查块参数中是否有默认值
-            if hasattr(block, 'params') and isinstance(block.params, list):
-                for param in block.params:
-                    try:
-                        # 安全地访问参数属性
-                        if isinstance(param, dict):
-                            if param.get('name') == node_name:
-                                param_value = param.get('value')
-                                # 根据参数值的类型返回合适的表达式
-                                if param_value is None:
-                                    return "None"
-                                elif isinstance(param_value, (int, float)):
-                                    return str(param_value)
-                                elif isinstance(param_value, bool):
-                                    return 'True' if param_value else 'False'
-                                elif isinstance(param_value, str):
-                                    # 如果是字符串，检查是否是变量名或字面量
-                                    if param_value in ['True', 'False', 'None'] or param_value.isdigit() or (param_value.startswith('"') and param_value.endswith('"')):
-                                        return param_value
-                                    # 否则作为字符串字面量处理
-                                    # 转义特殊字符以避免语法错误
-                                    escaped_value = param_value.replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
-                                    return f'"{escaped_value}"'
-                                return repr(param_value)
-                        elif hasattr(param, 'get') and param.get('name') == node_name:
-                            param_value = param.get('value')
-                            if param_value is None:
-                                return "None"
-                            elif isinstance(param_value, (int, float)):
-                                return str(param_value)
-                            elif isinstance(param_value, bool):
-                                return 'True' if param_value else 'False'
-                            elif isinstance(param_value, str):
-                                if param_value in ['True', 'False', 'None'] or param_value.isdigit() or (param_value.startswith('"') and param_value.endswith('"')):
-                                    return param_value
-                                escaped_value = param_value.replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
-                                return f'"{escaped_value}"'
-                            return repr(param_value)
-                    except Exception as e:
-                        print(f"处理参数时出错: {str(e)}")
-                        continue
+            # 检查块参数中是否有默认值（按参数名索引查找）
+            param = block.find_param(node_name)
+            if param is not None:
+                try:
+                    param_value = param.get('value')
+                    # 根据参数值的类型返回合适的表达式
+                    if param_value is None:
+                        return "None"
+                    elif isinstance(param_value, (int, float)):
+                        return str(param_value)
+                    elif isinstance(param_value, bool):
+                        return 'True' if param_value else 'False'
+                    elif isinstance(param_value, str):
+                        # 如果是字符串，检查是否是变量名或字面量
+                        if param_value in ['True', 'False', 'None'] or param_value.isdigit() or (param_value.startswith('"') and param_value.endswith('"')):
+                            return param_value
+                        # 否则作为字符串字面量处理
+                        # 转义特殊字符以避免语法错误
+                        escaped_value = param_value.replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+                        return f'"{escaped_value}"'
+                    return repr(param_value)
+                except Exception as e:
+                    print(f"处理参数时出错: {str(e)}")
             
             # 生成安全的变量名
             safe_node_name = node_name.replace(' ', '_').replace('-', '_').lower()
@@ -589,12 +700,9 @@ class PythonCodeGenerator:
                     # 获取条件参数
                     condition = self._get_param_value(block, '条件', default='True')
                     
-                    # 确保条件是有效的字符串
-                    if not isinstance(condition, str):
-                        condition = str(condition)
-                    
                     # 生成条件判断代码
                     code.append(f"{self.indent_str}# 条件判断")
+                    condition = self._expression_source(condition, 'False', code)
                     code.append(f"{self.indent_str}try:")
                     code.append(f"{self.indent_str}{self.indent_str}# 安全评估条件")
                     code.append(f"{self.indent_str}{self.indent_str}condition_result = {condition}")
@@ -632,10 +740,9 @@ class PythonCodeGenerator:
                     if loop_type == 'while':
                         # while循环，添加循环保护
                         condition = self._get_param_value(block, '条件', default='True')
-                        if not isinstance(condition, str):
-                            condition = str(condition)
                         
                         code.append(f"{self.indent_str}# while循环")
+                        condition = self._expression_source(condition, 'False', code)
                         code.append(f"{self.indent_str}loop_counter = 0")
                         code.append(f"{self.indent_str}MAX_LOOPS = 1000  # 防止无限循环")
                         code.append(f"{self.indent_str}while {condition} and loop_counter < MAX_LOOPS:")
@@ -695,6 +802,7 @@ class PythonCodeGenerator:
                     # 验证变量名有效性
                     if isinstance(var_name, str) and var_name.isidentifier():
                         code.append(f"{self.indent_str}# 变量赋值")
+                        value = self._expression_source(value, 'None', code)
                         code.append(f"{self.indent_str}try:")
                         code.append(f"{self.indent_str}{self.indent_str}{var_name} = {value}")
                         code.append(f"{self.indent_str}{self.indent_str}print(f'赋值: {{var_name}} = {{{var_name}}}')")  # 使用实际值而不是表达式
@@ -706,6 +814,7 @@ class PythonCodeGenerator:
                         if not safe_var_name or not safe_var_name[0].isalpha():
                             safe_var_name = 'var_' + safe_var_name
                         code.append(f"{self.indent_str}# 警告: 无效的变量名 '{var_name}'，已转换为 '{safe_var_name}'")
+                        value = self._expression_source(value, 'None', code)
                         code.append(f"{self.indent_str}{safe_var_name} = {value}")
                 
                 elif block_name == '变量增加':
@@ -716,6 +825,7 @@ class PythonCodeGenerator:
                     # 验证变量名有效性
                     if isinstance(var_name, str) and var_name.isidentifier():
                         code.append(f"{self.indent_str}# 变量增加")
+                        increment = self._expression_source(increment, '0', code)
                         code.append(f"{self.indent_str}try:")
                         # 检查变量是否存在，不存在则初始化为0
                         code.append(f"{self.indent_str}{self.indent_str}try:")
@@ -743,51 +853,51 @@ class PythonCodeGenerator:
             self.last_error = f"处理变量操作块时出错: {str(e)}"
             return [f"{self.indent_str}# 错误: 变量操作块处理失败"]
     
+    def _expression_source(self, expression: Any, fallback: str, code: List[str]) -> str:
+        """返回可以写入生成代码的表达式源码（经白名单验证和常量折叠）
+
+        表达式无效时在code中添加警告注释，并返回fallback。
+        """
+        try:
+            return compile_expression(expression).source
+        except ExpressionError as e:
+            code.append(f"{self.indent_str}# 警告: 表达式 {str(expression)!r} 无效（{e.message}），已替换为 {fallback}")
+            return fallback
+    
     def _get_param_value(self, block: ProgramBlock, param_name: str, default: Any = None) -> Any:
         """获取参数值，处理类型转换，增强版"""
         try:
-            if not hasattr(block, 'params') or block.params is None:
+            if not isinstance(block, ProgramBlock) or not block.has_param(param_name):
                 return default
             
-            # 处理列表类型的params
-            for param in block.params:
-                if param.get('name') == param_name:
-                    param_value = param.get('value', param.get('default', default))
-                    
-                    # 尝试类型转换
-                    try:
-                        # 根据参数名推断类型（如果没有默认值）
-                        if default is None:
-                            # 常见数字参数名处理
-                            if param_name in ['次数', '时间', '速度', '距离', '角度', '延时']:
-                                return float(param_value) if isinstance(param_value, (int, float)) or (isinstance(param_value, str) and '.' in param_value) else int(param_value)
-                            # 常见布尔参数名处理
-                            elif param_name in ['条件', '启用', '禁用', '循环']:
-                                if isinstance(param_value, bool):
-                                    return param_value
-                                return str(param_value).lower() in ('true', 'yes', '1', 'y', 't')
-                            # 默认为字符串
-                            elif not isinstance(param_value, (int, float, bool)):
-                                return str(param_value)
-                        
-                        # 如果提供了默认值，按照默认值类型转换
-                        if isinstance(default, (int, float)):
-                            if isinstance(param_value, (int, float)):
-                                return param_value
-                            return float(param_value) if isinstance(param_value, str) and '.' in param_value else int(param_value)
-                        # 如果默认值是布尔值
-                        elif isinstance(default, bool):
-                            if isinstance(param_value, bool):
-                                return param_value
-                            return str(param_value).lower() in ('true', 'yes', '1', 'y', 't')
-                        # 如果默认值是字符串
-                        elif isinstance(default, str):
-                            return str(param_value)
-                    except (ValueError, TypeError) as e:
-                        print(f"参数类型转换错误 (param={param_name}, value={param_value}): {str(e)}")
-                    
-                    return param_value
-            return default
+            param_value = block.get_param(param_name)
+            
+            # 尝试类型转换（转换结果由程序块缓存）
+            try:
+                # 根据参数名推断类型（如果没有默认值）
+                if default is None:
+                    # 常见数字参数名处理
+                    if param_name in ['次数', '时间', '速度', '距离', '角度', '延时']:
+                        if isinstance(param_value, (int, float)):
+                            return block.get_float(param_name)
+                        return block.get_number(param_name)
+                    # 常见布尔参数名处理
+                    elif param_name in ['条件', '启用', '禁用', '循环']:
+                        return block.get_bool(param_name)
+                    # 默认为字符串
+                    elif not isinstance(param_value, (int, float, bool)):
+                        return block.get_str(param_name)
+                
+                # 如果提供了默认值，按照默认值类型转换
+                if isinstance(default, (int, float)):
+                    return block.get_number(param_name)
+                # 如果默认值是字符串
+                elif isinstance(default, str):
+                    return block.get_str(param_name)
+            except (ValueError, TypeError) as e:
+                print(f"参数类型转换错误 (param={param_name}, value={param_value}): {str(e)}")
+            
+            return param_value
             
         except Exception as e:
             print(f"获取参数值时发生错误 (param={param_name}): {str(e)}")
@@ -799,15 +909,21 @@ class ExecutionSimulator:
     
     主要功能:
     - 模拟执行机器人程序块
-    - 支持电机控制、传感器读取、逻辑判断和变量操作
-    - 内置递归保护和执行栈限制
+    - 支持电机控制、传感器读取、逻辑判断、循环和变量操作
+    - 以显式工作栈执行，不使用Python递归，可模拟数百万步
     - 提供详细的执行输出和错误报告
     - 支持循环引用检测和异常捕获
     
     错误处理说明:
     - 严重错误: 会中断执行并设置error_occurred标志
     - 警告信息: 记录到output中，但不会中断执行
-    - 递归保护: 检测到可能的无限循环时会自动中断
+    - 执行预算: 执行步数超过max_steps或耗时超过time_limit秒时中止，失控的程序不会卡住
+    - 模拟时间: 电机和传感器块推进模拟时钟（self.clock）而不等待，电机命令记录在self.timeline中
+    - 执行轨迹: self.output为容量固定的SimulationTrace，记录结构化事件，显示时才格式化为文本
+    - 暂停与检查点: execute(pause_at=N)执行N步后暂停，resume()继续；设置checkpoint_hook后
+      每隔checkpoint_interval步调用一次，供录制回放（simulation_replay）保存状态
+    - 性能分析: profile=True时记录每个块的执行次数、模拟时间和实际耗时（self.profile_data）
+    - 循环保护: 设置了max_block_visits时，单个块的执行次数超过该值视为无限循环并中断
     - 内存保护: 防止执行过程中发生内存溢出
     
     使用示例:
@@ -835,32 +951,79 @@ class ExecutionSimulator:
     安全特性:
     - 参数验证: 所有输入参数都会经过类型和有效性检查
     - 异常隔离: 单个块的异常不会导致整个执行崩溃
-    - 栈深度限制: 防止递归调用过深导致栈溢出
-    - 循环检测: 识别并阻止潜在的无限循环
+    - 循环检测: 构建执行图时用Tarjan算法找出循环，报告没有出口的无条件循环
+    
+    循环块从"循环体"输出的后继为循环体，从"完成"输出的后继在循环结束后执行：循环体执行完后
+    回到循环块（工作栈中压入的~块索引标记）重新判断是否继续。连到循环块"结束"输入的回边
+    表示本轮循环体结束，进入下一轮判断，而不是重新进入循环。
     """
     
-    def __init__(self):
-        """初始化执行模拟器，设置执行状态和数据结构"""
+    def __init__(self, max_steps: Optional[int] = 1000000, time_limit: Optional[float] = 10.0,
+                 max_block_visits: Optional[int] = None,
+                 sensor_model: Optional[Callable[[str, Any, float], Any]] = None,
+                 trace_limit: Optional[int] = DEFAULT_TRACE_LIMIT, trace_path: Optional[str] = None,
+                 profile: bool = False):
+        """初始化执行模拟器，设置执行状态和数据结构
+
+        sensor_model(块名称, 传感器ID, 模拟时间)返回传感器读数，未指定时读数为0。
+        执行轨迹只保留最近trace_limit个事件（None表示不限制），指定trace_path时完整轨迹写入该文件。
+        profile为True时记录性能数据，执行后保存在profile_data中。
+        """
         try:
             self.variables = {}         # 变量存储字典
-            self.output = []            # 执行输出日志
+            self.output = SimulationTrace(trace_limit)  # 执行轨迹
             self.error_occurred = False # 错误状态标志
             self.last_error = None      # 最后一次错误信息
-            self.execution_stack = []   # 执行栈，用于递归保护
+            self.execution_stack = []   # 待执行的块索引（工作栈）
+            self.visit_counts = []      # 每个块已执行的次数（按块索引）
+            self.steps = 0              # 已执行的步数
+            self.cycles = []            # 执行图中的循环（强连通分量的块索引列表）
+            self.stop_reason = None     # 'completed'、'error'、'step_budget'或'time_budget'
+            self.clock = SimulatedClock()  # 模拟时钟（秒）
+            self.timeline = []          # 电机命令时间线（MotorCommand列表）
+            self.branch_counts = {}     # 条件块索引 -> [条件成立次数, 不成立次数]
+            self.execution_ports = {}   # 块索引 -> 与执行图后继对应的(输出节点名, 输入节点名)列表
+            self.sensor_model = sensor_model
+            self.trace_limit = trace_limit
+            self.trace_path = trace_path
+            self.loop_counters = {}     # 计数循环块索引 -> 剩余次数
+            self.checkpoint_interval = 0   # 每隔多少步调用一次checkpoint_hook(模拟器)，0表示不调用
+            self.checkpoint_hook = None
+            self.profile = profile
+            self.profile_data = None    # SimulationProfile，profile为True时执行后可用
+            self._pause_at = None
+            self.max_steps = max_steps
+            self.time_limit = time_limit
+            self.max_block_visits = max_block_visits
         except Exception as e:
             self.error_occurred = True
             self.last_error = f"初始化模拟器失败: {str(e)}"
             print(f"模拟器错误: {self.last_error}")
     
-    def execute(self, blocks: List[ProgramBlock], connections: List[Connection], initial_variables: Dict[str, Variable]):
-        """执行程序，增强参数验证和异常处理"""
+    def execute(self, blocks: List[ProgramBlock], connections: List[Connection], initial_variables: Dict[str, Variable],
+                pause_at: Optional[int] = None):
+        """执行程序，增强参数验证和异常处理
+
+        指定pause_at时执行到第pause_at步前暂停（stop_reason为'paused'），之后可以用resume()继续。
+        """
         try:
             # 重置状态
             self.error_occurred = False
             self.last_error = None
-            self.output = []
+            self.output.close()
+            self.output = SimulationTrace(self.trace_limit, self.trace_path)
             self.execution_stack = []
+            self.visit_counts = []
+            self.steps = 0
+            self.cycles = []
+            self.stop_reason = None
+            self.clock = SimulatedClock()
+            self.timeline = []
+            self.branch_counts = {}
+            self.loop_counters = {}
+            self.profile_data = None
             self.variables = {}
+            self._pause_at = pause_at
             
             # 参数验证增强
             # 验证blocks参数
@@ -870,6 +1033,7 @@ class ExecutionSimulator:
                 raise TypeError("blocks参数必须是列表或元组类型")
             elif not blocks:
                 self.output.append("警告: 没有可执行的块")
+                self.output.close()
                 return self.output
             
             # 验证connections参数
@@ -920,101 +1084,258 @@ class ExecutionSimulator:
                     execution_graph = {}
             except Exception as e:
                 self.output.append(f"错误: 构建执行流程图失败: {str(e)}")
+                self.output.close()
                 return self.output
             
-            # 开始执行，添加递归和内存保护
+            # 开始执行，添加内存保护
             try:
                 # 验证第一个块是否有效
                 if not hasattr(blocks[0], 'type'):
                     self._handle_error("第一个块缺少type属性，无法执行")
+                    self.output.close()
                     return self.output
                 
-                self._execute_block(0, blocks, execution_graph)
-                
-                # 记录执行完成信息
-                if not self.error_occurred:
-                    self.output.append("模拟执行完成")
-                else:
-                    self.output.append(f"模拟执行中断: {self.last_error}")
-            except RecursionError:
-                self._handle_error("执行过程中发生递归错误，可能存在无限循环")
+                self._run_blocks(0, blocks, execution_graph)
             except MemoryError:
                 self._handle_error("执行过程中发生内存错误")
-            except StackOverflowError:
-                self._handle_error("执行过程中发生堆栈溢出错误")
             except Exception as e:
                 self._handle_error(f"执行主流程时出错: {str(e)}")
             
             # 返回最终执行输出
+            self._finish_run()
             return self.output
         except Exception as e:
             error_msg = f"执行程序时发生未预期错误: {str(e)}"
             self.error_occurred = True
             self.last_error = error_msg
             self.output.append(error_msg)
+            self.output.close()
             return self.output
     
-    def _execute_block(self, block_index: int, blocks: List[ProgramBlock], execution_graph: Dict[int, List[int]]):
-        """执行单个块，添加递归保护和异常处理"""
+    def _run_blocks(self, start_index: int, blocks: List[ProgramBlock], execution_graph: Dict[int, List[int]]):
+        """从start_index开始执行程序块
+
+        程序先编译为闭包列表（见_compile_program），再使用显式工作栈按深度优先顺序执行
+        （后继块逆序入栈，执行顺序与逐个递归执行后继相同），每个块的执行次数记录在按块索引的计数数组中。
+        负数项~i表示循环块i的循环体已执行完，需要重新判断是否继续循环。
+        步数或耗时超出预算时中止执行。
+        """
+        self.visit_counts = [0] * len(blocks)
+        self.execution_stack = [start_index]
+        self._loop_checks = {}
+        self._program = self._compile_program(blocks, execution_graph)
+        if self.profile:
+            # 性能分析模块引用模拟器，在此导入避免循环导入
+            from .simulation_profiler import SimulationProfile
+            self.profile_data = SimulationProfile(blocks)
+            self._instrument_program()
+        self._run_loop()
+    
+    def resume(self, pause_at: Optional[int] = None):
+        """继续执行暂停的模拟，pause_at为下一次暂停的步数，返回执行轨迹"""
+        if self.stop_reason != 'paused':
+            return self.output
+        self.stop_reason = None
+        self._pause_at = pause_at
         try:
-            # 检查是否发生错误
-            if self.error_occurred:
-                return
+            self._run_loop()
+        except MemoryError:
+            self._handle_error("执行过程中发生内存错误")
+        self._finish_run()
+        return self.output
+    
+    def _finish_run(self):
+        """记录执行结束信息并关闭轨迹，暂停时不记录"""
+        if self.stop_reason == 'paused':
+            return
+        if not self.error_occurred:
+            self.output.append("模拟执行完成")
+        else:
+            self.output.append(f"模拟执行中断: {self.last_error}")
+        self.output.close()
+    
+    def _run_loop(self):
+        """执行工作栈中的块，直到栈空、出错、超出预算或到达暂停步数
+        
+        步数上限、暂停步数和检查点步数合并为一个界限，每步只比较一次。
+        """
+        program = self._program
+        loop_checks = self._loop_checks
+        block_count = len(program)
+        visit_counts = self.visit_counts
+        stack = self.execution_stack
+        max_visits = self.max_block_visits or sys.maxsize
+        max_steps = self.max_steps or sys.maxsize
+        deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+        steps = self.steps
+        limit = self._next_step_limit(steps)
+        
+        try:
+            while stack and not self.error_occurred:
+                if steps >= limit:
+                    if steps >= max_steps:
+                        self.stop_reason = 'step_budget'
+                        self._handle_error(f"超出步数预算: 已执行 {steps} 步，程序可能存在无限循环")
+                        return
+                    if self._pause_at is not None and steps >= self._pause_at:
+                        self.stop_reason = 'paused'
+                        return
+                    # 到达检查点
+                    self.steps = steps
+                    self.checkpoint_hook(self)
+                    limit = self._next_step_limit(steps)
+                # 检查时间预算（每1024步检查一次）
+                if deadline is not None and not steps & 1023 and time.perf_counter() > deadline:
+                    self.stop_reason = 'time_budget'
+                    self._handle_error(f"超出时间预算: 执行超过 {self.time_limit} 秒，已执行 {steps} 步")
+                    return
+                steps += 1
                 
-            # 检查索引有效性
-            if block_index >= len(blocks) or block_index < 0:
-                self._handle_error(f"无效的块索引: {block_index}")
-                return
-            
-            # 防止无限递归
-            if block_index in self.execution_stack:
-                recursion_depth = self.execution_stack.count(block_index)
-                if recursion_depth > 100:
-                    self._handle_error(f"检测到可能的无限递归: 块 {block_index} 已执行 {recursion_depth} 次")
+                block_index = stack.pop()
+                if block_index < 0:
+                    # 循环体执行完毕，回到循环块
+                    stack.extend(loop_checks[~block_index]())
+                    continue
+                
+                # 检查索引有效性
+                if block_index >= block_count:
+                    self._handle_error(f"无效的块索引: {block_index}")
                     return
-            
-            # 添加到执行栈
-            self.execution_stack.append(block_index)
-            
-            # 限制栈深度
-            if len(self.execution_stack) > 1000:
-                self._handle_error(f"执行栈溢出: 最大深度 {len(self.execution_stack)}")
-                return
-            
-            block = blocks[block_index]
-            
-            # 执行块
-            result = self._execute_block_logic(block)
-            
-            # 根据块类型和结果决定下一步执行
-            if hasattr(block, 'type') and hasattr(block, 'name'):
-                if block.type == 'logic' and block.name == '条件判断':
-                    # 条件判断块的特殊处理
-                    condition_result = result.get('condition', True)
-                    next_blocks = execution_graph.get(block_index, []) if isinstance(execution_graph, dict) else []
-                    
-                    if next_blocks:
-                        # 简单处理：如果有连接，选择第一个作为真分支，第二个作为假分支
-                        try:
-                            if condition_result and len(next_blocks) >= 1:
-                                self._execute_block(next_blocks[0], blocks, execution_graph)
-                            elif not condition_result and len(next_blocks) >= 2:
-                                self._execute_block(next_blocks[1], blocks, execution_graph)
-                        except Exception as e:
-                            self._handle_error(f"执行条件分支时出错: {str(e)}")
-                else:
-                    # 普通块的处理
-                    next_blocks = execution_graph.get(block_index, []) if isinstance(execution_graph, dict) else []
-                    for next_block in next_blocks:
-                        if self.error_occurred:  # 检查是否仍可执行
-                            break
-                        self._execute_block(next_block, blocks, execution_graph)
+                
+                # 防止无限循环
+                visits = visit_counts[block_index]
+                if visits >= max_visits:
+                    self._handle_error(f"检测到可能的无限循环: 块 {block_index} 已执行 {visits} 次")
+                    return
+                visit_counts[block_index] = visits + 1
+                
+                stack.extend(program[block_index]())
         except Exception as e:
-            self._handle_error(f"执行块 {block_index} 时出错: {str(e)}")
+            self._handle_error(f"执行块逻辑时出错: {str(e)}")
         finally:
-            # 从执行栈中移除
-            if self.execution_stack and self.execution_stack[-1] == block_index:
-                self.execution_stack.pop()
+            self.steps = steps
+            if self.stop_reason is None:
+                self.stop_reason = 'error' if self.error_occurred else 'completed'
+    
+    def _instrument_program(self):
+        """性能分析：给每个块闭包（包括循环块的重新判断）加上计时
+        
+        执行时工作栈中仍在的循环标记即为外层循环，作为折叠栈的上层帧。
+        """
+        profile = self.profile_data
+        stack = self.execution_stack
+        clock = self.clock
+        perf_counter = time.perf_counter
+        
+        def instrument(run, index):
+            def profiled():
+                enclosing = tuple([~item for item in stack if item < 0])
+                sim_start = clock.now
+                start = perf_counter()
+                result = run()
+                profile.add(index, enclosing, perf_counter() - start, clock.now - sim_start)
+                return result
+            return profiled
+        
+        self._program = [instrument(run, index) for index, run in enumerate(self._program)]
+        for index, check in list(self._loop_checks.items()):
+            self._loop_checks[index] = instrument(check, index)
+    
+    def _next_step_limit(self, steps: int) -> int:
+        """下一个需要处理的步数：步数预算、暂停步数和下一个检查点中最小的一个"""
+        limit = self.max_steps or sys.maxsize
+        if self._pause_at is not None:
+            limit = min(limit, self._pause_at)
+        if self.checkpoint_hook is not None and self.checkpoint_interval:
+            limit = min(limit, (steps // self.checkpoint_interval + 1) * self.checkpoint_interval)
+        return limit
+    
+    def _motor_timing(self, block: ProgramBlock) -> Tuple[float, Any, Any]:
+        """电机块的(模拟耗时, 速度, 角度)：前进/后退按时间参数，转向按角度估算，停止不耗时"""
+        name = block.name
+        if name == '停止':
+            return 0.0, 0, None
+        speed = self._get_param_value(block, '速度', default=50)
+        if name in ('左转', '右转'):
+            angle = self._get_param_value(block, '角度', default=90)
+            if isinstance(angle, (int, float)) and not isinstance(angle, bool):
+                return abs(angle) * TURN_TIME_PER_DEGREE, speed, angle
+            self.output.append(f"警告: {name}的角度无效: {angle}，按90度计时")
+            return 90 * TURN_TIME_PER_DEGREE, speed, angle
+        duration = self._get_param_value(block, '时间', default=DEFAULT_MOTOR_TIME)
+        if isinstance(duration, (int, float)) and not isinstance(duration, bool) and duration >= 0:
+            return float(duration), speed, None
+        self.output.append(f"警告: {name}的时间无效: {duration}，按{DEFAULT_MOTOR_TIME}秒计时")
+        return DEFAULT_MOTOR_TIME, speed, None
+    
+    def _compile_loop(self, block: ProgramBlock, successors: tuple, index: int, ports: tuple = ()) -> Callable[[], tuple]:
+        """编译循环块：按输出节点分出循环体和循环结束后执行的块（见split_loop_successors）"""
+        output = self.output
+        record = output.record
+        variables = self.variables
+        marker = ~index
+        body, after = split_loop_successors(successors, ports)
+        body = tuple(reversed(body))
+        after = tuple(reversed(after))
+        # 每轮先压入回到循环块的标记，再压入循环体，循环体执行完后回到循环块
+        iterate = (marker,) + body
+        
+        if block.name == '循环':
+            times = self._get_param_value(block, '次数', default=1)
+            try:
+                count = max(0, int(times))
+            except (TypeError, ValueError):
+                output.append(f"警告: 循环次数无效: {times}，将执行1次")
+                count = 1
+            counters = self.loop_counters
+            counters[index] = 0
+            
+            def check_count():
+                if counters[index] > 0:
+                    counters[index] -= 1
+                    return iterate
+                return after
+            
+            def run_count():
+                record(trace_events.LOOP, index, times)
+                counters[index] = count if body else 0
+                return check_count()
+            self._loop_checks[index] = check_count
+            return run_count
+        
+        if block.name == '当条件满足时循环':
+            condition = self._get_param_value(block, '条件', default='True')
+            evaluate = _expression_evaluator(condition)
+            counts = self.branch_counts[index] = [0, 0]
+            
+            def check_condition():
+                try:
+                    condition_result = evaluate(variables)
+                except Exception as e:
+                    record(trace_events.CONDITION_ERROR, index, condition, str(e))
+                    counts[1] += 1
+                    return after
+                record(trace_events.LOOP_CONDITION, index, condition, condition_result)
+                if condition_result and body:
+                    counts[0] += 1
+                    return iterate
+                counts[1] += 1
+                return after
+            self._loop_checks[index] = check_condition
+            return check_condition
+        
+        # 无限循环，只能由执行预算中止
+        def check_forever():
+            return iterate
+        
+        def run_forever():
+            if not body:
+                output.append("警告: 无限循环没有循环体，已跳过")
+                return after
+            record(trace_events.LOOP_FOREVER, index)
+            return iterate
+        self._loop_checks[index] = check_forever
+        return run_forever
     
     def _handle_error(self, error_message):
         """统一错误处理"""
@@ -1023,76 +1344,166 @@ class ExecutionSimulator:
         self.output.append(f"错误: {error_message}")
         print(f"模拟器错误: {error_message}")
     
-    def _execute_block_logic(self, block: ProgramBlock) -> Dict[str, Any]:
-        """执行块的逻辑，添加完整的异常处理"""
-        result = {}
+    def _compile_program(self, blocks: List[ProgramBlock], execution_graph: Dict[int, List[int]]) -> List[Callable[[], tuple]]:
+        """把程序编译为按块索引排列的闭包列表
+
+        每个闭包执行块的逻辑，并返回接下来要压入工作栈的后继块（已按入栈顺序排列）。
+        块类型、参数和表达式在编译时解析一次，执行时不再按名称分派或重新解析表达式。
+        """
+        program = []
+        for i, block in enumerate(blocks):
+            successors, ports = self._block_successors(blocks, execution_graph, i)
+            program.append(self._compile_block(block, successors, i, ports))
+        return program
+    
+    def _block_successors(self, blocks: List[ProgramBlock], execution_graph: Dict[int, List[int]],
+                          index: int) -> Tuple[tuple, tuple]:
+        """块的(后继块, 各后继的输出节点名)
+
+        连到循环块"结束"输入的回边不作为后继：循环体开始前已压入回到循环块的标记，
+        这条路径执行完后自然进入下一轮判断。
+        """
+        ports = self.execution_ports.get(index, ())
+        successors = []
+        from_ports = []
+        for position, target in enumerate(execution_graph.get(index) or ()):
+            from_port, to_port = ports[position] if position < len(ports) else (None, None)
+            if to_port == LOOP_END_PORT and getattr(blocks[target], 'name', None) in LOOP_BLOCK_NAMES:
+                continue
+            successors.append(target)
+            from_ports.append(from_port)
+        return tuple(successors), tuple(from_ports)
+    
+    def _compile_block(self, block: ProgramBlock, successors: tuple, index: int, ports: tuple = ()) -> Callable[[], tuple]:
+        """把单个块编译为闭包，循环块另外在self._loop_checks中登记重新判断的闭包"""
+        output = self.output
+        record = output.record
+        variables = self.variables
         
-        try:
-            # 检查块属性
-            if not hasattr(block, 'type'):
-                self.output.append(f"警告: 块缺少type属性")
-                return result
-                
-            block_type = block.type
+        # 检查块属性
+        if not hasattr(block, 'type'):
+            def run_invalid():
+                output.append(f"警告: 块缺少type属性")
+                return ()
+            return run_invalid
+        
+        block_type = block.type
+        block_name = getattr(block, 'name', None)
+        # 普通块：后继逆序入栈，保证第一个后继最先执行
+        next_blocks = tuple(reversed(successors)) if block_name is not None else ()
+        
+        if block_type == 'motor':
+            motor_name = getattr(block, 'name', '未知电机块')
+            clock = self.clock
+            timeline = self.timeline
+            duration, speed, angle = self._motor_timing(block)
+            
+            def run_motor():
+                record(trace_events.MOTOR, index, motor_name)
+                timeline.append(MotorCommand(clock.now, duration, block_name, speed, angle, index))
+                if duration:
+                    clock.advance(duration)
+                return next_blocks
+            return run_motor
+        
+        if block_type == 'sensor':
+            sensor_name = getattr(block, 'name', '未知传感器块')
+            clock = self.clock
+            sensor_model = self.sensor_model
+            sensor_id = self._get_param_value(block, '传感器ID', default=1)
+            target = self._get_param_value(block, '变量名')
+            
+            def run_sensor():
+                record(trace_events.SENSOR, index, sensor_name)
+                if target:
+                    value = sensor_model(block_name, sensor_id, clock.now) if sensor_model else 0
+                    variables[target] = value
+                    record(trace_events.SENSOR_VALUE, index, target, value)
+                clock.advance(SENSOR_READ_TIME)
+                return next_blocks
+            return run_sensor
+        
+        if block_type == 'logic' and block_name == '条件判断':
+            condition = self._get_param_value(block, '条件', default='True')
+            evaluate = _expression_evaluator(condition)
+            # 简单处理：如果有连接，选择第一个作为真分支，第二个作为假分支
+            true_next = successors[:1]
+            false_next = successors[1:2]
+            counts = self.branch_counts[index] = [0, 0]
+            
+            def run_condition():
+                try:
+                    # 使用变量字典作为局部变量进行求值
+                    condition_result = evaluate(variables)
+                except Exception as e:
+                    record(trace_events.CONDITION_ERROR, index, condition, str(e))
+                    counts[1] += 1
+                    return false_next
+                record(trace_events.CONDITION, index, condition, condition_result)
+                if condition_result:
+                    counts[0] += 1
+                    return true_next
+                counts[1] += 1
+                return false_next
+            return run_condition
+        
+        if block_type == 'logic' and block_name in LOOP_BLOCK_NAMES:
+            return self._compile_loop(block, successors, index, ports)
+        
+        if block_type == 'variable' and block_name == '变量赋值':
+            var_name = self._get_param_value(block, '变量名', default='var')
+            value_expr = self._get_param_value(block, '值', default='0')
+            evaluate = _expression_evaluator(value_expr)
             
-            if block_type == 'motor':
-                block_name = getattr(block, 'name', '未知电机块')
-                self.output.append(f"执行电机控制: {block_name}")
-            elif block_type == 'sensor':
-                block_name = getattr(block, 'name', '未知传感器块')
-                self.output.append(f"执行传感器读取: {block_name}")
-            elif block_type == 'logic':
-                if hasattr(block, 'name') and block.name == '条件判断':
-                    condition = self._get_param_value(block, '条件', default='True')
-                    # 简单的表达式求值
-                    try:
-                        # 使用变量字典作为局部变量进行求值
-                        condition_result = eval(condition, {}, self.variables)
-                        result['condition'] = condition_result
-                        self.output.append(f"执行条件判断: {condition} -> {condition_result}")
-                    except Exception as e:
-                        result['condition'] = False
-                        self.output.append(f"条件表达式错误: {condition} - {str(e)}")
-                elif hasattr(block, 'name') and block.name == '循环':
-                    times = self._get_param_value(block, '次数', default=1)
-                    self.output.append(f"执行循环: {times} 次")
-            elif block_type == 'variable':
-                if hasattr(block, 'name'):
-                    if block.name == '变量赋值':
-                        var_name = self._get_param_value(block, '变量名', default='var')
-                        value_expr = self._get_param_value(block, '值', default='0')
-                        # 尝试求值表达式
-                        try:
-                            value = eval(value_expr, {}, self.variables)
-                            self.variables[var_name] = value
-                            self.output.append(f"执行变量赋值: {var_name} = {value}")
-                        except Exception as e:
-                            # 如果求值失败，直接使用字符串值
-                            self.variables[var_name] = value_expr
-                            self.output.append(f"执行变量赋值(未求值): {var_name} = '{value_expr}' - 错误: {str(e)}")
-                    elif block.name == '变量增加':
-                        var_name = self._get_param_value(block, '变量名', default='var')
-                        increment = self._get_param_value(block, '增量', default='1')
-                        # 确保变量存在
-                        if var_name not in self.variables:
-                            self.variables[var_name] = 0
-                        # 尝试求值增量
-                        try:
-                            inc_value = eval(str(increment), {}, self.variables)
-                            # 确保是数值类型才能进行加法
-                            if isinstance(self.variables[var_name], (int, float)) and isinstance(inc_value, (int, float)):
-                                self.variables[var_name] += inc_value
-                                self.output.append(f"执行变量增加: {var_name} += {inc_value}")
-                            else:
-                                self.output.append(f"变量增加失败: 类型不匹配")
-                        except Exception as e:
-                            self.output.append(f"变量增加失败: {var_name} += {increment} - 错误: {str(e)}")
-            else:
-                self.output.append(f"未知块类型: {block_type}")
-        except Exception as e:
-            self._handle_error(f"执行块逻辑时出错: {str(e)}")
+            def run_assign():
+                # 尝试求值表达式
+                try:
+                    value = evaluate(variables)
+                except Exception as e:
+                    # 如果求值失败，直接使用字符串值
+                    variables[var_name] = value_expr
+                    record(trace_events.ASSIGN_RAW, index, var_name, value_expr, str(e))
+                    return next_blocks
+                variables[var_name] = value
+                record(trace_events.ASSIGN, index, var_name, value)
+                return next_blocks
+            return run_assign
+        
+        if block_type == 'variable' and block_name == '变量增加':
+            var_name = self._get_param_value(block, '变量名', default='var')
+            increment = self._get_param_value(block, '增量', default='1')
+            evaluate = _expression_evaluator(str(increment))
+            
+            def run_increment():
+                # 确保变量存在
+                if var_name not in variables:
+                    variables[var_name] = 0
+                # 尝试求值增量
+                try:
+                    inc_value = evaluate(variables)
+                except Exception as e:
+                    record(trace_events.INCREMENT_ERROR, index, var_name, increment, str(e))
+                    return next_blocks
+                # 确保是数值类型才能进行加法
+                if isinstance(variables[var_name], (int, float)) and isinstance(inc_value, (int, float)):
+                    variables[var_name] += inc_value
+                    record(trace_events.INCREMENT, index, var_name, inc_value, variables[var_name])
+                else:
+                    output.append(f"变量增加失败: 类型不匹配")
+                return next_blocks
+            return run_increment
+        
+        if block_type in ('logic', 'variable'):
+            def run_passive():
+                return next_blocks
+            return run_passive
+        
+        message = f"未知块类型: {block_type}"
         
-        return result
+        def run_unknown():
+            output.append(message)
+            return next_blocks
+        return run_unknown
     
     def _build_execution_graph(self, blocks: List[ProgramBlock], connections: List[Connection]) -> Dict[int, List[int]]:
         """构建执行流程图，增强连接类型识别和安全检查"""
@@ -1108,6 +1519,7 @@ class ExecutionSimulator:
             
             # 初始化空图
             graph = {}
+            self.execution_ports = ports = {}
             
             # 初始化每个块的后继列表，添加块索引验证
             for i in range(len(blocks)):
@@ -1115,11 +1527,15 @@ class ExecutionSimulator:
                 if not hasattr(blocks[i], 'type'):
                     self.output.append(f"警告: 块 {i} 缺少type属性，可能是无效块")
                 graph[i] = []
+                ports[i] = []
             
             # 统计有效连接数
             valid_connections = 0
             invalid_connections = 0
             
+            # 连接以块ID引用程序块（旧版为列表索引），统一换算为块索引
+            id_to_index = {getattr(block, 'id', None): i for i, block in enumerate(blocks)}
+            
             # 根据连接构建执行流程，增强连接类型识别
             for conn_idx, conn in enumerate(connections):
                 try:
@@ -1134,16 +1550,16 @@ class ExecutionSimulator:
                         from_block = conn.from_block
                         to_block = conn.to_block
                         
-                        # 验证块索引范围
-                        if isinstance(from_block, int) and isinstance(to_block, int):
-                            if 0 <= from_block < len(blocks) and 0 <= to_block < len(blocks):
-                                graph[from_block].append(to_block)
-                                valid_connections += 1
-                            else:
-                                self.output.append(f"警告: 连接 {conn_idx} 包含无效的块索引: from={from_block}, to={to_block}")
-                                invalid_connections += 1
+                        # 验证块引用（块ID或旧版块索引）
+                        from_index = resolve_block_index(from_block, id_to_index, len(blocks))
+                        to_index = resolve_block_index(to_block, id_to_index, len(blocks))
+                        if from_index is not None and to_index is not None:
+                            graph[from_index].append(to_index)
+                            ports[from_index].append((port_name(getattr(conn, 'from_node', None)),
+                                                      port_name(getattr(conn, 'to_node', None))))
+                            valid_connections += 1
                         else:
-                            self.output.append(f"警告: 连接 {conn_idx} 的块索引类型无效: from={type(from_block).__name__}, to={type(to_block).__name__}")
+                            self.output.append(f"警告: 连接 {conn_idx} 包含无效的块引用: from={from_block}, to={to_block}")
                             invalid_connections += 1
                     else:
                         # 尝试备选属性名（增强兼容性）
@@ -1153,6 +1569,7 @@ class ExecutionSimulator:
                             if isinstance(from_block, int) and isinstance(to_block, int):
                                 if 0 <= from_block < len(blocks) and 0 <= to_block < len(blocks):
                                     graph[from_block].append(to_block)
+                                    ports[from_block].append((None, None))
                                     valid_connections += 1
                                 else:
                                     self.output.append(f"警告: 连接 {conn_idx} 使用备选属性但索引无效: from={from_block}, to={to_block}")
@@ -1172,40 +1589,33 @@ class ExecutionSimulator:
                 self.output.append(f"连接处理统计: 有效={valid_connections}, 无效={invalid_connections}, 总数={len(connections)}")
             
             # 检查循环引用风险
-            self._check_cyclic_references(graph)
+            self._check_cyclic_references(graph, blocks)
             
             return graph
         except Exception as e:
             self._handle_error(f"构建执行流程图失败: {str(e)}")
             return {}
     
-    def _check_cyclic_references(self, graph: Dict[int, List[int]]):
-        """检查执行图中是否存在循环引用风险"""
+    def _check_cyclic_references(self, graph: Dict[int, List[int]], blocks: Optional[List[ProgramBlock]] = None):
+        """找出执行图中的循环（非递归Tarjan算法），报告其中没有条件分支或循环块的无条件循环"""
         try:
-            # 使用简单的深度优先搜索检测循环
-            visited = set()
-            rec_stack = set()
+            self.cycles = [sorted(component) for component in strongly_connected_components(graph)
+                           if len(component) > 1 or component[0] in graph.get(component[0], ())]
+            if not self.cycles:
+                return
             
-            def has_cycle(node):
-                visited.add(node)
-                rec_stack.add(node)
-                
-                for neighbor in graph.get(node, []):
-                    if neighbor not in visited:
-                        if has_cycle(neighbor):
-                            return True
-                    elif neighbor in rec_stack:
-                        return True
-                
-                rec_stack.remove(node)
-                return False
-            
-            # 检查每个未访问的节点
-            for node in graph:
-                if node not in visited:
-                    if has_cycle(node):
-                        self.output.append(f"警告: 执行图中检测到潜在的循环引用，可能导致无限循环")
-                        break
+            unconditional = []
+            for cycle in self.cycles:
+                if blocks is None or not any(
+                        (getattr(blocks[i], 'type', None), getattr(blocks[i], 'name', None)) in _BRANCH_BLOCKS
+                        for i in cycle):
+                    unconditional.append(cycle)
+            if unconditional:
+                self.output.append(f"警告: 执行图中检测到潜在的循环引用，可能导致无限循环")
+                for cycle in unconditional[:5]:
+                    self.output.append(f"警告: 块 {cycle} 构成无条件循环，将在达到执行预算时中止")
+            if len(unconditional) < len(self.cycles):
+                self.output.append(f"检测到 {len(self.cycles) - len(unconditional)} 个由条件控制的循环")
         except Exception as e:
             self.output.append(f"警告: 检查循环引用时出错: {str(e)}")
     
@@ -1222,70 +1632,31 @@ class ExecutionSimulator:
                 self.output.append(f"警告: 无效的参数名: {param_name}")
                 return default
             
-            # 检查params属性
-            if not hasattr(block, 'params') or block.params is None:
+            # 检查块类型
+            if not isinstance(block, ProgramBlock):
+                self.output.append(f"警告: 块参数格式无效: {type(block).__name__}")
                 return default
             
-            # 参数字典验证
-            params = block.params
-            if not isinstance(params, (list, tuple)):
-                self.output.append(f"警告: 块参数格式无效: {type(params).__name__}")
+            if not block.has_param(param_name):
                 return default
             
-            # 遍历参数查找匹配项
-            for param in params:
-                try:
-                    # 支持字典和类似字典的对象
-                    param_name_value = None
-                    param_value = None
-                    
-                    if isinstance(param, dict):
-                        param_name_value = param.get('name')
-                        param_value = param.get('value', param.get('default', default))
-                    elif hasattr(param, 'get'):
-                        param_name_value = param.get('name')
-                        param_value = param.get('value', param.get('default', default))
-                    elif hasattr(param, 'name'):
-                        param_name_value = param.name
-                        param_value = getattr(param, 'value', getattr(param, 'default', default))
-                    
-                    # 如果找到匹配的参数名
-                    if param_name_value == param_name:
-                        # 特殊值处理
-                        if param_value == 'None':
-                            return None
-                        elif param_value == 'True':
-                            return True
-                        elif param_value == 'False':
-                            return False
-                        
-                        # 尝试进行数值范围检查（针对特定参数名）
-                        if param_name.lower() in ('速度', 'speed', '角度', 'angle', 'time', '延时', '延迟'):
-                            if isinstance(param_value, (int, float)):
-                                # 速度范围检查
-                                if param_name.lower() in ('速度', 'speed') and not (-100 <= param_value <= 100):
-                                    self.output.append(f"警告: {param_name}值超出有效范围(-100到100): {param_value}")
-                                # 角度范围检查
-                                elif param_name.lower() in ('角度', 'angle') and not (-180 <= param_value <= 180):
-                                    self.output.append(f"警告: {param_name}值超出有效范围(-180到180度): {param_value}")
-                                # 时间范围检查
-                                elif param_name.lower() in ('time', '延时', '延迟') and param_value < 0:
-                                    self.output.append(f"警告: {param_name}值不能为负数: {param_value}")
-                        
-                        # 字符串清理和安全处理
-                        if isinstance(param_value, str):
-                            # 移除首尾空白
-                            param_value = param_value.strip()
-                            # 转义危险字符
-                            if '\n' in param_value or '\t' in param_value:
-                                param_value = param_value.replace('\n', '\\n').replace('\t', '\\t')
-                        
-                        return param_value
-                except Exception as e:
-                    self.output.append(f"警告: 处理参数时出错: {str(e)}")
-                    continue
-            
-            return default
+            # 规范化结果由程序块缓存，参数修改后失效
+            param_value = block.get_converted(param_name, _normalize_simulated_param)
+            
+            # 尝试进行数值范围检查（针对特定参数名）
+            if isinstance(param_value, (int, float)) and not isinstance(param_value, bool):
+                lower_name = param_name.lower()
+                # 速度范围检查
+                if lower_name in ('速度', 'speed') and not (-100 <= param_value <= 100):
+                    self.output.append(f"警告: {param_name}值超出有效范围(-100到100): {param_value}")
+                # 角度范围检查
+                elif lower_name in ('角度', 'angle') and not (-180 <= param_value <= 180):
+                    self.output.append(f"警告: {param_name}值超出有效范围(-180到180度): {param_value}")
+                # 时间范围检查
+                elif lower_name in ('time', '延时', '延迟') and param_value < 0:
+                    self.output.append(f"警告: {param_name}值不能为负数: {param_value}")
+            
+            return param_value
         except Exception as e:
             self.output.append(f"警告: 获取参数值时出错: {str(e)}")
             return default
@@ -1302,6 +1673,12 @@ class ExecutionSimulator:
             'error_occurred': self.error_occurred,
             'last_error': self.last_error,
             'stack_depth': len(self.execution_stack),
+            'steps': self.steps,
+            'stop_reason': self.stop_reason,
+            'cycles': len(self.cycles),
+            'simulated_time': self.clock.now,
+            'motor_commands': len(self.timeline),
             'variables_count': len(self.variables),
-            'output_count': len(self.output)
+            'output_count': self.output.total,
+            'trace_dropped': self.output.dropped
         }
\ No newline at end of file
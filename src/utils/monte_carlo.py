@@ -0,0 +1,682 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+蒙特卡洛模拟
+
+传感器读数按指定的分布随机抽取，同一程序运行N次，统计条件分支的覆盖情况、模拟时间和步数的分布。
+安装了NumPy时N次运行逐步同步执行：变量是长度为N的数组，每一步把栈顶为同一个块的运行分为一组，
+整组一起执行该块，表达式按数组求值。未安装NumPy时逐次用ExecutionSimulator运行。
+
+与逐次模拟的差别（NumPy模式）：整数运算有溢出，除以零得到inf/nan或0而不是报错，
+逻辑运算的两侧都会求值。
+
+在仓库根目录运行，例如:
+    python -m src.utils.monte_carlo 111.robot --runs 10000 --sensor distance=normal(50,10) --seed 1
+"""
+
+import argparse
+import ast
+import json
+import math
+import random
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..core.data_models import ProgramBlock, Connection, Variable
+from ..core.expressions import ExpressionError, compile_expression
+from ..core.program_io import load_program_file
+from .batch_runner import _variable_type, parse_value
+from .code_generator import LOOP_BLOCK_NAMES, ExecutionSimulator, split_loop_successors
+from .simulation_clock import SENSOR_READ_TIME
+
+try:
+    import numpy as np
+except ImportError:  # NumPy为可选依赖，未安装时逐次模拟
+    np = None
+
+STOP_REASONS = ('completed', 'error', 'step_budget', 'time_budget')
+
+_DISTRIBUTION = re.compile(r'^\s*(\w+)\s*\((.*)\)\s*$')
+
+
+class SensorDistribution:
+    """传感器读数的分布
+
+    支持 uniform(下限,上限)、normal(均值,标准差)、randint(下限,上限)（含上限）、
+    choice(值1,值2,...)、bernoulli(概率)，以及常数。
+    """
+
+    KINDS = {'uniform': 2, 'normal': 2, 'randint': 2, 'bernoulli': 1, 'choice': None, 'const': 1}
+
+    def __init__(self, kind: str, args: Tuple[Any, ...]):
+        expected = self.KINDS.get(kind, 0)
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的分布: {kind}")
+        if expected is not None and len(args) != expected:
+            raise ValueError(f"分布{kind}需要{expected}个参数")
+        if kind == 'choice' and not args:
+            raise ValueError("分布choice至少需要一个取值")
+        self.kind = kind
+        self.args = args
+
+    @classmethod
+    def parse(cls, text: str) -> 'SensorDistribution':
+        """解析 分布名(参数,...) 或常数"""
+        match = _DISTRIBUTION.match(text)
+        if not match:
+            return cls('const', (json.loads(text),))
+        args = tuple(json.loads(arg) for arg in match.group(2).split(',') if arg.strip())
+        return cls(match.group(1), args)
+
+    def sample_one(self, rng: random.Random) -> Any:
+        kind, args = self.kind, self.args
+        if kind == 'uniform':
+            return rng.uniform(*args)
+        if kind == 'normal':
+            return rng.gauss(*args)
+        if kind == 'randint':
+            return rng.randint(*args)
+        if kind == 'bernoulli':
+            return rng.random() < args[0]
+        if kind == 'choice':
+            return rng.choice(args)
+        return args[0]
+
+    def sample(self, rng, count: int):
+        """用NumPy随机数生成器抽取count个读数"""
+        kind, args = self.kind, self.args
+        if kind == 'uniform':
+            return rng.uniform(args[0], args[1], count)
+        if kind == 'normal':
+            return rng.normal(args[0], args[1], count)
+        if kind == 'randint':
+            return rng.integers(args[0], args[1] + 1, count)
+        if kind == 'bernoulli':
+            return rng.random(count) < args[0]
+        if kind == 'choice':
+            return np.asarray(args)[rng.integers(0, len(args), count)]
+        return np.full(count, args[0])
+
+    def __repr__(self):
+        return f"{self.kind}({', '.join(map(repr, self.args))})"
+
+
+def _sensor_distribution(block: ProgramBlock, sensors: Dict[str, SensorDistribution]) -> Optional[SensorDistribution]:
+    """按传感器块的变量名或块名称查找分布"""
+    target = block.get_param('变量名') if block.has_param('变量名') else None
+    return sensors.get(target) or sensors.get(block.name)
+
+
+def _sensor_key(block: ProgramBlock, helper: ExecutionSimulator) -> Tuple[str, Any]:
+    """传感器块读取的传感器：(块名称, 传感器ID)，与ExecutionSimulator传给sensor_model的参数一致"""
+    return block.name, helper._get_param_value(block, '传感器ID', default=1)
+
+
+def _sensor_models(blocks: List[ProgramBlock], sensors: Dict[str, SensorDistribution],
+                  helper: ExecutionSimulator) -> Dict[Tuple[str, Any], SensorDistribution]:
+    """(块名称, 传感器ID) -> 分布，两种执行方式共用
+
+    读取同一个传感器的多个块使用同一个分布（按块顺序第一个找到分布的块）。
+    """
+    models = {}
+    for block in blocks:
+        if getattr(block, 'type', None) != 'sensor':
+            continue
+        distribution = _sensor_distribution(block, sensors)
+        if distribution is None:
+            continue
+        key = _sensor_key(block, helper)
+        existing = models.setdefault(key, distribution)
+        if (existing.kind, existing.args) != (distribution.kind, distribution.args):
+            print(f"警告: 传感器 {key[0]}（ID {key[1]}）的多个块对应不同的分布，使用 {existing!r}")
+    return models
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class MonteCarloResult:
+    """蒙特卡洛模拟的统计结果"""
+
+    def __init__(self, runs: int, engine: str, block_names: List[str]):
+        self.runs = runs
+        self.engine = engine                    # 'numpy'或'python'
+        self.block_names = block_names
+        self.block_hits = [0] * len(block_names)  # 每个块在所有运行中的执行次数
+        self.branch_counts: Dict[int, List[int]] = {}  # 条件块索引 -> [成立次数, 不成立次数]
+        self.simulated_times: List[float] = []  # 每次运行的模拟时间（秒）
+        self.steps: List[int] = []              # 每次运行的步数
+        self.stop_reasons = {reason: 0 for reason in STOP_REASONS}
+        self.elapsed = 0.0
+
+    def coverage(self) -> Tuple[int, int]:
+        """(至少走过一次的分支数, 分支总数)，每个条件块有成立和不成立两个分支"""
+        taken = sum((counts[0] > 0) + (counts[1] > 0) for counts in self.branch_counts.values())
+        return taken, 2 * len(self.branch_counts)
+
+    @staticmethod
+    def _stats(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {}
+        ordered = sorted(values)
+        mean = math.fsum(ordered) / len(ordered)
+        variance = math.fsum((value - mean) ** 2 for value in ordered) / len(ordered)
+        return {
+            'mean': mean, 'std': math.sqrt(variance), 'min': ordered[0],
+            'p50': _percentile(ordered, 0.5), 'p95': _percentile(ordered, 0.95), 'max': ordered[-1],
+        }
+
+    def time_stats(self) -> Dict[str, float]:
+        return self._stats(self.simulated_times)
+
+    def step_stats(self) -> Dict[str, float]:
+        return self._stats(self.steps)
+
+    def to_dict(self) -> Dict[str, Any]:
+        taken, total = self.coverage()
+        return {
+            'runs': self.runs,
+            'engine': self.engine,
+            'elapsed': self.elapsed,
+            'stop_reasons': self.stop_reasons,
+            'coverage': {'taken': taken, 'total': total},
+            'branches': {str(index): {'block': self.block_names[index], 'true': counts[0], 'false': counts[1]}
+                         for index, counts in self.branch_counts.items()},
+            'block_hits': self.block_hits,
+            'simulated_time': self.time_stats(),
+            'steps': self.step_stats(),
+        }
+
+    def summary_lines(self) -> List[str]:
+        taken, total = self.coverage()
+        lines = [f"运行{self.runs}次（{self.engine}模式）, 用时{self.elapsed:.2f}秒",
+                 "结束原因: " + ', '.join(f"{reason}={count}" for reason, count in self.stop_reasons.items() if count)]
+        if total:
+            lines.append(f"分支覆盖: {taken}/{total}")
+            for index, (true_count, false_count) in sorted(self.branch_counts.items()):
+                decisions = true_count + false_count
+                ratio = true_count / decisions if decisions else 0.0
+                lines.append(f"    块{index} {self.block_names[index]}: 成立{true_count}次, 不成立{false_count}次"
+                             f" (成立比例{ratio:.1%})")
+        for label, stats in (('模拟时间(秒)', self.time_stats()), ('步数', self.step_stats())):
+            if stats:
+                lines.append(f"{label}: 平均{stats['mean']:.3f} 标准差{stats['std']:.3f} 最小{stats['min']:.3f} "
+                             f"中位数{stats['p50']:.3f} P95 {stats['p95']:.3f} 最大{stats['max']:.3f}")
+        return lines
+
+
+class _VectorExpression(ast.NodeTransformer):
+    """把表达式改写为按数组求值：逻辑运算、条件表达式和链式比较改为逐元素函数"""
+
+    def _call(self, name, args, node):
+        call = ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=args, keywords=[])
+        return ast.copy_location(call, node)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        name = '_and' if isinstance(node.op, ast.And) else '_or'
+        result = node.values[-1]
+        for value in reversed(node.values[:-1]):
+            result = self._call(name, [value, result], node)
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return self._call('_not', [node.operand], node)
+        return node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        return self._call('_where', [node.test, node.body, node.orelse], node)
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        operands = [node.left] + node.comparators
+        result = None
+        for i, op in enumerate(node.ops):
+            pair = ast.copy_location(ast.Compare(left=operands[i], ops=[op], comparators=[operands[i + 1]]), node)
+            result = pair if result is None else self._call('_and', [result, pair], node)
+        return result
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return self._call('_pow', [node.left, node.right], node)
+        return node
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        node.func = ast.copy_location(ast.Name(id='_v_' + node.func.id, ctx=ast.Load()), node.func)
+        return node
+
+
+def _vector_globals() -> Dict[str, Any]:
+    def truth(value):
+        value = np.asarray(value)
+        return value.astype(bool) if value.dtype != bool else value
+
+    def rounded(value, digits=None):
+        return np.round(value, digits or 0) if digits is not None else np.rint(value).astype(np.int64)
+
+    def power(base, exponent):
+        base, exponent = np.asarray(base), np.asarray(exponent)
+        if base.dtype.kind in 'biu' and exponent.dtype.kind in 'biu' and (exponent < 0).any():
+            base = base.astype(float)
+        return np.power(base, exponent)
+
+    return {
+        '__builtins__': {},
+        '_and': lambda left, right: np.where(truth(left), right, left),
+        '_or': lambda left, right: np.where(truth(left), left, right),
+        '_not': lambda value: ~truth(value),
+        '_where': lambda test, body, orelse: np.where(truth(test), body, orelse),
+        '_pow': power,
+        '_v_abs': np.abs,
+        '_v_min': lambda *values: np.minimum.reduce(np.broadcast_arrays(*values)),
+        '_v_max': lambda *values: np.maximum.reduce(np.broadcast_arrays(*values)),
+        '_v_round': rounded,
+        '_v_int': lambda value: np.trunc(np.asarray(value, dtype=float)).astype(np.int64),
+        '_v_float': lambda value: np.asarray(value, dtype=float),
+        '_v_bool': truth,
+    }
+
+
+class _VectorRunner:
+    """N次运行逐步同步执行（需要NumPy）
+
+    每次运行有自己的工作栈（stack的一行，sp为栈顶位置），每一步弹出所有运行的栈顶，
+    按块分组后整组执行，块函数把后继块压入该组运行的栈中。
+    """
+
+    def __init__(self, blocks: List[ProgramBlock], graph: Dict[int, List[int]], runs: int,
+                 sensors: Dict[str, SensorDistribution], seed: Optional[int], helper: ExecutionSimulator):
+        self.runs = runs
+        self.rng = np.random.default_rng(seed)
+        self.sensor_models = _sensor_models(blocks, sensors, helper)
+        self.helper = helper
+        self.globals = _vector_globals()
+        self.variables: Dict[str, Any] = {}   # 变量名 -> 数组
+        self.defined: Dict[str, Any] = {}     # 变量名 -> 已赋值的运行（布尔数组）
+        self.clock = np.zeros(runs)
+        self.steps = np.zeros(runs, dtype=np.int64)
+        self.stop = np.zeros(runs, dtype=np.int8)  # STOP_REASONS的下标
+        self.stack = np.zeros((runs, 16), dtype=np.int64)
+        self.sp = np.ones(runs, dtype=np.int64)
+        self.block_hits = np.zeros(len(blocks), dtype=np.int64)
+        self.branch_counts: Dict[int, List[int]] = {}
+        self.loop_checks: Dict[int, Callable] = {}
+        self.program = []
+        for i, block in enumerate(blocks):
+            successors, ports = helper._block_successors(blocks, graph, i)
+            self.program.append(self._compile_block(block, successors, i, ports))
+
+    # 变量和表达式
+
+    def set_initial(self, name: str, value: Any):
+        self._store(name, np.arange(self.runs), np.full(self.runs, value))
+
+    def _store(self, name: str, lanes, values):
+        values = np.asarray(values)
+        if values.dtype.kind in 'USO':
+            values = values.astype(object)
+        array = self.variables.get(name)
+        if array is None:
+            array = self.variables[name] = np.zeros(self.runs, dtype=values.dtype)
+            self.defined[name] = np.zeros(self.runs, dtype=bool)
+        dtype = np.result_type(array.dtype, values.dtype)
+        if dtype != array.dtype:
+            array = self.variables[name] = array.astype(dtype)
+        array[lanes] = values
+        self.defined[name][lanes] = True
+
+    def _compile_expression(self, text: Any):
+        """返回 evaluate(lanes) -> (能求值的运行, 结果数组, 出错的运行)"""
+        try:
+            compiled = compile_expression(text)
+        except ExpressionError:
+            # 无效的表达式按求值出错处理
+            return lambda lanes: (lanes[:0], None, lanes)
+        if compiled.is_constant:
+            value = compiled.value
+
+            def constant(lanes):
+                return lanes, np.full(len(lanes), value, dtype=object if isinstance(value, str) else None), lanes[:0]
+            return constant
+
+        tree = ast.fix_missing_locations(_VectorExpression().visit(ast.parse(compiled.source, mode='eval')))
+        code = compile(tree, '<expression>', 'eval')
+        names = sorted(compiled.names)
+        variables, defined, namespace = self.variables, self.defined, self.globals
+
+        def evaluate(lanes):
+            ok = np.ones(len(lanes), dtype=bool)
+            for name in names:
+                mask = defined.get(name)
+                if mask is None:
+                    return lanes[:0], None, lanes
+                ok &= mask[lanes]
+            good, bad = lanes[ok], lanes[~ok]
+            if not len(good):
+                return good, None, bad
+            local = {name: variables[name][good] for name in names}
+            try:
+                with np.errstate(all='ignore'):
+                    result = eval(code, namespace, local)
+            except Exception:
+                return lanes[:0], None, lanes
+            return good, np.broadcast_to(np.asarray(result), (len(good),)), bad
+        return evaluate
+
+    # 工作栈
+
+    def _push(self, lanes, items: tuple):
+        if not items or not len(lanes):
+            return
+        positions = self.sp[lanes]
+        needed = int(positions.max()) + len(items)
+        if needed > self.stack.shape[1]:
+            grown = np.zeros((self.runs, max(needed, 2 * self.stack.shape[1])), dtype=np.int64)
+            grown[:, :self.stack.shape[1]] = self.stack
+            self.stack = grown
+        for offset, item in enumerate(items):
+            self.stack[lanes, positions + offset] = item
+        self.sp[lanes] = positions + len(items)
+
+    def _fail(self, lanes, reason: str):
+        self.stop[lanes] = STOP_REASONS.index(reason)
+        self.sp[lanes] = 0
+
+    # 块编译，与ExecutionSimulator._compile_block的语义一致
+
+    def _compile_block(self, block: ProgramBlock, successors: tuple, index: int, ports: tuple = ()) -> Callable:
+        push = self._push
+        helper = self.helper
+        if not hasattr(block, 'type'):
+            return lambda lanes: None
+
+        block_type = block.type
+        block_name = getattr(block, 'name', None)
+        next_blocks = tuple(reversed(successors)) if block_name is not None else ()
+
+        if block_type == 'motor':
+            duration = helper._motor_timing(block)[0]
+
+            def run_motor(lanes):
+                if duration:
+                    self.clock[lanes] += duration
+                push(lanes, next_blocks)
+            return run_motor
+
+        if block_type == 'sensor':
+            target = helper._get_param_value(block, '变量名')
+            distribution = self.sensor_models.get(_sensor_key(block, helper))
+
+            def run_sensor(lanes):
+                if target:
+                    values = distribution.sample(self.rng, len(lanes)) if distribution else np.zeros(len(lanes), int)
+                    self._store(target, lanes, values)
+                self.clock[lanes] += SENSOR_READ_TIME
+                push(lanes, next_blocks)
+            return run_sensor
+
+        if block_type == 'logic' and block_name == '条件判断':
+            evaluate = self._compile_expression(helper._get_param_value(block, '条件', default='True'))
+            true_next, false_next = successors[:1], successors[1:2]
+            counts = self.branch_counts[index] = [0, 0]
+
+            def run_condition(lanes):
+                good, result, bad = evaluate(lanes)
+                taken = np.zeros(len(good), dtype=bool) if result is None else self.globals['_v_bool'](result)
+                true_lanes = good[taken]
+                false_lanes = np.concatenate((good[~taken], bad))
+                counts[0] += len(true_lanes)
+                counts[1] += len(false_lanes)
+                push(true_lanes, true_next)
+                push(false_lanes, false_next)
+            return run_condition
+
+        if block_type == 'logic' and block_name in LOOP_BLOCK_NAMES:
+            return self._compile_loop(block, successors, index, ports)
+
+        if block_type == 'variable' and block_name == '变量赋值':
+            var_name = helper._get_param_value(block, '变量名', default='var')
+            value_expr = helper._get_param_value(block, '值', default='0')
+            evaluate = self._compile_expression(value_expr)
+
+            def run_assign(lanes):
+                good, result, bad = evaluate(lanes)
+                if len(good):
+                    self._store(var_name, good, result)
+                if len(bad):
+                    # 求值失败时与逐次模拟相同，直接使用字符串值
+                    self._store(var_name, bad, np.full(len(bad), value_expr, dtype=object))
+                push(lanes, next_blocks)
+            return run_assign
+
+        if block_type == 'variable' and block_name == '变量增加':
+            var_name = helper._get_param_value(block, '变量名', default='var')
+            evaluate = self._compile_expression(str(helper._get_param_value(block, '增量', default='1')))
+
+            def run_increment(lanes):
+                defined = self.defined.get(var_name)
+                missing = lanes if defined is None else lanes[~defined[lanes]]
+                if len(missing):
+                    self._store(var_name, missing, np.zeros(len(missing), dtype=np.int64))
+                good, result, _ = evaluate(lanes)
+                current = self.variables[var_name]
+                if len(good) and current.dtype.kind in 'biuf' and np.asarray(result).dtype.kind in 'biuf':
+                    self._store(var_name, good, current[good] + result)
+                push(lanes, next_blocks)
+            return run_increment
+
+        return lambda lanes: push(lanes, next_blocks)
+
+    def _compile_loop(self, block: ProgramBlock, successors: tuple, index: int, ports: tuple = ()) -> Callable:
+        push = self._push
+        marker = ~index
+        body, after = split_loop_successors(successors, ports)
+        body = tuple(reversed(body))
+        after = tuple(reversed(after))
+        iterate = (marker,) + body
+
+        if block.name == '循环':
+            times = self.helper._get_param_value(block, '次数', default=1)
+            try:
+                count = max(0, int(times))
+            except (TypeError, ValueError):
+                count = 1
+            remaining = np.zeros(self.runs, dtype=np.int64)
+
+            def check_count(lanes):
+                more = remaining[lanes] > 0
+                again = lanes[more]
+                remaining[again] -= 1
+                push(again, iterate)
+                push(lanes[~more], after)
+
+            def run_count(lanes):
+                remaining[lanes] = count if body else 0
+                check_count(lanes)
+            self.loop_checks[index] = check_count
+            return run_count
+
+        if block.name == '当条件满足时循环':
+            evaluate = self._compile_expression(self.helper._get_param_value(block, '条件', default='True'))
+            counts = self.branch_counts[index] = [0, 0]
+
+            def check_condition(lanes):
+                good, result, bad = evaluate(lanes)
+                taken = np.zeros(len(good), dtype=bool) if result is None or not body else self.globals['_v_bool'](result)
+                again = good[taken]
+                done = np.concatenate((good[~taken], bad))
+                counts[0] += len(again)
+                counts[1] += len(done)
+                push(again, iterate)
+                push(done, after)
+            self.loop_checks[index] = check_condition
+            return check_condition
+
+        self.loop_checks[index] = lambda lanes: push(lanes, iterate)
+        return lambda lanes: push(lanes, iterate if body else after)
+
+    def run(self, max_steps: Optional[int], deadline: Optional[float]):
+        program, loop_checks = self.program, self.loop_checks
+        while True:
+            active = np.flatnonzero(self.sp > 0)
+            if not len(active):
+                break
+            if max_steps is not None:
+                over = active[self.steps[active] >= max_steps]
+                if len(over):
+                    self._fail(over, 'step_budget')
+                    active = active[self.steps[active] < max_steps]
+                    if not len(active):
+                        break
+            if deadline is not None and time.perf_counter() > deadline:
+                self._fail(active, 'time_budget')
+                break
+
+            positions = self.sp[active] - 1
+            tops = self.stack[active, positions]
+            self.sp[active] = positions
+            self.steps[active] += 1
+
+            # 按栈顶的块分组
+            order = np.argsort(tops, kind='stable')
+            tops, lanes_sorted = tops[order], active[order]
+            uniques, starts = np.unique(tops, return_index=True)
+            ends = list(starts[1:]) + [len(tops)]
+            for block_index, start, end in zip(uniques.tolist(), starts.tolist(), ends):
+                lanes = lanes_sorted[start:end]
+                try:
+                    if block_index < 0:
+                        loop_checks[~block_index](lanes)
+                    else:
+                        self.block_hits[block_index] += len(lanes)
+                        program[block_index](lanes)
+                except Exception as e:
+                    print(f"蒙特卡洛模拟: 块 {block_index} 执行出错: {str(e)}")
+                    self._fail(lanes, 'error')
+
+
+def run_monte_carlo(blocks: List[ProgramBlock], connections: List[Connection], runs: int = 1000,
+                    sensors: Optional[Dict[str, SensorDistribution]] = None,
+                    initial_variables: Optional[Dict[str, Any]] = None, seed: Optional[int] = None,
+                    max_steps: Optional[int] = 100000, time_limit: Optional[float] = 60.0,
+                    engine: str = 'auto') -> MonteCarloResult:
+    """运行runs次模拟并统计结果
+
+    sensors为 变量名或传感器块名称 -> 分布，没有分布的传感器读数为0；
+    读取同一个传感器（块名称和传感器ID相同）的块使用同一个分布。
+    engine为'numpy'、'python'或'auto'（安装了NumPy时使用numpy）。
+    max_steps限制每次运行的步数，time_limit限制全部运行的总时间（秒）。
+    """
+    sensors = sensors or {}
+    initial_variables = initial_variables or {}
+    if engine == 'auto':
+        engine = 'numpy' if np is not None else 'python'
+    if engine == 'numpy' and np is None:
+        raise ValueError("未安装NumPy，无法使用numpy模式")
+
+    result = MonteCarloResult(runs, engine, [getattr(block, 'name', '') for block in blocks])
+    start = time.perf_counter()
+    deadline = start + time_limit if time_limit else None
+    if engine == 'numpy':
+        _run_vectorized(blocks, connections, runs, sensors, initial_variables, seed, max_steps, deadline, result)
+    else:
+        _run_sequential(blocks, connections, runs, sensors, initial_variables, seed, max_steps, deadline, result)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def _run_vectorized(blocks, connections, runs, sensors, initial_variables, seed, max_steps, deadline, result):
+    helper = ExecutionSimulator()
+    graph = helper._build_execution_graph(blocks, connections)
+    runner = _VectorRunner(blocks, graph, runs, sensors, seed, helper)
+    for name, value in initial_variables.items():
+        runner.set_initial(name, value)
+    runner.run(max_steps, deadline)
+
+    result.block_hits = runner.block_hits.tolist()
+    result.branch_counts = runner.branch_counts
+    result.simulated_times = runner.clock.tolist()
+    result.steps = runner.steps.tolist()
+    for code, count in enumerate(np.bincount(runner.stop, minlength=len(STOP_REASONS)).tolist()):
+        result.stop_reasons[STOP_REASONS[code]] += count
+
+
+def _run_sequential(blocks, connections, runs, sensors, initial_variables, seed, max_steps, deadline, result):
+    rng = random.Random(seed)
+    models = _sensor_models(blocks, sensors, ExecutionSimulator())
+
+    def sensor_model(name, sensor_id, now):
+        distribution = models.get((name, sensor_id))
+        return distribution.sample_one(rng) if distribution else 0
+
+    variables = {name: Variable(name, _variable_type(value), value) for name, value in initial_variables.items()}
+    for run in range(runs):
+        if deadline is not None and time.perf_counter() > deadline:
+            result.stop_reasons['time_budget'] += runs - run
+            break
+        remaining = deadline - time.perf_counter() if deadline is not None else None
+        simulator = ExecutionSimulator(max_steps=max_steps, time_limit=remaining, sensor_model=sensor_model,
+                                       trace_limit=0)
+        simulator.execute(blocks, connections, variables)
+        for block_index, visits in enumerate(simulator.visit_counts):
+            result.block_hits[block_index] += visits
+        for block_index, counts in simulator.branch_counts.items():
+            total = result.branch_counts.setdefault(block_index, [0, 0])
+            total[0] += counts[0]
+            total[1] += counts[1]
+        result.simulated_times.append(simulator.clock.now)
+        result.steps.append(simulator.steps)
+        result.stop_reasons[simulator.stop_reason or 'error'] += 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="蒙特卡洛模拟：随机传感器读数下多次运行程序并统计")
+    parser.add_argument('path', help="程序文件")
+    parser.add_argument('--runs', type=int, default=1000, help="运行次数")
+    parser.add_argument('--sensor', action='append', default=[],
+                        help="传感器分布: 变量名或块名称=分布，例如 distance=normal(50,10)（可重复）")
+    parser.add_argument('--var', action='append', default=[], help="初始变量: 名称=值（可重复）")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子")
+    parser.add_argument('--engine', choices=('auto', 'numpy', 'python'), default='auto', help="执行方式")
+    parser.add_argument('--max-steps', type=int, default=100000, help="每次运行的最大步数")
+    parser.add_argument('--time-limit', type=float, default=60.0, help="全部运行的最长时间（秒）")
+    parser.add_argument('--json', dest='json_path', default=None, help="把统计结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    sensors = {}
+    for text in args.sensor:
+        name, _, spec = text.partition('=')
+        try:
+            sensors[name] = SensorDistribution.parse(spec)
+        except ValueError as e:
+            parser.error(f"无效的传感器分布 {text}: {str(e)}")
+    initial_variables = {}
+    for text in args.var:
+        name, _, value = text.partition('=')
+        initial_variables[name] = parse_value(value)
+
+    program = load_program_file(args.path)
+    result = run_monte_carlo(program.blocks, program.connections, args.runs, sensors, initial_variables,
+                             args.seed, args.max_steps, args.time_limit, args.engine)
+    for line in result.summary_lines():
+        print(line)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result.to_dict(), f, ensure_ascii=False, indent=2)
+    return 0 if result.stop_reasons['completed'] == result.runs else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
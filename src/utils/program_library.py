@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+程序库索引
+
+扫描一个目录下的程序文件，建立保存在磁盘上的倒排索引（SQLite，以内存映射方式读取）：
+块名称、参数值、变量名 -> (程序文件, 块ID)。再次扫描时只重新解析修改时间或大小变化的文件，
+查询不需要重新解析任何程序文件。
+
+在仓库根目录运行，例如:
+    python -m src.utils.program_library index programs/
+    python -m src.utils.program_library query programs/ --block 读取声音 --param 传感器ID=3
+"""
+
+import argparse
+import keyword
+import math
+import os
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..core.program_io import BINARY_EXTENSION, iter_program_file
+
+# 默认索引的程序文件扩展名
+LIBRARY_EXTENSIONS = ('.robot', '.json', BINARY_EXTENSION)
+
+# 默认索引文件名（保存在程序库目录下）
+INDEX_FILE = '.program_index.db'
+
+# 内存映射读取索引文件的最大字节数
+MMAP_SIZE = 256 * 1024 * 1024
+
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE programs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    block_count INTEGER NOT NULL,
+    error TEXT
+);
+CREATE TABLE blocks (
+    id INTEGER PRIMARY KEY,
+    program_id INTEGER NOT NULL,
+    block_id TEXT,
+    name TEXT NOT NULL,
+    type TEXT
+);
+CREATE TABLE params (
+    block_ref INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE TABLE variables (
+    block_ref INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX blocks_by_name ON blocks (name);
+CREATE INDEX blocks_by_program ON blocks (program_id);
+CREATE INDEX params_by_value ON params (name, value);
+CREATE INDEX params_by_block ON params (block_ref, name, value);
+CREATE INDEX variables_by_name ON variables (name);
+CREATE INDEX variables_by_block ON variables (block_ref, name);
+"""
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_CONSTANT_NAMES = {'True', 'False', 'None'}
+
+
+def index_value(value: Any) -> str:
+    """参数值在索引中的规范文本形式（3、3.0和"3"相同，布尔值为true/false）"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        number = value
+    else:
+        text = str(value).strip()
+        try:
+            number = float(text)
+        except ValueError:
+            return text
+    if isinstance(number, float):
+        if not math.isfinite(number):
+            return str(number)
+        if number.is_integer():
+            number = int(number)
+    return str(number)
+
+
+def block_variables(block_data: Dict[str, Any]) -> List[str]:
+    """块数据中引用的变量名：变量操作块的变量名、变量参数的值以及表达式参数中的标识符"""
+    names = []
+    for param in block_data.get('params') or []:
+        value = param.get('value', param.get('default'))
+        if not isinstance(value, str):
+            continue
+        if param.get('name') == '变量名' or param.get('is_variable'):
+            names.append(value.strip())
+        elif param.get('type') == 'expression':
+            # 表达式中的字符串常量不算变量
+            expression = re.sub(r'(["\']).*?\1', '', value)
+            names.extend(name for name in _IDENTIFIER.findall(expression)
+                         if not keyword.iskeyword(name) and name not in _CONSTANT_NAMES)
+    return list(dict.fromkeys(name for name in names if name))
+
+
+class BlockMatch:
+    """查询结果：一个程序文件中的一个程序块"""
+    __slots__ = ('path', 'block_id', 'name', 'type')
+
+    def __init__(self, path: str, block_id: Optional[str], name: str, block_type: Optional[str]):
+        self.path = path
+        self.block_id = block_id
+        self.name = name
+        self.type = block_type
+
+    def __repr__(self):
+        return f"BlockMatch({self.path!r}, {self.block_id!r}, {self.name!r})"
+
+
+class ProgramLibrary:
+    """程序库索引
+
+    update()扫描目录并增量更新索引，find_blocks()/find_programs()只查询索引。
+    """
+
+    def __init__(self, directory: str, index_path: Optional[str] = None,
+                 extensions: Iterable[str] = LIBRARY_EXTENSIONS):
+        self.directory = os.path.abspath(directory)
+        self.index_path = index_path or os.path.join(self.directory, INDEX_FILE)
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.errors: Dict[str, str] = {}  # 无法解析的文件 -> 错误信息
+        # 事务由update()显式管理
+        self.db = sqlite3.connect(self.index_path, isolation_level=None)
+        self.db.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version == _SCHEMA_VERSION:
+            return
+        # 索引只是缓存，版本不一致时直接重建
+        tables = [name for (name,) in self.db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        script = ''.join(f"DROP TABLE {name};" for name in tables) + _SCHEMA
+        self.db.executescript(f"BEGIN;{script}PRAGMA user_version = {_SCHEMA_VERSION};COMMIT;")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _relative_path(self, path: str) -> str:
+        return os.path.relpath(path, self.directory).replace(os.sep, '/')
+
+    def _scan(self) -> Dict[str, os.stat_result]:
+        """列出目录下所有程序文件（相对路径 -> 文件状态）"""
+        files = {}
+        for root, dirs, names in os.walk(self.directory):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for name in names:
+                if os.path.splitext(name)[1].lower() in self.extensions:
+                    path = os.path.join(root, name)
+                    try:
+                        files[self._relative_path(path)] = os.stat(path)
+                    except OSError:
+                        continue
+        return files
+
+    def _remove_program(self, program_id: int):
+        db = self.db
+        db.execute("DELETE FROM params WHERE block_ref IN (SELECT id FROM blocks WHERE program_id = ?)", (program_id,))
+        db.execute("DELETE FROM variables WHERE block_ref IN (SELECT id FROM blocks WHERE program_id = ?)", (program_id,))
+        db.execute("DELETE FROM blocks WHERE program_id = ?", (program_id,))
+        db.execute("DELETE FROM programs WHERE id = ?", (program_id,))
+
+    def _index_program(self, relative_path: str, stat: os.stat_result):
+        """解析一个程序文件并写入索引（只读取块数据，不构建程序块对象）"""
+        db = self.db
+        cursor = db.execute("INSERT INTO programs (path, mtime_ns, size, block_count) VALUES (?, ?, ?, 0)",
+                            (relative_path, stat.st_mtime_ns, stat.st_size))
+        program_id = cursor.lastrowid
+        params = []
+        variables = []
+        block_count = 0
+        path = os.path.join(self.directory, relative_path)
+        for key, block_data in iter_program_file(path):
+            if key != 'blocks':
+                continue
+            block_ref = db.execute("INSERT INTO blocks (program_id, block_id, name, type) VALUES (?, ?, ?, ?)",
+                                   (program_id, block_data.get('id'), block_data['name'],
+                                    block_data.get('type'))).lastrowid
+            for param in block_data.get('params') or []:
+                if 'name' in param:
+                    params.append((block_ref, param['name'],
+                                   index_value(param.get('value', param.get('default', '')))))
+            variables.extend((block_ref, name) for name in block_variables(block_data))
+            block_count += 1
+        db.executemany("INSERT INTO params (block_ref, name, value) VALUES (?, ?, ?)", params)
+        db.executemany("INSERT INTO variables (block_ref, name) VALUES (?, ?)", variables)
+        db.execute("UPDATE programs SET block_count = ? WHERE id = ?", (block_count, program_id))
+
+    def update(self) -> Dict[str, Any]:
+        """增量更新索引，只重新解析新增或修改过的文件，返回更新统计"""
+        start = time.perf_counter()
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0, 'failed': 0}
+        self.errors = {}
+        files = self._scan()
+        indexed = {row[1]: row for row in self.db.execute("SELECT id, path, mtime_ns, size, error FROM programs")}
+
+        db = self.db
+        db.execute("BEGIN")
+        try:
+            for path, known in indexed.items():
+                if path not in files:
+                    self._remove_program(known[0])
+                    stats['removed'] += 1
+
+            for path, stat in files.items():
+                known = indexed.get(path)
+                if known is not None:
+                    if known[2] == stat.st_mtime_ns and known[3] == stat.st_size:
+                        if known[4] is not None:
+                            self.errors[path] = known[4]
+                            stats['failed'] += 1
+                        else:
+                            stats['unchanged'] += 1
+                        continue
+                    self._remove_program(known[0])
+                db.execute("SAVEPOINT program")
+                try:
+                    self._index_program(path, stat)
+                except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                    # 无法解析的文件只记录错误，文件修改后才重新尝试
+                    db.execute("ROLLBACK TO program")
+                    db.execute("INSERT INTO programs (path, mtime_ns, size, block_count, error) VALUES (?, ?, ?, 0, ?)",
+                               (path, stat.st_mtime_ns, stat.st_size, str(e)))
+                    self.errors[path] = str(e)
+                    stats['failed'] += 1
+                    print(f"索引程序文件失败 {path}: {str(e)}")
+                else:
+                    stats['updated' if known is not None else 'added'] += 1
+                db.execute("RELEASE program")
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+        stats['elapsed'] = time.perf_counter() - start
+        return stats
+
+    def find_blocks(self, block_name: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+                    variable: Optional[str] = None, limit: Optional[int] = None) -> List[BlockMatch]:
+        """查找同时满足所有条件的程序块
+
+        block_name: 块名称；params: 参数名 -> 参数值；variable: 块引用的变量名。
+        """
+        conditions = []
+        args: List[Any] = []
+        if block_name is not None:
+            conditions.append("b.name = ?")
+            args.append(block_name)
+        for name, value in (params or {}).items():
+            conditions.append("EXISTS (SELECT 1 FROM params WHERE block_ref = b.id AND name = ? AND value = ?)")
+            args.extend((name, index_value(value)))
+        if variable is not None:
+            conditions.append("EXISTS (SELECT 1 FROM variables WHERE block_ref = b.id AND name = ?)")
+            args.append(variable)
+
+        sql = "SELECT p.path, b.block_id, b.name, b.type FROM blocks b JOIN programs p ON p.id = b.program_id"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY p.path, b.id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return [BlockMatch(*row) for row in self.db.execute(sql, args)]
+
+    def find_programs(self, block_name: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+                      variable: Optional[str] = None) -> List[Tuple[str, int]]:
+        """查找包含满足条件的程序块的程序文件，返回(相对路径, 匹配的块数)"""
+        counts: Dict[str, int] = {}
+        for match in self.find_blocks(block_name, params, variable):
+            counts[match.path] = counts.get(match.path, 0) + 1
+        return list(counts.items())
+
+    def program_count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM programs WHERE error IS NULL").fetchone()[0]
+
+
+def _parse_param(text: str) -> Tuple[str, str]:
+    name, sep, value = text.partition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"参数条件应为 名称=值: {text}")
+    return name.strip(), value
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="程序库索引")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = subparsers.add_parser('index', help="扫描目录并更新索引")
+    query_parser = subparsers.add_parser('query', help="查询程序块")
+    for sub in (index_parser, query_parser):
+        sub.add_argument('directory')
+        sub.add_argument('--index', default=None, help=f"索引文件路径（默认为目录下的{INDEX_FILE}）")
+    query_parser.add_argument('--block', default=None, help="块名称")
+    query_parser.add_argument('--param', action='append', type=_parse_param, default=[],
+                              help="参数条件 名称=值（可重复）")
+    query_parser.add_argument('--variable', default=None, help="变量名")
+    query_parser.add_argument('--programs', action='store_true', help="只列出程序文件")
+    query_parser.add_argument('--no-update', action='store_true', help="查询前不更新索引")
+    args = parser.parse_args(argv)
+
+    with ProgramLibrary(args.directory, args.index) as library:
+        if args.command == 'index' or not args.no_update:
+            stats = library.update()
+            print(f"索引更新: 新增{stats['added']}, 更新{stats['updated']}, 删除{stats['removed']}, "
+                  f"未变{stats['unchanged']}, 失败{stats['failed']}, 用时{stats['elapsed'] * 1000:.1f}毫秒")
+        if args.command == 'index':
+            return
+
+        start = time.perf_counter()
+        params = dict(args.param)
+        if args.programs:
+            results = library.find_programs(args.block, params, args.variable)
+            elapsed = time.perf_counter() - start
+            for path, count in results:
+                print(f"{path}\t{count}")
+        else:
+            results = library.find_blocks(args.block, params, args.variable)
+            elapsed = time.perf_counter() - start
+            for match in results:
+                print(f"{match.path}\t{match.block_id}\t{match.name}")
+        print(f"共{len(results)}条结果, 查询用时{elapsed * 1000:.2f}毫秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+模拟时钟
+
+模拟器用离散事件时钟代替time.sleep：电机块的时间参数、转向的估算时间和传感器读取只推进虚拟时间，
+登记的事件在时钟推进经过其时间点时按时间顺序触发，运行几小时的机器人程序几毫秒就能模拟完。
+电机命令按开始时间记录在时间线中。
+"""
+
+import heapq
+import itertools
+from typing import Any, Callable, List, Optional
+
+# 时间参数无效时电机块的默认耗时（秒）
+DEFAULT_MOTOR_TIME = 1.0
+
+# 转向每度的耗时（秒），与生成代码中 角度 / 90 的估算一致
+TURN_TIME_PER_DEGREE = 1 / 90
+
+# 读取一次传感器的耗时（秒）
+SENSOR_READ_TIME = 0.01
+
+
+class SimulatedClock:
+    """离散事件时钟，时间单位为秒"""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+        self._events = []  # (时间, 序号, 回调)的最小堆，序号保证同一时间的事件按登记顺序触发
+        self._sequence = itertools.count()
+
+    def schedule(self, at: float, callback: Callable[['SimulatedClock'], Any]):
+        """登记在时间at触发的事件，回调以时钟为参数，触发时now等于at"""
+        heapq.heappush(self._events, (max(at, self.now), next(self._sequence), callback))
+
+    def schedule_after(self, delay: float, callback: Callable[['SimulatedClock'], Any]):
+        """登记在delay秒后触发的事件"""
+        self.schedule(self.now + delay, callback)
+
+    def advance(self, seconds: float):
+        """推进时间，依次触发经过的事件"""
+        if seconds < 0:
+            raise ValueError(f"时间不能倒退: {seconds}")
+        target = self.now + seconds
+        events = self._events
+        while events and events[0][0] <= target:
+            at, _, callback = heapq.heappop(events)
+            self.now = at
+            callback(self)
+        self.now = target
+
+    sleep = advance
+
+    @property
+    def pending_events(self) -> int:
+        return len(self._events)
+
+
+class MotorCommand:
+    """时间线中的一条电机命令"""
+    __slots__ = ('start', 'duration', 'command', 'speed', 'angle', 'block_index')
+
+    def __init__(self, start: float, duration: float, command: str, speed: Any = None,
+                 angle: Any = None, block_index: Optional[int] = None):
+        self.start = start
+        self.duration = duration
+        self.command = command
+        self.speed = speed
+        self.angle = angle
+        self.block_index = block_index
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __str__(self):
+        text = f"[{self.start:10.3f}s] {self.command}"
+        if self.speed is not None:
+            text += f" 速度={self.speed}"
+        if self.angle is not None:
+            text += f" 角度={self.angle}"
+        return text + f" 持续{self.duration:g}秒"
+
+    def __repr__(self):
+        return f"MotorCommand({self.start!r}, {self.duration!r}, {self.command!r})"
+
+
+def format_timeline(timeline: List[MotorCommand], limit: Optional[int] = None) -> List[str]:
+    """把时间线格式化为文本行，limit限制输出的命令数"""
+    entries = timeline if limit is None else timeline[:limit]
+    lines = [str(entry) for entry in entries]
+    if limit is not None and len(timeline) > limit:
+        lines.append(f"... 另有 {len(timeline) - limit} 条电机命令")
+    return lines
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+模拟性能分析
+
+ExecutionSimulator(profile=True)记录每个块的执行次数（循环块每次重新判断也计一次）、
+累计的模拟时间和实际耗时，并按"外层循环块 -> 块"的调用栈汇总，可以导出为火焰图工具
+（flamegraph.pl、speedscope等）使用的折叠栈格式，或导出为JSON在编辑器画布上显示热图。
+
+在仓库根目录运行，例如:
+    python -m src.utils.simulation_profiler 111.robot --json profile.json --collapsed profile.folded --weight sim
+"""
+
+import argparse
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.program_io import load_program_file
+from .code_generator import ExecutionSimulator
+
+# 折叠栈的权重：执行次数、模拟时间（毫秒）或实际耗时（微秒）
+WEIGHTS = {
+    'hits': (0, 1),
+    'sim': (2, 1000),
+    'cpu': (1, 1000000),
+}
+
+ROOT_FRAME = '程序'
+
+
+class SimulationProfile:
+    """一次模拟运行的性能数据（按块索引）"""
+
+    def __init__(self, blocks: List[Any]):
+        self.block_ids = [getattr(block, 'id', None) for block in blocks]
+        self.block_names = [getattr(block, 'name', None) or '未知块' for block in blocks]
+        self.hits = [0] * len(blocks)
+        self.cpu_time = [0.0] * len(blocks)   # 执行块逻辑的实际耗时（秒）
+        self.sim_time = [0.0] * len(blocks)   # 块推进的模拟时间（秒）
+        self.stacks: Dict[Tuple[int, ...], List[float]] = {}  # (外层循环块..., 块) -> [次数, 实际耗时, 模拟时间]
+
+    def add(self, index: int, enclosing: Tuple[int, ...], cpu: float, sim: float):
+        self.hits[index] += 1
+        self.cpu_time[index] += cpu
+        self.sim_time[index] += sim
+        key = enclosing + (index,)
+        entry = self.stacks.get(key)
+        if entry is None:
+            self.stacks[key] = [1, cpu, sim]
+        else:
+            entry[0] += 1
+            entry[1] += cpu
+            entry[2] += sim
+
+    def frame(self, index: int) -> str:
+        """折叠栈中块的名称（分号和空格是格式中的分隔符）"""
+        name = self.block_names[index].replace(';', '_').replace(' ', '_')
+        return f"{name}#{index}"
+
+    def collapsed_lines(self, weight: str = 'cpu') -> List[str]:
+        """折叠栈格式的文本行：帧1;帧2;... 权重"""
+        position, scale = WEIGHTS[weight]
+        lines = []
+        for key, entry in self.stacks.items():
+            value = int(round(entry[position] * scale))
+            if value > 0:
+                lines.append(';'.join([ROOT_FRAME] + [self.frame(index) for index in key]) + f" {value}")
+        return sorted(lines)
+
+    def write_collapsed(self, path: str, weight: str = 'cpu'):
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in self.collapsed_lines(weight):
+                f.write(line + '\n')
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可写入JSON的数据，画布按块ID显示热图"""
+        return {
+            'blocks': [
+                {'index': index, 'id': self.block_ids[index], 'name': self.block_names[index],
+                 'hits': self.hits[index], 'sim_time': self.sim_time[index], 'cpu_time': self.cpu_time[index]}
+                for index in range(len(self.hits))
+            ],
+            'total_hits': sum(self.hits),
+            'total_sim_time': sum(self.sim_time),
+            'total_cpu_time': sum(self.cpu_time),
+        }
+
+    def report_lines(self, limit: Optional[int] = 20, sort: str = 'cpu') -> List[str]:
+        """按实际耗时（或执行次数、模拟时间）排序的文本报告"""
+        column = {'cpu': self.cpu_time, 'sim': self.sim_time, 'hits': self.hits}[sort]
+        total_cpu = sum(self.cpu_time) or 1.0
+        order = sorted((index for index in range(len(self.hits)) if self.hits[index]),
+                       key=lambda index: column[index], reverse=True)
+        lines = [f"{'块':>6} {'名称':<12} {'次数':>10} {'模拟时间(秒)':>14} {'耗时(毫秒)':>12} {'耗时占比':>8}"]
+        for index in order[:limit]:
+            lines.append(f"{index:>6} {self.block_names[index]:<12} {self.hits[index]:>10} "
+                         f"{self.sim_time[index]:>14.3f} {self.cpu_time[index] * 1000:>12.3f} "
+                         f"{self.cpu_time[index] / total_cpu:>8.1%}")
+        if limit is not None and len(order) > limit:
+            lines.append(f"... 另有 {len(order) - limit} 个执行过的块")
+        return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="模拟执行程序并统计每个块的执行次数和耗时")
+    parser.add_argument('path', help="程序文件")
+    parser.add_argument('--json', dest='json_path', default=None, help="把性能数据写入JSON文件（可在画布上显示热图）")
+    parser.add_argument('--collapsed', default=None, help="写出火焰图使用的折叠栈文件")
+    parser.add_argument('--weight', choices=sorted(WEIGHTS), default='cpu',
+                        help="折叠栈权重: cpu为实际耗时(微秒)，sim为模拟时间(毫秒)，hits为执行次数")
+    parser.add_argument('--top', type=int, default=20, help="报告中显示的块数")
+    parser.add_argument('--max-steps', type=int, default=1000000, help="最大执行步数")
+    parser.add_argument('--time-limit', type=float, default=60.0, help="最长执行时间（秒）")
+    args = parser.parse_args(argv)
+
+    program = load_program_file(args.path)
+    simulator = ExecutionSimulator(max_steps=args.max_steps, time_limit=args.time_limit, profile=True)
+    simulator.execute(program.blocks, program.connections, {})
+    status = simulator.get_execution_status()
+    print(f"{args.path}: {status['steps']} 步, 模拟时间 {status['simulated_time']:.3f} 秒, 结束原因 {status['stop_reason']}")
+    if simulator.last_error:
+        print(f"错误: {simulator.last_error}")
+
+    profile = simulator.profile_data
+    if profile is None:
+        return 1
+    for line in profile.report_lines(args.top, args.weight):
+        print(line)
+    if args.collapsed:
+        profile.write_collapsed(args.collapsed, args.weight)
+    if args.json_path:
+        data = profile.to_dict()
+        data['program'] = args.path
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    return 0 if not simulator.error_occurred else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
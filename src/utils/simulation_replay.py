@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+模拟运行的录制与回放
+
+模拟执行中唯一的不确定输入是传感器读数（以及按实际耗时触发的时间预算）。录制时把每次传感器读数
+按顺序写入紧凑的二进制日志，并每隔一定步数写入一个状态检查点；回放时按相同顺序提供读数，
+得到与原运行相同的结果。跳转到某一步时从之前最近的检查点恢复状态再继续执行，不必从头执行。
+
+日志布局（小端）：
+    头部        4s魔数 b'RSIM'，H格式版本，H保留，I长度 + UTF-8 JSON（程序摘要、初始变量、模拟器设置）
+    记录        B类型 + 内容：
+                'S' 传感器读数：带类型标记的值
+                'C' 检查点：Q步数，Q已用读数数，I长度 + zlib压缩的JSON状态
+                'E' 结束：I长度 + UTF-8 JSON（步数、结束原因、错误信息）
+检查点中的执行轨迹和电机时间线不保存，跳转后只包含检查点之后的内容。
+"""
+
+import hashlib
+import json
+import struct
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..core.data_models import ProgramBlock, Connection, Variable
+from ..core.program_io import program_to_dict
+from .code_generator import ExecutionSimulator
+
+MAGIC = b'RSIM'
+FORMAT_VERSION = 1
+
+# 默认每隔多少步写入一个检查点
+DEFAULT_CHECKPOINT_INTERVAL = 100000
+
+_HEADER = struct.Struct('<4sHH')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+_CHECKPOINT = struct.Struct('<QQI')
+
+_SENSOR = b'S'
+_CHECKPOINT_RECORD = b'C'
+_END = b'E'
+
+# 值的类型标记
+_T_NONE = 0
+_T_FALSE = 1
+_T_TRUE = 2
+_T_INT = 3
+_T_FLOAT = 4
+_T_STR = 5
+_T_JSON = 6  # 其他值（大整数、列表等）以JSON文本保存
+
+# 写入文件前缓冲的字节数
+_FLUSH_SIZE = 1 << 16
+
+
+class ReplayError(Exception):
+    """回放日志无效，或与要回放的程序不一致"""
+
+
+def program_digest(blocks: List[ProgramBlock], connections: List[Connection]) -> str:
+    """程序内容的摘要，用于确认回放的是录制时的程序"""
+    text = json.dumps(program_to_dict(blocks, connections), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _encode_value(value: Any, out: bytearray):
+    if value is None:
+        out.append(_T_NONE)
+    elif value is True:
+        out.append(_T_TRUE)
+    elif value is False:
+        out.append(_T_FALSE)
+    elif isinstance(value, int) and -(1 << 63) <= value < (1 << 63):
+        out.append(_T_INT)
+        out += _I64.pack(value)
+    elif isinstance(value, float):
+        out.append(_T_FLOAT)
+        out += _F64.pack(value)
+    else:
+        tag = _T_STR if isinstance(value, str) else _T_JSON
+        data = (value if tag == _T_STR else json.dumps(value, default=repr)).encode('utf-8')
+        out.append(tag)
+        out += _U32.pack(len(data))
+        out += data
+
+
+def _decode_value(data: bytes, offset: int) -> Tuple[Any, int]:
+    tag = data[offset]
+    offset += 1
+    if tag == _T_NONE:
+        return None, offset
+    if tag == _T_TRUE:
+        return True, offset
+    if tag == _T_FALSE:
+        return False, offset
+    if tag == _T_INT:
+        return _I64.unpack_from(data, offset)[0], offset + 8
+    if tag == _T_FLOAT:
+        return _F64.unpack_from(data, offset)[0], offset + 8
+    if tag in (_T_STR, _T_JSON):
+        length = _U32.unpack_from(data, offset)[0]
+        offset += 4
+        text = data[offset:offset + length].decode('utf-8')
+        return (text if tag == _T_STR else json.loads(text)), offset + length
+    raise ReplayError(f"未知的值类型标记: {tag}")
+
+
+def capture_state(simulator: ExecutionSimulator) -> Dict[str, Any]:
+    """模拟器暂停或到达检查点时的可恢复状态"""
+    return {
+        'steps': simulator.steps,
+        'variables': simulator.variables,
+        'stack': simulator.execution_stack,
+        'visits': simulator.visit_counts,
+        'loops': {str(index): count for index, count in simulator.loop_counters.items()},
+        'branches': {str(index): counts for index, counts in simulator.branch_counts.items()},
+        'clock': simulator.clock.now,
+    }
+
+
+def restore_state(simulator: ExecutionSimulator, state: Dict[str, Any]):
+    """把状态恢复到已编译程序、处于暂停状态的模拟器中
+
+    编译后的块闭包引用了变量字典、循环计数和分支计数等对象，因此原地修改这些对象。
+    """
+    simulator.steps = state['steps']
+    simulator.variables.clear()
+    simulator.variables.update(state['variables'])
+    simulator.execution_stack[:] = state['stack']
+    simulator.visit_counts[:] = state['visits']
+    for index, count in state['loops'].items():
+        simulator.loop_counters[int(index)] = count
+    for index, counts in state['branches'].items():
+        simulator.branch_counts[int(index)][:] = counts
+    simulator.clock.now = state['clock']
+    simulator.timeline.clear()
+
+
+class SimulationRecorder:
+    """录制一次模拟运行"""
+
+    def __init__(self, path: str, checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.sensor_count = 0
+        self._buffer = bytearray()
+        self._file = None
+
+    def record(self, simulator: ExecutionSimulator, blocks: List[ProgramBlock], connections: List[Connection],
+               initial_variables: Dict[str, Variable]):
+        """用simulator执行程序并录制，返回执行轨迹"""
+        header = {
+            'program': program_digest(blocks, connections),
+            'variables': {name: [getattr(var, 'type', None), getattr(var, 'value', None)]
+                          for name, var in (initial_variables or {}).items()},
+            'max_steps': simulator.max_steps,
+            'max_block_visits': simulator.max_block_visits,
+            'checkpoint_interval': self.checkpoint_interval,
+        }
+        header_data = json.dumps(header, ensure_ascii=False, default=repr).encode('utf-8')
+        source = simulator.sensor_model
+        self.sensor_count = 0
+
+        def sensor_model(name, sensor_id, now):
+            value = source(name, sensor_id, now) if source else 0
+            self._buffer += _SENSOR
+            _encode_value(value, self._buffer)
+            self.sensor_count += 1
+            if len(self._buffer) >= _FLUSH_SIZE:
+                self._flush()
+            return value
+
+        def checkpoint(sim):
+            state = zlib.compress(json.dumps(capture_state(sim), default=repr).encode('utf-8'))
+            self._buffer += _CHECKPOINT_RECORD
+            self._buffer += _CHECKPOINT.pack(sim.steps, self.sensor_count, len(state))
+            self._buffer += state
+            self._flush()
+
+        with open(self.path, 'wb') as self._file:
+            self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0) + _U32.pack(len(header_data)) + header_data)
+            simulator.sensor_model = sensor_model
+            simulator.checkpoint_interval = self.checkpoint_interval
+            simulator.checkpoint_hook = checkpoint if self.checkpoint_interval else None
+            try:
+                output = simulator.execute(blocks, connections, initial_variables)
+            finally:
+                simulator.sensor_model = source
+                simulator.checkpoint_hook = None
+            end = json.dumps({'steps': simulator.steps, 'stop_reason': simulator.stop_reason,
+                              'last_error': simulator.last_error, 'sensor_count': self.sensor_count},
+                             ensure_ascii=False).encode('utf-8')
+            self._buffer += _END + _U32.pack(len(end)) + end
+            self._flush()
+        self._file = None
+        return output
+
+    def _flush(self):
+        self._file.write(self._buffer)
+        self._buffer = bytearray()
+
+
+def record_run(path: str, blocks: List[ProgramBlock], connections: List[Connection],
+               initial_variables: Dict[str, Variable], simulator: Optional[ExecutionSimulator] = None,
+               checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> ExecutionSimulator:
+    """执行并录制程序，返回执行后的模拟器"""
+    simulator = simulator or ExecutionSimulator()
+    SimulationRecorder(path, checkpoint_interval).record(simulator, blocks, connections, initial_variables)
+    return simulator
+
+
+class SimulationReplay:
+    """读取录制日志并回放"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            magic, version, _ = _HEADER.unpack_from(data, 0)
+        except struct.error:
+            raise ReplayError("文件太短，不是回放日志")
+        if magic != MAGIC:
+            raise ReplayError("不是回放日志")
+        if version > FORMAT_VERSION:
+            raise ReplayError(f"不支持的日志版本: {version}")
+        offset = _HEADER.size
+        length = _U32.unpack_from(data, offset)[0]
+        offset += 4
+        self.header = json.loads(data[offset:offset + length].decode('utf-8'))
+        offset += length
+
+        self.sensor_values: List[Any] = []
+        self.checkpoints: List[Tuple[int, int, bytes]] = []  # (步数, 已用读数数, 压缩的状态)
+        self.end: Optional[Dict[str, Any]] = None             # 程序中途退出时没有结束记录
+        try:
+            while offset < len(data):
+                kind = data[offset:offset + 1]
+                offset += 1
+                if kind == _SENSOR:
+                    value, offset = _decode_value(data, offset)
+                    self.sensor_values.append(value)
+                elif kind == _CHECKPOINT_RECORD:
+                    steps, sensor_count, size = _CHECKPOINT.unpack_from(data, offset)
+                    offset += _CHECKPOINT.size
+                    self.checkpoints.append((steps, sensor_count, data[offset:offset + size]))
+                    offset += size
+                elif kind == _END:
+                    size = _U32.unpack_from(data, offset)[0]
+                    offset += 4
+                    self.end = json.loads(data[offset:offset + size].decode('utf-8'))
+                    offset += size
+                else:
+                    raise ReplayError(f"未知的记录类型: {kind!r}")
+        except (struct.error, IndexError, UnicodeDecodeError):
+            # 录制中途退出时最后一条记录可能不完整
+            pass
+
+    @property
+    def total_steps(self) -> Optional[int]:
+        return self.end['steps'] if self.end else None
+
+    def _simulator(self, **options) -> Tuple[ExecutionSimulator, Callable[[int], None]]:
+        """创建使用录制读数的模拟器，返回(模拟器, 设置读数位置的函数)"""
+        values = self.sensor_values
+        position = [0]
+
+        def sensor_model(name, sensor_id, now):
+            if position[0] >= len(values):
+                raise ReplayError(f"回放日志中的 {len(values)} 个传感器读数已用完，程序与录制时不一致")
+            value = values[position[0]]
+            position[0] += 1
+            return value
+
+        def seek_sensor(index):
+            position[0] = index
+
+        options.setdefault('max_steps', self.header.get('max_steps'))
+        options.setdefault('max_block_visits', self.header.get('max_block_visits'))
+        simulator = ExecutionSimulator(time_limit=None, sensor_model=sensor_model, **options)
+        return simulator, seek_sensor
+
+    def _initial_variables(self) -> Dict[str, Variable]:
+        return {name: Variable(name, var_type, value) for name, (var_type, value) in self.header['variables'].items()}
+
+    def _check_program(self, blocks: List[ProgramBlock], connections: List[Connection]):
+        if program_digest(blocks, connections) != self.header.get('program'):
+            raise ReplayError("程序与录制时不同，无法回放")
+
+    def seek(self, blocks: List[ProgramBlock], connections: List[Connection], step: int,
+             **options) -> ExecutionSimulator:
+        """返回暂停在第step步之前的模拟器，可以检查其状态，或调用resume()继续
+
+        从step之前最近的检查点恢复，只重新执行检查点之后的步骤。options传给ExecutionSimulator。
+        """
+        self._check_program(blocks, connections)
+        simulator, seek_sensor = self._simulator(**options)
+        checkpoint = None
+        for entry in self.checkpoints:
+            if entry[0] > step:
+                break
+            checkpoint = entry
+        simulator.execute(blocks, connections, self._initial_variables(), pause_at=0 if checkpoint else step)
+        if checkpoint is not None and simulator.stop_reason == 'paused':
+            restore_state(simulator, json.loads(zlib.decompress(checkpoint[2]).decode('utf-8')))
+            seek_sensor(checkpoint[1])
+            simulator.output.append(f"从第 {checkpoint[0]} 步的检查点恢复")
+            simulator.resume(pause_at=step)
+        return simulator
+
+    def replay(self, blocks: List[ProgramBlock], connections: List[Connection], **options) -> ExecutionSimulator:
+        """从头回放整个运行，返回执行后的模拟器"""
+        self._check_program(blocks, connections)
+        simulator, _ = self._simulator(**options)
+        end = self.end or {}
+        if end.get('stop_reason') == 'time_budget':
+            # 原运行因实际耗时超出预算而中止，回放到同一步为止
+            simulator.execute(blocks, connections, self._initial_variables(), pause_at=end['steps'])
+            return self.finish(simulator)
+        simulator.execute(blocks, connections, self._initial_variables())
+        return simulator
+
+    def finish(self, simulator: ExecutionSimulator) -> ExecutionSimulator:
+        """继续执行seek()返回的模拟器直到录制的运行结束"""
+        end = self.end or {}
+        if end.get('stop_reason') != 'time_budget':
+            simulator.resume()
+            return simulator
+        if simulator.stop_reason == 'paused' and simulator.steps < end['steps']:
+            simulator.resume(pause_at=end['steps'])
+        if simulator.stop_reason == 'paused':
+            simulator.stop_reason = 'time_budget'
+            simulator._handle_error(end.get('last_error') or "超出时间预算")
+            simulator._finish_run()
+        return simulator
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+模拟执行轨迹
+
+模拟器每执行一步只记录一个(事件码, 块索引, 参数)元组，文本在显示时才格式化。
+轨迹保存在容量固定的环形缓冲区中，长时间的模拟只保留最近的事件；需要完整轨迹时可以
+指定文件，全部事件按JSON行分批写入磁盘。变量赋值、增加和传感器读数事件带有变量的新值，
+可以据此还原变量的变化过程。
+"""
+
+import json
+from collections import deque
+from typing import Any, Iterator, List, Optional, Tuple
+
+# 事件码
+MESSAGE = 0             # (文本,)，预先格式化的提示和警告
+MOTOR = 1               # (块名称,)
+SENSOR = 2              # (块名称,)
+SENSOR_VALUE = 3        # (变量名, 读数)
+CONDITION = 4           # (条件, 结果)
+CONDITION_ERROR = 5     # (条件, 错误信息)
+ASSIGN = 6              # (变量名, 新值)
+ASSIGN_RAW = 7          # (变量名, 原始文本, 错误信息)
+INCREMENT = 8           # (变量名, 增量, 新值)
+INCREMENT_ERROR = 9     # (变量名, 增量, 错误信息)
+LOOP = 10               # (次数,)
+LOOP_CONDITION = 11     # (条件, 结果)
+LOOP_FOREVER = 12       # ()
+
+_FORMATS = {
+    MESSAGE: "{0}",
+    MOTOR: "执行电机控制: {0}",
+    SENSOR: "执行传感器读取: {0}",
+    SENSOR_VALUE: "传感器读数: {0} = {1}",
+    CONDITION: "执行条件判断: {0} -> {1}",
+    CONDITION_ERROR: "条件表达式错误: {0} - {1}",
+    ASSIGN: "执行变量赋值: {0} = {1}",
+    ASSIGN_RAW: "执行变量赋值(未求值): {0} = '{1}' - 错误: {2}",
+    INCREMENT: "执行变量增加: {0} += {1}",
+    INCREMENT_ERROR: "变量增加失败: {0} += {1} - 错误: {2}",
+    LOOP: "执行循环: {0} 次",
+    LOOP_CONDITION: "执行条件循环: {0} -> {1}",
+    LOOP_FOREVER: "执行无限循环",
+}
+
+# 带变量新值的事件：事件码 -> (变量名位置, 新值位置)
+VARIABLE_EVENTS = {SENSOR_VALUE: (0, 1), ASSIGN: (0, 1), ASSIGN_RAW: (0, 1), INCREMENT: (0, 2)}
+
+# 默认保留的事件数
+DEFAULT_TRACE_LIMIT = 10000
+
+# 写入文件时每批的事件数
+_SPILL_BATCH = 4096
+
+Event = Tuple[int, Optional[int], tuple]
+
+
+def format_event(event: Event) -> str:
+    """把事件格式化为文本"""
+    code, _, args = event
+    template = _FORMATS.get(code)
+    if template is None:
+        return f"未知事件 {code}: {args}"
+    return template.format(*args)
+
+
+class SimulationTrace:
+    """环形缓冲区中的执行轨迹
+
+    读取时与文本列表相同：迭代、len()和下标访问得到格式化后的文本（只包含仍保留的事件）。
+    append(文本)记录一条MESSAGE事件，record()记录结构化事件。
+    """
+
+    def __init__(self, limit: Optional[int] = DEFAULT_TRACE_LIMIT, spill_path: Optional[str] = None):
+        self.limit = limit
+        self.spill_path = spill_path
+        self.total = 0          # 记录过的事件总数（包括已从缓冲区丢弃的）
+        self._events = deque(maxlen=limit)
+        self._pending: Optional[List[Event]] = [] if spill_path else None
+        self._spill_file = open(spill_path, 'w', encoding='utf-8') if spill_path else None
+
+    def record(self, code: int, block_index: Optional[int], *args):
+        """记录一个事件"""
+        event = (code, block_index, args)
+        self._events.append(event)
+        self.total += 1
+        pending = self._pending
+        if pending is not None:
+            pending.append(event)
+            if len(pending) >= _SPILL_BATCH:
+                self._spill()
+
+    def append(self, message: str):
+        self.record(MESSAGE, None, message)
+
+    @property
+    def dropped(self) -> int:
+        """因超出容量而从缓冲区丢弃的事件数"""
+        return self.total - len(self._events)
+
+    def events(self) -> Iterator[Tuple[int, Event]]:
+        """按顺序产出(序号, 事件)"""
+        return enumerate(self._events, self.dropped)
+
+    def variable_changes(self) -> Iterator[Tuple[int, Optional[int], str, Any]]:
+        """按顺序产出缓冲区中的变量变化(序号, 块索引, 变量名, 新值)"""
+        for sequence, (code, block_index, args) in self.events():
+            positions = VARIABLE_EVENTS.get(code)
+            if positions is not None:
+                yield sequence, block_index, args[positions[0]], args[positions[1]]
+
+    def tail(self, count: int) -> List[str]:
+        """最近count个事件的文本"""
+        start = max(0, len(self._events) - count)
+        return [format_event(self._events[i]) for i in range(start, len(self._events))]
+
+    def _spill(self):
+        lines = [json.dumps([sequence, code, block_index, list(args)], ensure_ascii=False, default=repr)
+                 for sequence, (code, block_index, args) in enumerate(self._pending, self.total - len(self._pending))]
+        self._spill_file.write('\n'.join(lines) + '\n')
+        self._pending = []
+
+    def close(self):
+        """写出尚未写入文件的事件并关闭文件"""
+        if self._spill_file is None:
+            return
+        if self._pending:
+            self._spill()
+        self._spill_file.close()
+        self._spill_file = None
+        self._pending = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def __iter__(self) -> Iterator[str]:
+        return map(format_event, self._events)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [format_event(self._events[i]) for i in range(*index.indices(len(self._events)))]
+        return format_event(self._events[index])
+
+    def __repr__(self):
+        return f"SimulationTrace(total={self.total}, kept={len(self._events)})"
+
+
+def read_trace_file(path: str) -> Iterator[Tuple[int, Event]]:
+    """读取写入磁盘的完整轨迹，按顺序产出(序号, 事件)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            sequence, code, block_index, args = json.loads(line)
+            yield sequence, (code, block_index, tuple(args))
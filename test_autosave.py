@@ -0,0 +1,78 @@
+import os
+
+from src.core.autosave import JOURNAL_FILE, SNAPSHOT_FILE, AutosaveJournal
+from src.core.data_models import Connection, ProgramBlock
+from src.core.program_io import block_to_dict, connection_to_dict, program_to_dict
+
+
+def _blocks():
+    start, move = ProgramBlock('开始', 'control'), ProgramBlock('前进', 'motion', params=[
+        {'name': '速度', 'type': 'int', 'value': 50}])
+    return start, move
+
+
+def _edits(journal, start, move):
+    """添加前进块和连接，移动并修改参数"""
+    journal.record({'op': 'block_added', 'block': block_to_dict(move)})
+    journal.record({'op': 'connection_added', 'connection': connection_to_dict(
+        Connection(start.id, start.output_nodes[0], move.id, move.input_nodes[0]))})
+    journal.record({'op': 'blocks_moved', 'blocks': [[move.id, 120, 40]]})
+    journal.record({'op': 'param_changed', 'block_id': move.id, 'index': 0,
+                    'param': {'name': '速度', 'type': 'int', 'value': 80}})
+
+
+def _journal_lines(directory):
+    with open(os.path.join(directory, JOURNAL_FILE), encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+def test_recover_after_crash(tmp_path):
+    directory = str(tmp_path)
+    start, move = _blocks()
+    journal = AutosaveJournal(directory)
+    journal.start(program_to_dict([start], []))
+    _edits(journal, start, move)
+    journal.flush()
+    assert len(_journal_lines(directory)) == 4
+    # 模拟异常退出：保留自动保存文件，最后一行只写了一半
+    journal.stop(discard=False)
+    with open(os.path.join(directory, JOURNAL_FILE), 'a', encoding='utf-8') as f:
+        f.write('{"op": "block_rem')
+    assert AutosaveJournal.has_recovery(directory)
+    recovered = AutosaveJournal.recover(directory)
+    assert [block['id'] for block in recovered['blocks']] == [start.id, move.id]
+    assert (recovered['blocks'][1]['x'], recovered['blocks'][1]['y']) == (120, 40)
+    assert recovered['blocks'][1]['params'][0]['value'] == 80
+    assert [(conn['from_block'], conn['to_block']) for conn in recovered['connections']] == [(0, 1)]
+    assert journal.last_error is None
+
+
+def test_compaction_and_block_removal(tmp_path):
+    directory = str(tmp_path)
+    start, move = _blocks()
+    journal = AutosaveJournal(directory, compact_every=3)
+    journal.start(program_to_dict([start], []))
+    _edits(journal, start, move)
+    journal.record({'op': 'block_removed', 'block_id': start.id})
+    journal.flush()
+    # 累计3条操作后写出快照并清空日志
+    assert len(_journal_lines(directory)) < 3
+    journal.stop(discard=False)
+    recovered = AutosaveJournal.recover(directory)
+    assert [block['id'] for block in recovered['blocks']] == [move.id]
+    assert recovered['connections'] == []
+
+
+def test_reset_and_normal_exit(tmp_path):
+    directory = str(tmp_path)
+    start, move = _blocks()
+    journal = AutosaveJournal(directory)
+    journal.start(program_to_dict([start], []))
+    _edits(journal, start, move)
+    journal.reset(program_to_dict([move], []))
+    journal.flush()
+    assert _journal_lines(directory) == []
+    assert [block['id'] for block in AutosaveJournal.recover(directory)['blocks']] == [move.id]
+    journal.stop()
+    assert not os.path.exists(os.path.join(directory, SNAPSHOT_FILE))
+    assert not AutosaveJournal.has_recovery(directory) and AutosaveJournal.recover(directory) is None
@@ -0,0 +1,43 @@
+from src.core.data_models import ProgramBlock
+from src.core.program_io import save_program_file
+from src.utils.batch_runner import SweepAxis, parse_values, run_batch, summarize, sweep_cases
+
+
+def _program_files(tmp_path):
+    """一个正常程序(count += 步长)以及格式错误的YAML、截断的二进制文件和不存在的文件"""
+    block = ProgramBlock('变量增加', 'variable', params=[
+        {'name': '变量名', 'type': 'string', 'value': 'count'},
+        {'name': '增量', 'type': 'int', 'value': 1}])
+    good = tmp_path / 'good.robot'
+    save_program_file(str(good), [block], [])
+    broken_yaml = tmp_path / 'broken.yaml'
+    broken_yaml.write_text('blocks: [unclosed\n  - {name: 1', encoding='utf-8')
+    binary = tmp_path / 'program.robotb'
+    save_program_file(str(binary), [block], [])
+    truncated = tmp_path / 'truncated.robotb'
+    truncated.write_bytes(binary.read_bytes()[:20])
+    return [str(good), str(broken_yaml), str(truncated), str(tmp_path / 'missing.robot')]
+
+
+def test_parse_values_and_sweep_cases():
+    assert parse_values('0:10:5') == [0, 5]
+    assert parse_values('1,2.5,true,abc') == [1, 2.5, True, 'abc']
+    axes = [SweepAxis.parse('var', 'count=0,5'), SweepAxis.parse('param', '变量增加.增量=1:3')]
+    assert sweep_cases(axes) == [{'count': 0, '变量增加.增量': 1}, {'count': 0, '变量增加.增量': 2},
+                                 {'count': 5, '变量增加.增量': 1}, {'count': 5, '变量增加.增量': 2}]
+
+
+def test_load_errors_become_failed_cases(tmp_path):
+    paths = _program_files(tmp_path)
+    axes = [SweepAxis.parse('var', 'count=0,5'), SweepAxis.parse('param', '变量增加.增量=1:3')]
+    for workers in (1, 2):
+        results = run_batch(paths, axes, workers=workers, chunk_size=2)
+        assert len(results) == 16
+        good = [result for result in results if result['path'] == paths[0]]
+        assert all(result['ok'] for result in good), good
+        assert [result['variables']['count'] for result in good] == [1, 2, 6, 7]
+        for result in results[4:]:
+            assert not result['ok'] and result['error'].startswith('加载程序失败'), result
+        summary = summarize(results)
+        assert summary['cases'] == 16 and summary['passed'] == 4
+        assert summary['files'][paths[1]]['passed'] == 0
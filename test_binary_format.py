@@ -0,0 +1,69 @@
+import json
+
+from src.core.binary_format import MAGIC, decode_program, encode_program, is_binary_program
+from src.core.data_models import Connection, ProgramBlock
+from src.core.program_io import iter_program_file, load_program_file, program_to_dict, save_program_file
+
+
+def _program_data():
+    """覆盖各种值类型、变量端点、非标准节点ID和额外顶层字段的程序字典"""
+    start = ProgramBlock('开始', 'control', x=0, y=0)
+    move = ProgramBlock('前进', 'motion', x=12.5, y=-40, params=[
+        {'name': '速度', 'type': 'int', 'value': 2 ** 70, 'min': 0, 'max': 100},
+        {'name': '时间', 'type': 'float', 'value': 1.5, 'is_variable': True, 'variable_type': 'float'},
+        {'name': '模式', 'type': 'string', 'value': '快速', 'options': ['快速', '慢速', None]},
+        {'name': '启用', 'type': 'bool', 'value': False, 'meta': {'a': [1, {'b': True}]}}])
+    data = program_to_dict([start, move], [
+        Connection(start.id, start.output_nodes[0], move.id, move.input_nodes[0])])
+    # 参数字典中没有value键
+    del data['blocks'][0]['params'][:]
+    data['blocks'][1]['params'].append({'name': '备注', 'type': 'string'})
+    data['blocks'][1]['output_nodes'].append('custom-node')
+    data['connections'].append({'from_block': -1, 'from_block_id': None, 'from_node': 'var_x_output',
+                                'to_block': 1, 'to_block_id': move.id, 'to_node': 'custom-node', 'type': 'data'})
+    data['version'] = '1.0'
+    return data
+
+
+def test_round_trip_matches_json():
+    data = _program_data()
+    encoded = encode_program(data)
+    assert is_binary_program(encoded)
+    assert decode_program(encoded) == json.loads(json.dumps(data))
+    assert len(encoded) < len(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+
+def test_corrupted_data_raises_value_error():
+    encoded = encode_program(_program_data())
+    for data in (encoded[:3], encoded[:20], encoded[:-5], MAGIC + b'\xff\xff\x00\x00' + encoded[8:],
+                 b'JSON' + encoded[4:]):
+        try:
+            decode_program(data)
+        except ValueError:
+            continue
+        raise AssertionError(data[:12])
+
+
+def test_format_detected_by_content(tmp_path):
+    start, move = ProgramBlock('开始', 'control'), ProgramBlock('前进', 'motion')
+    data = program_to_dict([start, move], [Connection(start.id, start.output_nodes[0], move.id, move.input_nodes[0])])
+    data['version'] = '1.0'
+    # 二进制内容保存为.robot、JSON内容保存为.robotb，都按内容读取
+    binary_as_robot = tmp_path / 'binary.robot'
+    binary_as_robot.write_bytes(encode_program(data))
+    json_as_robotb = tmp_path / 'text.robotb'
+    json_as_robotb.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    for path in (binary_as_robot, json_as_robotb):
+        assert dict(iter_program_file(str(path)))['version'] == '1.0'
+        program = load_program_file(str(path))
+        assert [block.id for block in program.blocks] == [start.id, move.id]
+        assert len(program.connections) == 1 and program.skipped_connections == 0
+
+
+def test_save_program_file_writes_binary(tmp_path):
+    start = ProgramBlock('开始', 'control')
+    path = str(tmp_path / 'program.robotb')
+    save_program_file(path, [start], [])
+    with open(path, 'rb') as f:
+        assert f.read(len(MAGIC)) == MAGIC
+    assert load_program_file(path).blocks[0].id == start.id
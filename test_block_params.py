@@ -0,0 +1,57 @@
+from src.core.data_models import ParamSchema, ProgramBlock
+
+
+def _speed_block(value=50, default=50):
+    return ProgramBlock('前进', 'motion', params=[
+        {'name': '速度', 'type': 'int', 'value': value, 'default': default, 'min': 0, 'max': 100},
+        {'name': '启用', 'type': 'bool', 'value': 'yes'}])
+
+
+def test_blocks_share_interned_schema():
+    first, second = _speed_block(10), _speed_block(20)
+    assert first._param_schema is second._param_schema
+    assert first.get_param('速度') == 10 and second.get_param('速度') == 20
+    # 修改定义字段只为该程序块换用新的定义
+    second.params[0]['max'] = 200
+    assert first._param_schema is not second._param_schema
+    assert first.params[0]['max'] == 100 and second.params[0]['max'] == 200
+
+
+def test_interned_schema_keeps_original_values():
+    # 1、1.0和True相等且哈希相同，但不能共享同一个定义
+    schemas = [ParamSchema.intern({'name': 'x', 'default': default}) for default in (1, 1.0, True)]
+    assert [type(schema.default) for schema in schemas] == [int, float, bool]
+    options = ['a', 'b']
+    schema = ParamSchema.intern({'name': 'mode', 'options': options})
+    options.append('c')
+    assert schema.fields['options'] == ['a', 'b']
+    # 读取的可变字段是副本
+    block = ProgramBlock('模式', 'logic', params=[{'name': 'mode', 'options': ['a', 'b'], 'value': 'a'}])
+    block.params[0]['options'].append('z')
+    assert block.params[0]['options'] == ['a', 'b']
+
+
+def test_typed_accessors_convert_and_cache():
+    block = _speed_block('75')
+    assert block.get_number('速度') == 75 and block.get_float('速度') == 75.0
+    assert block.get_bool('启用') is True
+    assert block.get_str('速度') == '75'
+    assert block.get_number('不存在', default=-1) == -1
+    assert block.get_converted('速度', lambda value: value + '!') == '75!'
+    # 修改参数值后缓存失效
+    block.set_param('速度', '12.5')
+    assert block.get_number('速度') == 12.5
+    block.params[0]['value'] = 3
+    assert block.get_number('速度') == 3 and block.get_str('速度') == '3'
+
+
+def test_failed_conversion_is_not_cached():
+    block = _speed_block('快')
+    for _ in range(2):
+        try:
+            block.get_number('速度')
+        except ValueError:
+            continue
+        raise AssertionError('应抛出ValueError')
+    block.set_param('速度', 5)
+    assert block.get_number('速度') == 5
@@ -0,0 +1,62 @@
+from src.core.connection_index import ConnectionIndex
+from src.core.data_models import Connection, Node, NodeType, ProgramBlock
+
+
+def _chain(count):
+    """count个程序块首尾相连，返回(块列表, 连接列表, 已登记的索引)"""
+    blocks = [ProgramBlock('前进', 'motion') for _ in range(count)]
+    connections = [Connection(a.id, a.output_nodes[0], b.id, b.input_nodes[0]) for a, b in zip(blocks, blocks[1:])]
+    index = ConnectionIndex()
+    for conn in connections:
+        index.add(conn, conn.from_block, conn.to_block)
+    return blocks, connections, index
+
+
+def _assign_to_variable(block, name):
+    """程序块的输出赋值给变量（目标为变量虚拟节点）"""
+    node = Node(node_id=f'var_{name}_input', node_type=NodeType.INPUT, name=f'var_{name}', value_type='int')
+    node.variable = name
+    return Connection(block.id, block.output_nodes[0], None, node)
+
+
+def test_lookups_by_node_and_block():
+    blocks, connections, index = _chain(4)
+    assert len(index) == 3 and index.to_list() == connections
+    middle = blocks[1]
+    assert index.incoming(middle.input_nodes[0]) == [connections[0]]
+    assert index.outgoing(middle.output_nodes[0]) == [connections[1]]
+    assert index.block_incoming(middle.id) == [connections[0]]
+    assert index.block_outgoing(middle.id) == [connections[1]]
+    assert index.block_connections(middle.id) == [connections[1], connections[0]]
+    assert index.find(blocks[0].output_nodes[0], middle.input_nodes[0]) is connections[0]
+    assert index.find(blocks[0].output_nodes[0], blocks[2].input_nodes[0]) is None
+    assert index.block_keys(connections[2]) == (blocks[2].id, blocks[3].id)
+    # 重复添加不改变索引
+    index.add(connections[0], blocks[0].id, middle.id)
+    assert len(index) == 3 and index.block_outgoing(blocks[0].id) == [connections[0]]
+
+
+def test_discard_and_remove_block_leave_no_empty_buckets():
+    blocks, connections, index = _chain(4)
+    removed = index.remove_block(blocks[1].id)
+    assert set(removed) == set(connections[:2])
+    assert index.to_list() == [connections[2]]
+    assert not index.incoming(blocks[1].input_nodes[0]) and not index.block_outgoing(blocks[0].id)
+    assert blocks[1].id not in index._block_in and blocks[0].id not in index._block_out
+    assert not index.discard(connections[0])
+    assert index.discard(connections[2]) and len(index) == 0
+    assert not index._node_in and not index._node_out and not index._block_keys
+
+
+def test_variable_assignments():
+    blocks, _, index = _chain(2)
+    first = _assign_to_variable(blocks[0], 'count')
+    second = _assign_to_variable(blocks[1], 'count')
+    for conn in (first, second):
+        index.add(conn, conn.from_block, None)
+    assert index.variable_incoming('count') == [first, second]
+    assert index.block_keys(first) == (blocks[0].id, None)
+    index.discard(first)
+    assert index.variable_incoming('count') == [second]
+    index.clear()
+    assert len(index) == 0 and index.variable_incoming('count') == []
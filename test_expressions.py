@@ -0,0 +1,52 @@
+from src.core.data_models import Connection, ProgramBlock, Variable
+from src.core.expressions import ExpressionError, check_expression, compile_expression
+from src.utils.code_generator import ExecutionSimulator, PythonCodeGenerator
+
+
+def _while_program(condition):
+    """当条件满足时循环(condition) -> 循环体(count += 1)"""
+    loop = ProgramBlock('当条件满足时循环', 'logic', params=[
+        {'name': '条件', 'type': 'expression', 'value': condition}])
+    body = ProgramBlock('变量增加', 'variable', params=[
+        {'name': '变量名', 'type': 'string', 'value': 'count'},
+        {'name': '增量', 'type': 'int', 'value': 1}])
+    return [loop, body], [Connection(loop.id, loop.output_nodes[0], body.id, body.input_nodes[0])]
+
+
+def test_constant_folding():
+    compiled = compile_expression('2 * 3 + 1')
+    assert compiled.is_constant and compiled.evaluate({}) == 7
+    compiled = compile_expression('x + 2 * 3')
+    assert compiled.source == 'x + 6'
+    assert compiled.names == frozenset({'x'})
+    assert compile_expression('False and x').names == frozenset()
+
+
+def test_rejects_names_outside_whitelist():
+    for text in ('__import__("os")', 'open("f")', 'x.__class__', '[i for i in x]'):
+        try:
+            compile_expression(text)
+        except ExpressionError:
+            continue
+        raise AssertionError(text)
+    assert check_expression('x +') is not None
+    assert check_expression('x + 1', known_names=['y']) is not None
+
+
+def test_huge_constant_is_not_folded():
+    compiled = compile_expression('9**9999')
+    assert not compiled.is_constant
+    assert compiled.evaluate({}) == 9 ** 9999
+    assert check_expression('9**9999 > count') is None
+
+
+def test_huge_constant_in_simulator_and_generator():
+    blocks, connections = _while_program('count < 3 and count < 9**9999')
+    simulator = ExecutionSimulator(max_steps=1000)
+    simulator.execute(blocks, connections, {'count': Variable('count', 'int', 0)})
+    assert simulator.stop_reason == 'completed', simulator.last_error
+    assert simulator.variables['count'] == 3
+    condition = ProgramBlock('条件判断', 'logic', params=[
+        {'name': '条件', 'type': 'expression', 'value': 'count < 9**9999'}])
+    code = PythonCodeGenerator().generate_code([condition], [], {})
+    assert 'count < 9 ** 9999' in code
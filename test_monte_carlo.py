@@ -0,0 +1,75 @@
+import pytest
+
+from src.core.data_models import Connection, ProgramBlock
+from src.utils.monte_carlo import SensorDistribution, np, run_monte_carlo
+
+
+def _sensor(name, sensor_id, target):
+    return ProgramBlock(name, 'sensor', params=[
+        {'name': '传感器ID', 'type': 'int', 'value': sensor_id},
+        {'name': '变量名', 'type': 'string', 'value': target}])
+
+
+def _increment(target):
+    return ProgramBlock('变量增加', 'variable', params=[
+        {'name': '变量名', 'type': 'string', 'value': target},
+        {'name': '增量', 'type': 'int', 'value': 1}])
+
+
+def _compare_program(second_id, condition='a == b'):
+    """读取距离(ID 1) -> a，读取距离(second_id) -> b，条件判断(condition)：成立 -> yes += 1，否则 -> no += 1"""
+    first = _sensor('读取距离', 1, 'a')
+    second = _sensor('读取距离', second_id, 'b')
+    branch = ProgramBlock('条件判断', 'logic', params=[
+        {'name': '条件', 'type': 'expression', 'value': condition}])
+    yes, no = _increment('yes'), _increment('no')
+    connections = [
+        Connection(first.id, first.output_nodes[0], second.id, second.input_nodes[0]),
+        Connection(second.id, second.output_nodes[0], branch.id, branch.input_nodes[0]),
+        Connection(branch.id, branch.output_nodes[0], yes.id, yes.input_nodes[0]),
+        Connection(branch.id, branch.output_nodes[1], no.id, no.input_nodes[0]),
+    ]
+    return [first, second, branch, yes, no], connections
+
+
+def _engines():
+    """可用的执行方式（未安装NumPy时只有逐次模拟）"""
+    return ('python', 'numpy') if np is not None else ('python',)
+
+
+def _run(program, engine, sensors, runs=200):
+    blocks, connections = program
+    return run_monte_carlo(blocks, connections, runs, sensors, {'yes': 0, 'no': 0}, seed=1, engine=engine)
+
+
+def test_same_sensor_uses_one_distribution_in_both_engines():
+    sensors = {'a': SensorDistribution.parse('1'), 'b': SensorDistribution.parse('2')}
+    for engine in _engines():
+        # 两个块读取同一个传感器(读取距离, ID 1)，都使用第一个块的分布
+        result = _run(_compare_program(1), engine, sensors)
+        assert result.branch_counts[2] == [200, 0], engine
+        # 传感器ID不同时各自按变量名查找分布
+        result = _run(_compare_program(2), engine, sensors)
+        assert result.branch_counts[2] == [0, 200], engine
+
+
+def test_engines_agree_on_deterministic_program():
+    pytest.importorskip('numpy')
+    sensors = {'读取距离': SensorDistribution.parse('choice(5)')}
+    results = [_run(_compare_program(2, 'a + b > 9'), engine, sensors) for engine in _engines()]
+    python, numpy = results
+    assert python.block_hits == numpy.block_hits == [200, 200, 200, 200, 0]
+    assert python.branch_counts == numpy.branch_counts
+    assert python.steps == numpy.steps
+    assert python.simulated_times == pytest.approx(numpy.simulated_times)
+    assert python.stop_reasons == numpy.stop_reasons == {'completed': 200, 'error': 0, 'step_budget': 0,
+                                                         'time_budget': 0}
+
+
+def test_engines_agree_on_branch_probability():
+    sensors = {'a': SensorDistribution.parse('uniform(0, 100)'), 'b': SensorDistribution.parse('30')}
+    for engine in _engines():
+        result = _run(_compare_program(2, 'a < b'), engine, sensors, runs=4000)
+        taken, not_taken = result.branch_counts[2]
+        assert abs(taken / 4000 - 0.3) < 0.03, (engine, taken)
+        assert result.coverage() == (2, 2)
@@ -0,0 +1,87 @@
+import io
+import json
+
+from src.core.data_models import Connection, Node, NodeType, ProgramBlock
+from src.core.program_io import (_JsonStreamReader, build_program, load_program_file, program_to_dict,
+                                 save_program_file)
+
+
+def _variable_node(name, node_type, value_type):
+    """画布上连接变量时创建的虚拟节点"""
+    suffix = 'output' if node_type == NodeType.OUTPUT else 'input'
+    node = Node(node_id=f'var_{name}_{suffix}', node_type=node_type, name=f'var_{name}', value_type=value_type)
+    node.variable = name
+    return node
+
+
+def _program():
+    """开始 -> 前进；变量ok连到条件判断的条件输入，读取距离的数据输出赋值给变量distance"""
+    start = ProgramBlock('开始', 'control', x=0, y=0)
+    move = ProgramBlock('前进', 'motion', x=100, y=0, params=[{'name': '速度', 'type': 'int', 'value': 50}])
+    sensor = ProgramBlock('读取距离', 'sensor', x=200, y=0, params=[
+        {'name': '传感器ID', 'type': 'int', 'value': 1}, {'name': '变量名', 'type': 'string', 'value': 'd'}])
+    branch = ProgramBlock('条件判断', 'logic', x=300, y=0, params=[
+        {'name': '条件', 'type': 'expression', 'value': 'ok'}])
+    connections = [
+        Connection(start.id, start.output_nodes[0], move.id, move.input_nodes[0]),
+        Connection(None, _variable_node('ok', NodeType.OUTPUT, 'boolean'), branch.id, branch.input_nodes[0]),
+        Connection(sensor.id, sensor.output_nodes[-1], None, _variable_node('distance', NodeType.INPUT, 'float')),
+    ]
+    return [start, move, sensor, branch], connections
+
+
+def _endpoints(connections):
+    return [(conn.from_block, conn.from_node.node_id, conn.to_block, conn.to_node.node_id)
+            for conn in connections]
+
+
+def test_round_trip_keeps_variable_endpoints(tmp_path):
+    blocks, connections = _program()
+    for ext in ('.robot', '.json', '.robotb'):
+        path = str(tmp_path / f'program{ext}')
+        save_program_file(path, blocks, connections)
+        program = load_program_file(path)
+        assert program.skipped_connections == 0, ext
+        assert _endpoints(program.connections) == _endpoints(connections), ext
+        ok, distance = program.connections[1].from_node, program.connections[2].to_node
+        assert (ok.variable, ok.node_type, ok.value_type) == ('ok', NodeType.OUTPUT, 'boolean')
+        assert (distance.variable, distance.node_type) == ('distance', NodeType.INPUT)
+        # 变量节点的值类型取自另一端程序块的节点
+        assert distance.value_type == program.blocks[2].output_nodes[-1].value_type
+        assert program_to_dict(program.blocks, program.connections) == program_to_dict(blocks, connections)
+
+
+def test_connection_between_two_variables_is_skipped():
+    data = program_to_dict(*_program())
+    data['connections'].append({'from_block_id': None, 'from_node': 'var_a_output',
+                                'to_block_id': None, 'to_node': 'var_b_input', 'type': 'data'})
+    # 变量节点ID出现在错误的方向上
+    data['connections'].append({'from_block_id': None, 'from_node': 'var_a_input',
+                                'to_block_id': data['blocks'][1]['id'], 'to_node': data['blocks'][1]['input_nodes'][0]})
+    program = build_program(data)
+    assert len(program.connections) == 3 and program.skipped_connections == 2
+
+
+def test_stream_reader_handles_small_chunks_and_connections_first():
+    blocks, connections = _program()
+    data = program_to_dict(blocks, connections)
+    data = {'version': 2, 'connections': data['connections'], 'blocks': data['blocks'], 'extra': [1.5, {'a': None}]}
+    text = json.dumps(data, ensure_ascii=False, indent=1)
+    for chunk_size in (1, 7, 1 << 16):
+        items = list(_JsonStreamReader(io.StringIO(text), chunk_size).items())
+        assert [key for key, _ in items] == ['version'] + ['connections'] * 3 + ['blocks'] * 4 + ['extra']
+        assert [value for key, value in items if key == 'blocks'] == data['blocks']
+    program = build_program(data)
+    assert _endpoints(program.connections) == _endpoints(connections)
+    assert program.extra == {'version': 2, 'extra': [1.5, {'a': None}]}
+
+
+def test_legacy_index_references(tmp_path):
+    blocks, connections = _program()
+    data = program_to_dict(blocks, connections)
+    for block in data['blocks']:
+        del block['id'], block['input_nodes'], block['output_nodes']
+    # 旧版文件只有块索引，节点ID由重新生成的块ID派生，无法按旧节点ID找到
+    data['connections'] = [{'from_block': 0, 'from_node': 'old_out', 'to_block': 1, 'to_node': 'old_in'}]
+    program = build_program(data)
+    assert len(program.blocks) == 4 and program.skipped_connections == 1
@@ -0,0 +1,56 @@
+import json
+
+from src.core.data_models import Connection, ProgramBlock
+from src.core.program_io import load_program_file, program_to_dict
+from src.core.validation import ProgramStreamValidator, validate_program
+
+
+def _program_data():
+    """两个程序块和一条执行流连接"""
+    start = ProgramBlock('开始', 'control', x=0, y=0)
+    move = ProgramBlock('前进', 'motion', x=100, y=0, params=[
+        {'name': '速度', 'type': 'int', 'value': 50, 'min': 0, 'max': 100}])
+    return program_to_dict([start, move], [
+        Connection(start.id, start.output_nodes[0], move.id, move.input_nodes[0])])
+
+
+def _load(tmp_path, program_data):
+    path = tmp_path / 'program.robot'
+    path.write_text(json.dumps(program_data, ensure_ascii=False), encoding='utf-8')
+    validator = ProgramStreamValidator()
+    program = load_program_file(str(path), validator)
+    return program, validator.result()
+
+
+def test_valid_program_passes(tmp_path):
+    program, result = _load(tmp_path, _program_data())
+    assert result.valid and not result.issues, result.summary()
+    assert len(program.blocks) == 2 and len(program.connections) == 1
+    assert validate_program(_program_data()).valid
+
+
+def test_malformed_block_is_skipped_and_reported(tmp_path):
+    data = _program_data()
+    del data['blocks'][1]['name']
+    data['blocks'].append(['不是对象'])
+    data['connections'].append({'from_node': ['x'], 'to_node': {}, 'from_block_id': [1]})
+    data['connections'].append('不是对象')
+    program, result = _load(tmp_path, data)
+    assert not result.valid
+    assert '缺少必要字段：blocks[1].name' in result.summary()
+    # 无效块及引用它的连接被跳过，不中断加载
+    assert len(program.blocks) == 1 and program.skipped_blocks == 2
+    assert not program.connections and program.skipped_connections == 3
+    assert '跳过2个无效程序块' in program.summary()
+
+
+def test_stream_validator_matches_document_validator(tmp_path):
+    data = _program_data()
+    data['blocks'][1]['params'][0]['value'] = 500
+    data['blocks'][1]['params'].append({'name': '条件', 'type': 'expression', 'value': 'x +'})
+    data['connections'].append({'from_block_id': 'missing', 'from_node': 'a', 'to_block_id': None,
+                                'to_node': 'var_count_input', 'type': 'data'})
+    _, result = _load(tmp_path, data)
+    expected = validate_program(data)
+    assert [issue.message for issue in result.issues] == [issue.message for issue in expected.issues]
+    assert len(result.errors) == 2 and len(result.warnings) == 1
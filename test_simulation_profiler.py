@@ -0,0 +1,60 @@
+import json
+
+from src.core.data_models import Connection, ProgramBlock
+from src.core.program_io import save_program_file
+from src.utils.code_generator import ExecutionSimulator
+from src.utils.simulation_profiler import main
+
+
+def _motor_loop_program():
+    """循环3次：前进(时间0.5秒)；完成 -> 停止"""
+    loop = ProgramBlock('循环', 'logic', params=[{'name': '次数', 'type': 'int', 'value': 3}])
+    forward = ProgramBlock('前进', 'motor', params=[
+        {'name': '速度', 'type': 'int', 'value': 50}, {'name': '时间', 'type': 'float', 'value': 0.5}])
+    stop = ProgramBlock('停止', 'motor')
+    connections = [
+        Connection(loop.id, loop.output_nodes[0], forward.id, forward.input_nodes[0]),
+        Connection(loop.id, loop.output_nodes[1], stop.id, stop.input_nodes[0]),
+    ]
+    return [loop, forward, stop], connections
+
+
+def _profile():
+    blocks, connections = _motor_loop_program()
+    simulator = ExecutionSimulator(profile=True)
+    simulator.execute(blocks, connections, {})
+    assert simulator.stop_reason == 'completed', simulator.last_error
+    return simulator.profile_data
+
+
+def test_hits_and_simulated_time_per_block():
+    profile = _profile()
+    assert profile.hits[1:] == [3, 1]
+    assert profile.hits[0] >= 3
+    assert profile.sim_time[1] == 1.5 and profile.sim_time[2] == 0.0
+    data = profile.to_dict()
+    assert [block['name'] for block in data['blocks']] == ['循环', '前进', '停止']
+    assert data['total_hits'] == sum(profile.hits) and data['total_sim_time'] == 1.5
+    assert all(block['cpu_time'] >= 0 for block in data['blocks'])
+
+
+def test_collapsed_stacks_nest_loop_body():
+    profile = _profile()
+    lines = profile.collapsed_lines('hits')
+    assert '程序;循环#0;前进#1 3' in lines
+    assert '程序;停止#2 1' in lines
+    assert profile.collapsed_lines('sim') == ['程序;循环#0;前进#1 1500']
+    report = profile.report_lines(limit=2, sort='hits')
+    assert len(report) == 4 and report[-1] == '... 另有 1 个执行过的块'
+
+
+def test_command_line_writes_json_and_collapsed(tmp_path, capsys):
+    path = str(tmp_path / 'program.robot')
+    save_program_file(path, *_motor_loop_program())
+    json_path, collapsed_path = str(tmp_path / 'profile.json'), str(tmp_path / 'profile.folded')
+    assert main([path, '--json', json_path, '--collapsed', collapsed_path, '--weight', 'hits']) == 0
+    assert '结束原因 completed' in capsys.readouterr().out
+    with open(json_path, encoding='utf-8') as f:
+        assert json.load(f)['blocks'][1]['hits'] == 3
+    with open(collapsed_path, encoding='utf-8') as f:
+        assert '程序;循环#0;前进#1 3\n' in f.read()
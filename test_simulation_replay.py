@@ -0,0 +1,81 @@
+import random
+
+from src.core.data_models import Connection, ProgramBlock, Variable
+from src.utils.code_generator import ExecutionSimulator
+from src.utils.simulation_replay import ReplayError, SimulationReplay, record_run
+
+
+def _sensor_loop_program(runs=50):
+    """当 count < runs 时循环：读取距离 -> total += distance -> count += 1 -> 回到循环块"""
+    loop = ProgramBlock('当条件满足时循环', 'logic', params=[
+        {'name': '条件', 'type': 'expression', 'value': f'count < {runs}'}])
+    sensor = ProgramBlock('读取距离', 'sensor', params=[
+        {'name': '传感器ID', 'type': 'int', 'value': 1}, {'name': '变量名', 'type': 'string', 'value': 'distance'}])
+    total = ProgramBlock('变量增加', 'variable', params=[
+        {'name': '变量名', 'type': 'string', 'value': 'total'}, {'name': '增量', 'type': 'string', 'value': 'distance'}])
+    count = ProgramBlock('变量增加', 'variable', params=[
+        {'name': '变量名', 'type': 'string', 'value': 'count'}, {'name': '增量', 'type': 'int', 'value': 1}])
+    connections = [
+        Connection(loop.id, loop.output_nodes[0], sensor.id, sensor.input_nodes[0]),
+        Connection(sensor.id, sensor.output_nodes[0], total.id, total.input_nodes[0]),
+        Connection(total.id, total.output_nodes[0], count.id, count.input_nodes[0]),
+        Connection(count.id, count.output_nodes[0], loop.id, loop.input_nodes[1]),
+    ]
+    return [loop, sensor, total, count], connections
+
+
+def _variables():
+    return {'count': Variable('count', 'int', 0), 'total': Variable('total', 'int', 0)}
+
+
+def _record(tmp_path, checkpoint_interval=20):
+    blocks, connections = _sensor_loop_program()
+    rng = random.Random(3)
+    simulator = ExecutionSimulator(sensor_model=lambda name, sensor_id, now: rng.randint(0, 100))
+    path = str(tmp_path / 'run.rsim')
+    record_run(path, blocks, connections, _variables(), simulator, checkpoint_interval)
+    return path, blocks, connections, simulator
+
+
+def test_replay_reproduces_recorded_run(tmp_path):
+    path, blocks, connections, recorded = _record(tmp_path)
+    replay = SimulationReplay(path)
+    assert recorded.stop_reason == 'completed' and recorded.variables['count'] == 50
+    assert len(replay.sensor_values) == 50 and replay.total_steps == recorded.steps
+    assert len(replay.checkpoints) == recorded.steps // 20
+    simulator = replay.replay(blocks, connections)
+    assert simulator.variables == recorded.variables and simulator.steps == recorded.steps
+    assert simulator.variables['total'] == sum(replay.sensor_values)
+
+
+def test_seek_from_checkpoint_matches_run_from_start(tmp_path):
+    path, blocks, connections, recorded = _record(tmp_path)
+    replay = SimulationReplay(path)
+    from_start = SimulationReplay(path)
+    from_start.checkpoints = []
+    for step in (0, 19, 20, 21, 133, recorded.steps - 1):
+        simulator = replay.seek(blocks, connections, step)
+        expected = from_start.seek(blocks, connections, step)
+        assert simulator.stop_reason == expected.stop_reason == 'paused', step
+        assert simulator.steps == expected.steps == step
+        assert simulator.variables == expected.variables, step
+        assert simulator.execution_stack == expected.execution_stack, step
+        finished = replay.finish(simulator)
+        assert finished.stop_reason == 'completed' and finished.variables == recorded.variables
+
+
+def test_replay_rejects_changed_program_and_tolerates_truncation(tmp_path):
+    path, blocks, connections, recorded = _record(tmp_path)
+    blocks[3].set_param('增量', 2)
+    try:
+        SimulationReplay(path).replay(blocks, connections)
+    except ReplayError:
+        pass
+    else:
+        raise AssertionError('应抛出ReplayError')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    truncated = SimulationReplay(path)
+    assert truncated.end is None and 0 < len(truncated.sensor_values) < 50
@@ -0,0 +1,54 @@
+from src.core.data_models import Connection, ProgramBlock, Variable
+from src.utils.code_generator import ExecutionSimulator
+
+
+def _loop_program(loop_name, params, done_first=False, back_edge=False):
+    """循环块 -> 循环体(count += 1)，完成 -> done += 1"""
+    loop = ProgramBlock(loop_name, 'logic', params=params)
+    body = ProgramBlock('变量增加', 'variable', params=[
+        {'name': '变量名', 'type': 'string', 'value': 'count'},
+        {'name': '增量', 'type': 'int', 'value': 1}])
+    done = ProgramBlock('变量增加', 'variable', params=[
+        {'name': '变量名', 'type': 'string', 'value': 'done'},
+        {'name': '增量', 'type': 'int', 'value': 1}])
+    body_conn = Connection(loop.id, loop.output_nodes[0], body.id, body.input_nodes[0])
+    done_conn = Connection(loop.id, loop.output_nodes[1], done.id, done.input_nodes[0])
+    connections = [done_conn, body_conn] if done_first else [body_conn, done_conn]
+    if back_edge:
+        # 循环体执行完连回循环块的"结束"输入
+        connections.append(Connection(body.id, body.output_nodes[0], loop.id, loop.input_nodes[1]))
+    return [loop, body, done], connections
+
+
+def _run(blocks, connections, max_steps=1000):
+    simulator = ExecutionSimulator(max_steps=max_steps)
+    simulator.execute(blocks, connections, {'count': Variable('count', 'int', 0),
+                                            'done': Variable('done', 'int', 0)})
+    return simulator
+
+
+def test_count_loop_body_and_done_by_node():
+    for done_first in (False, True):
+        for back_edge in (False, True):
+            simulator = _run(*_loop_program('循环', [{'name': '次数', 'type': 'int', 'value': 3}],
+                                            done_first, back_edge))
+            assert simulator.stop_reason == 'completed', (done_first, back_edge, simulator.last_error)
+            assert simulator.variables['count'] == 3, (done_first, back_edge)
+            assert simulator.variables['done'] == 1, (done_first, back_edge)
+
+
+def test_while_loop_back_edge_keeps_stack_bounded():
+    for done_first in (False, True):
+        blocks, connections = _loop_program(
+            '当条件满足时循环', [{'name': '条件', 'type': 'expression', 'value': 'count < 500'}],
+            done_first, back_edge=True)
+        simulator = ExecutionSimulator(max_steps=100000)
+        depths = []
+        simulator.checkpoint_interval = 50
+        simulator.checkpoint_hook = lambda sim: depths.append(len(sim.execution_stack))
+        simulator.execute(blocks, connections, {'count': Variable('count', 'int', 0),
+                                                'done': Variable('done', 'int', 0)})
+        assert simulator.stop_reason == 'completed', simulator.last_error
+        assert simulator.variables['count'] == 500
+        assert simulator.variables['done'] == 1
+        assert depths and max(depths) <= 3
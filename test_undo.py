@@ -0,0 +1,86 @@
+from src.core.undo import Command, UndoStack
+
+
+class _SetValue(Command):
+    """把state[key]从old改为new；对同一键的连续修改可以合并"""
+    text = '修改'
+
+    def __init__(self, stack, state, key, new):
+        self.stack = stack
+        self.state = state
+        self.key = key
+        self.old = state.get(key)
+        self.new = new
+        state[key] = new
+
+    def undo(self):
+        self.state[self.key] = self.old
+        # 撤销过程中产生的命令不应被记录
+        self.stack.push(_SetValue(self.stack, {}, 'ignored', 0))
+
+    def redo(self):
+        self.state[self.key] = self.new
+
+    def merge_with(self, other):
+        if not isinstance(other, _SetValue) or other.key != self.key:
+            return False
+        self.new = other.new
+        return True
+
+
+def _set(stack, state, key, value):
+    stack.push(_SetValue(stack, state, key, value))
+
+
+def test_undo_redo_and_redo_cleared_by_new_command():
+    stack, state = UndoStack(merge_interval=-1), {}
+    _set(stack, state, 'x', 1)
+    _set(stack, state, 'x', 2)
+    assert stack.undo() and state == {'x': 1}
+    assert stack.can_redo() and stack.redo_text() == '修改'
+    assert stack.redo() and state == {'x': 2}
+    assert stack.undo() and stack.undo() and state == {'x': None}
+    assert not stack.undo() and len(stack) == 0
+    _set(stack, state, 'y', 3)
+    assert not stack.can_redo()
+
+
+def test_consecutive_commands_merge_within_interval():
+    stack, state = UndoStack(merge_interval=60), {}
+    for value in range(5):
+        _set(stack, state, 'x', value)
+    _set(stack, state, 'y', 1)
+    assert len(stack) == 2
+    assert stack.undo() and stack.undo() and state == {'x': None, 'y': None}
+    assert stack.redo() and state['x'] == 4
+    # 撤销/重做之后的新命令不与之前的命令合并
+    _set(stack, state, 'x', 10)
+    assert len(stack) == 2
+
+
+def test_limit_drops_oldest_commands():
+    stack, state = UndoStack(limit=3, merge_interval=-1), {}
+    for value in range(5):
+        _set(stack, state, 'x', value)
+    assert len(stack) == 3 and stack.evicted == 2
+    while stack.undo():
+        pass
+    assert state == {'x': 1}
+
+
+def test_macro_and_suspended():
+    stack, state = UndoStack(merge_interval=-1), {}
+    with stack.macro('批量'):
+        _set(stack, state, 'a', 1)
+        with stack.macro():
+            _set(stack, state, 'b', 2)
+            _set(stack, state, 'a', 3)
+    with stack.macro('单个'):
+        _set(stack, state, 'c', 4)
+    with stack.suspended():
+        _set(stack, state, 'd', 5)
+    assert len(stack) == 2 and stack.undo_text() == '修改'
+    assert stack.undo() and 'c' in state and state['c'] is None
+    assert stack.undo_text() == '批量'
+    assert stack.undo() and state == {'a': None, 'b': None, 'c': None, 'd': 5}
+    assert stack.redo() and state['a'] == 3 and state['b'] == 2